@@ -0,0 +1,44 @@
+"""add indexes for holdings refresh scheduler
+
+Revision ID: 3c9e5a1b7d42
+Revises: 71d66d93a6ed
+Create Date: 2026-10-19 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e5a1b7d42'
+down_revision: Union[str, Sequence[str], None] = '71d66d93a6ed'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя внутри транзакции → autocommit_block
+    with op.get_context().autocommit_block():
+        # последний снимок кошелька одним index-only scan (LATERAL ... LIMIT 1 в scheduler)
+        op.create_index(
+            'ix_wallet_snapshot_address_ts_desc', 'wallet_snapshot',
+            ['address', sa.text('ts_utc DESC NULLS LAST')],
+            postgresql_include=['days_idle', 'winrate_pct'],
+            postgresql_concurrently=True,
+        )
+        # фильтр --min-pnl
+        op.create_index(
+            'ix_wallets_pnl', 'wallets', ['pnl'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_wallets_pnl', table_name='wallets', postgresql_concurrently=True)
+        op.drop_index('ix_wallet_snapshot_address_ts_desc', table_name='wallet_snapshot',
+                      postgresql_concurrently=True)
@@ -0,0 +1,145 @@
+"""partition wallet_snapshot by month (ts_utc) + BRIN
+
+Revision ID: 5d2c8e7f1a34
+Revises: 8b1f4e6d2a90
+Create Date: 2026-10-19 14:20:00.000000
+
+wallet_snapshot → PARTITION BY RANGE (ts_utc), партиция на месяц:
+ * PK (id, ts_utc), UNIQUE uix_address_day (address, ts_utc) — ключ партиционирования
+   обязан входить в уникальные ограничения;
+ * ts_utc NOT NULL (строки с NULL получают now());
+ * BRIN по ts_utc для диапазонных запросов, B-tree ix_wallet_snapshot_address удалён —
+   его покрывают uix_address_day и ix_wallet_snapshot_address_ts_desc;
+ * sequence wallet_snapshot_id_seq переезжает на новую таблицу, id сохраняются.
+Дальнейшие партиции создаёт src.sdk.databases.postgres.partitions.
+"""
+from datetime import date, datetime, timezone
+from typing import List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2c8e7f1a34'
+down_revision: Union[str, Sequence[str], None] = '8b1f4e6d2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Ревизия заморожена: SQL партиций — копия src.sdk.databases.postgres.partitions
+# на момент миграции, без импорта кода приложения.
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def _months_between(first: date, last: date) -> List[date]:
+    out, m = [], date(first.year, first.month, 1)
+    while m <= date(last.year, last.month, 1):
+        out.append(m)
+        m = _add_months(m, 1)
+    return out
+
+
+def _create_partition_sql(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS wallet_snapshot_p{month:%Y%m} PARTITION OF wallet_snapshot "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+CREATE_DEFAULT_PARTITION_SQL = "CREATE TABLE IF NOT EXISTS wallet_snapshot_default PARTITION OF wallet_snapshot DEFAULT"
+
+COLUMNS = (
+    "id, address, ts_utc, profit_factor, expectancy, risk_reward, winrate_pct, net_pnl_30d_usd, "
+    "median_liquidity_usd, hhi, honeypot_share_pct, days_idle, total_trades, avg_hold_human, "
+    "avg_interval_human, turnover_usd, pnl_per_turnover, pnl"
+)
+
+
+def _columns(ts_nullable: bool) -> list:
+    return [
+        sa.Column('id', sa.Integer(),
+                  server_default=sa.text("nextval('wallet_snapshot_id_seq'::regclass)"), nullable=False),
+        sa.Column('address', sa.String(length=64), nullable=False),
+        sa.Column('ts_utc', sa.DateTime(timezone=True), nullable=ts_nullable),
+        sa.Column('profit_factor', sa.NUMERIC(precision=18, scale=8), nullable=False),
+        sa.Column('expectancy', sa.NUMERIC(precision=18, scale=8), nullable=False),
+        sa.Column('risk_reward', sa.NUMERIC(precision=18, scale=8), nullable=False),
+        sa.Column('winrate_pct', sa.NUMERIC(precision=6, scale=2), nullable=False),
+        sa.Column('net_pnl_30d_usd', sa.NUMERIC(precision=18, scale=2), nullable=False),
+        sa.Column('median_liquidity_usd', sa.NUMERIC(precision=18, scale=2), nullable=False),
+        sa.Column('hhi', sa.NUMERIC(precision=10, scale=6), nullable=False),
+        sa.Column('honeypot_share_pct', sa.NUMERIC(precision=6, scale=2), nullable=False),
+        sa.Column('days_idle', sa.NUMERIC(precision=8, scale=2), nullable=False),
+        sa.Column('total_trades', sa.Integer(), nullable=False),
+        sa.Column('avg_hold_human', sa.String(length=32), nullable=False),
+        sa.Column('avg_interval_human', sa.String(length=32), nullable=False),
+        sa.Column('turnover_usd', sa.NUMERIC(precision=18, scale=2), nullable=False),
+        sa.Column('pnl_per_turnover', sa.NUMERIC(precision=12, scale=6), nullable=False),
+        sa.Column('pnl', sa.NUMERIC(precision=18, scale=2), nullable=False),
+    ]
+
+
+def _detach_old_table() -> None:
+    """Переименовывает текущую таблицу и снимает с неё имена индексов/ограничений и sequence."""
+    op.rename_table('wallet_snapshot', 'wallet_snapshot_old')
+    op.execute("ALTER SEQUENCE wallet_snapshot_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE wallet_snapshot_old ALTER COLUMN id DROP DEFAULT")
+    op.execute("DROP INDEX IF EXISTS ix_wallet_snapshot_address_ts_desc")
+    op.execute("DROP INDEX IF EXISTS ix_wallet_snapshot_address")
+    op.execute("DROP INDEX IF EXISTS ix_wallet_snapshot_ts_brin")
+    op.execute("ALTER TABLE wallet_snapshot_old DROP CONSTRAINT IF EXISTS uix_address_day")
+    op.execute("ALTER TABLE wallet_snapshot_old DROP CONSTRAINT IF EXISTS wallet_snapshot_pkey")
+
+
+def _finish(copy_sql: str) -> None:
+    op.execute(copy_sql)
+    op.execute("ALTER SEQUENCE wallet_snapshot_id_seq OWNED BY wallet_snapshot.id")
+    op.execute("SELECT setval('wallet_snapshot_id_seq', GREATEST((SELECT max(id) FROM wallet_snapshot), 1))")
+    op.drop_table('wallet_snapshot_old')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _detach_old_table()
+    op.create_table('wallet_snapshot', *_columns(ts_nullable=False),
+                    postgresql_partition_by='RANGE (ts_utc)')
+
+    # партиции на всю имеющуюся историю + PARTITIONS_AHEAD месяцев вперёд
+    now = datetime.now(timezone.utc).date()
+    first = op.get_bind().execute(sa.text("SELECT min(ts_utc) FROM wallet_snapshot_old")).scalar()
+    first = first.date() if first is not None else now
+    for month in _months_between(min(first, now), _add_months(now, PARTITIONS_AHEAD)):
+        op.execute(_create_partition_sql(month))
+    op.execute(CREATE_DEFAULT_PARTITION_SQL)
+
+    # ограничения и индексы — после заливки, на партициях строятся сразу пачкой
+    cols = COLUMNS.replace("ts_utc,", "COALESCE(ts_utc, now()),", 1)
+    _finish(f"INSERT INTO wallet_snapshot ({COLUMNS}) SELECT {cols} FROM wallet_snapshot_old")
+    op.create_primary_key('wallet_snapshot_pkey', 'wallet_snapshot', ['id', 'ts_utc'])
+    op.create_unique_constraint('uix_address_day', 'wallet_snapshot', ['address', 'ts_utc'])
+    op.create_index(
+        'ix_wallet_snapshot_address_ts_desc', 'wallet_snapshot',
+        ['address', sa.text('ts_utc DESC NULLS LAST')],
+        postgresql_include=['days_idle', 'winrate_pct'],
+    )
+    op.create_index('ix_wallet_snapshot_ts_brin', 'wallet_snapshot', ['ts_utc'], postgresql_using='brin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _detach_old_table()
+    op.create_table('wallet_snapshot', *_columns(ts_nullable=True))
+    _finish(f"INSERT INTO wallet_snapshot ({COLUMNS}) SELECT {COLUMNS} FROM wallet_snapshot_old")
+    op.create_primary_key('wallet_snapshot_pkey', 'wallet_snapshot', ['id'])
+    op.create_unique_constraint('uix_address_day', 'wallet_snapshot', ['address', 'ts_utc'])
+    op.create_index(op.f('ix_wallet_snapshot_address'), 'wallet_snapshot', ['address'], unique=False)
+    op.create_index(
+        'ix_wallet_snapshot_address_ts_desc', 'wallet_snapshot',
+        ['address', sa.text('ts_utc DESC NULLS LAST')],
+        postgresql_include=['days_idle', 'winrate_pct'],
+    )
@@ -0,0 +1,28 @@
+"""add wallets.holdings_checked_at
+
+Revision ID: 8b1f4e6d2a90
+Revises: 3c9e5a1b7d42
+Create Date: 2026-10-19 13:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1f4e6d2a90'
+down_revision: Union[str, Sequence[str], None] = '3c9e5a1b7d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('wallets', sa.Column('holdings_checked_at', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('wallets', 'holdings_checked_at')
@@ -0,0 +1,67 @@
+"""add wallet_latest (latest snapshot per wallet)
+
+Revision ID: a7e3c19b5f08
+Revises: 5d2c8e7f1a34
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c19b5f08'
+down_revision: Union[str, Sequence[str], None] = '5d2c8e7f1a34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RANKING_COLUMNS = ('profit_factor', 'winrate_pct', 'pnl', 'net_pnl_30d_usd')
+COLUMNS = (
+    "address, ts_utc, profit_factor, expectancy, risk_reward, winrate_pct, net_pnl_30d_usd, "
+    "median_liquidity_usd, hhi, honeypot_share_pct, days_idle, total_trades, avg_hold_human, "
+    "avg_interval_human, turnover_usd, pnl_per_turnover, pnl"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_latest',
+    sa.Column('address', sa.String(length=64), nullable=False),
+    sa.Column('ts_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('profit_factor', sa.NUMERIC(precision=18, scale=8), nullable=False),
+    sa.Column('expectancy', sa.NUMERIC(precision=18, scale=8), nullable=False),
+    sa.Column('risk_reward', sa.NUMERIC(precision=18, scale=8), nullable=False),
+    sa.Column('winrate_pct', sa.NUMERIC(precision=6, scale=2), nullable=False),
+    sa.Column('net_pnl_30d_usd', sa.NUMERIC(precision=18, scale=2), nullable=False),
+    sa.Column('median_liquidity_usd', sa.NUMERIC(precision=18, scale=2), nullable=False),
+    sa.Column('hhi', sa.NUMERIC(precision=10, scale=6), nullable=False),
+    sa.Column('honeypot_share_pct', sa.NUMERIC(precision=6, scale=2), nullable=False),
+    sa.Column('days_idle', sa.NUMERIC(precision=8, scale=2), nullable=False),
+    sa.Column('total_trades', sa.Integer(), nullable=False),
+    sa.Column('avg_hold_human', sa.String(length=32), nullable=False),
+    sa.Column('avg_interval_human', sa.String(length=32), nullable=False),
+    sa.Column('turnover_usd', sa.NUMERIC(precision=18, scale=2), nullable=False),
+    sa.Column('pnl_per_turnover', sa.NUMERIC(precision=12, scale=6), nullable=False),
+    sa.Column('pnl', sa.NUMERIC(precision=18, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('address')
+    )
+    # backfill: последняя строка истории по каждому адресу (идёт по ix_wallet_snapshot_address_ts_desc)
+    op.execute(
+        f"INSERT INTO wallet_latest ({COLUMNS}) "
+        f"SELECT DISTINCT ON (address) {COLUMNS} FROM wallet_snapshot "
+        f"ORDER BY address, ts_utc DESC NULLS LAST"
+    )
+    for col in RANKING_COLUMNS:
+        op.create_index(
+            f'ix_wallet_latest_{col}', 'wallet_latest', [sa.text(f'{col} DESC')],
+            postgresql_include=['address', 'ts_utc'] + [c for c in RANKING_COLUMNS if c != col],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for col in RANKING_COLUMNS:
+        op.drop_index(f'ix_wallet_latest_{col}', table_name='wallet_latest')
+    op.drop_table('wallet_latest')
@@ -0,0 +1,261 @@
+# src/bench/fake_gmgn.py
+"""
+Локальная замена gmgn.ai для бенчмарков.
+
+Отдаёт ``/api/v1/wallet_stat/{chain}/{wallet}/{period}`` и
+``/api/v1/wallet_holdings/{chain}/{wallet}`` с детерминированными (по адресу)
+синтетическими ответами, умеет:
+
+ * задержки по распределению (``const:50``, ``uniform:20:80``,
+   ``lognorm:4.0:0.5``, ``exp:60`` — миллисекунды);
+ * инъекцию 403 / 429 / 5xx с заданными долями;
+ * фейковый cookie-челлендж: ``GET /`` выставляет ``cf_clearance``,
+   API без валидной куки отвечает 403 (куки «протухают» через ``cookie_ttl``);
+ * ``GET /__stats`` / ``POST /__reset`` — серверные счётчики и задержки.
+
+Запуск отдельно:
+    python -m src.bench.fake_gmgn --port 8765 --latency lognorm:4.0:0.5 --p429 0.02
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import secrets
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+from aiohttp import web
+
+# ───────────────────────── config ───────────────────────────────────
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'kind:arg[:arg]' → функция, возвращающая задержку в миллисекундах."""
+    kind, *args = spec.split(":")
+    a = [float(x) for x in args]
+    if kind == "const":
+        return lambda rnd: a[0] if a else 0.0
+    if kind == "uniform":
+        return lambda rnd: rnd.uniform(a[0], a[1])
+    if kind == "lognorm":
+        return lambda rnd: rnd.lognormvariate(a[0], a[1])
+    if kind == "exp":
+        return lambda rnd: rnd.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency spec '{spec}'")
+
+
+@dataclass
+class FakeConfig:
+    latency: str = "const:0"
+    p403: float = 0.0
+    p429: float = 0.0
+    p5xx: float = 0.0
+    retry_after: float = 0.0
+    challenge: bool = True
+    cookie_ttl: float = 0.0           # 0 → куки не протухают
+    holdings_min: int = 20
+    holdings_max: int = 300
+    positive_share: float = 0.3       # доля кошельков с pnl > 0.6 в wallet_stat
+    seed: int = 42
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    by_status: Dict[int, int] = field(default_factory=dict)
+    challenges: int = 0
+    bytes_tx: int = 0
+    latencies_ms: List[float] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "by_status": {str(k): v for k, v in sorted(self.by_status.items())},
+            "challenges": self.challenges,
+            "bytes_tx": self.bytes_tx,
+            "latencies_ms": self.latencies_ms,
+        }
+
+# ───────────────────────── payloads ─────────────────────────────────
+
+def _wallet_rng(seed: int, wallet: str) -> random.Random:
+    h = hashlib.sha256(f"{seed}:{wallet}".encode()).digest()
+    return random.Random(int.from_bytes(h[:8], "big"))
+
+
+def make_wallet_stat(cfg: FakeConfig, wallet: str) -> Dict[str, Any]:
+    rnd = _wallet_rng(cfg.seed, wallet)
+    pnl = rnd.uniform(0.61, 5.0) if rnd.random() < cfg.positive_share else rnd.uniform(-1.0, 0.6)
+    return {"code": 0, "msg": "success", "data": {"pnl": round(pnl, 6), "winrate": round(rnd.random(), 4)}}
+
+
+def make_holdings(cfg: FakeConfig, wallet: str) -> Dict[str, Any]:
+    """Форма элементов повторяет поля, которые читают calc_basic / calc_quality."""
+    rnd = _wallet_rng(cfg.seed, wallet)
+    n = rnd.randint(cfg.holdings_min, cfg.holdings_max)
+    now = int(time.time())
+    holdings = []
+    for _ in range(n):
+        start = now - rnd.randint(3_600, 40 * 86_400)
+        end = start + rnd.randint(30, 5 * 86_400)
+        bought = rnd.uniform(10, 5_000)
+        sold = bought * rnd.uniform(0.2, 2.5)
+        holdings.append({
+            "token": {
+                "address": secrets.token_hex(22),
+                "symbol": "FAKE",
+                "is_honeypot": rnd.random() < 0.03,
+            },
+            "balance": str(rnd.uniform(0, 1e6)),
+            "usd_value": str(round(rnd.uniform(0, 2_000) if rnd.random() < 0.4 else 0.0, 6)),
+            "liquidity": str(round(rnd.uniform(1e3, 5e6), 2)) if rnd.random() < 0.9 else None,
+            "total_profit_pnl": str(round((sold - bought) / bought, 6)),
+            "realized_profit_30d": str(round(sold - bought, 6)),
+            "unrealized_profit": str(round(rnd.uniform(-50, 50), 6)),
+            "history_bought_cost": str(round(bought, 6)),
+            "history_sold_income": str(round(sold, 6)),
+            "start_holding_at": start,
+            "end_holding_at": end if rnd.random() < 0.8 else None,
+            "last_active_timestamp": end,
+        })
+    return {"code": 0, "msg": "success", "data": {"holdings": holdings, "next": None}}
+
+# ───────────────────────── app ──────────────────────────────────────
+
+class FakeGmgn:
+    def __init__(self, cfg: FakeConfig):
+        self.cfg = cfg
+        self.rnd = random.Random(cfg.seed)
+        self.latency = parse_latency(cfg.latency)
+        self.stats = ServerStats()
+        self.clearances: Dict[str, float] = {}
+
+    # ---- helpers ----
+    def _cookie_ok(self, request: web.Request) -> bool:
+        if not self.cfg.challenge:
+            return True
+        token = request.cookies.get("cf_clearance")
+        issued = self.clearances.get(token or "")
+        if issued is None:
+            return False
+        return not self.cfg.cookie_ttl or (time.time() - issued) <= self.cfg.cookie_ttl
+
+    def _injected_status(self) -> int | None:
+        r = self.rnd.random()
+        for status, p in ((403, self.cfg.p403), (429, self.cfg.p429), (503, self.cfg.p5xx)):
+            if r < p:
+                return status
+            r -= p
+        return None
+
+    async def _respond(self, t0: float, status: int, body: Dict[str, Any] | None = None,
+                       headers: Dict[str, str] | None = None) -> web.Response:
+        delay_ms = self.latency(self.rnd)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000.0)
+        raw = json.dumps(body if body is not None else {"code": status, "msg": "error"},
+                         separators=(",", ":")).encode()
+        st = self.stats
+        st.requests += 1
+        st.by_status[status] = st.by_status.get(status, 0) + 1
+        st.bytes_tx += len(raw)
+        st.latencies_ms.append((time.perf_counter() - t0) * 1000.0)
+        return web.Response(body=raw, status=status, content_type="application/json", headers=headers)
+
+    async def _api(self, request: web.Request, make_body) -> web.Response:
+        t0 = time.perf_counter()
+        if not self._cookie_ok(request):
+            self.stats.challenges += 1
+            return await self._respond(t0, 403)
+        status = self._injected_status()
+        if status == 429 and self.cfg.retry_after:
+            return await self._respond(t0, 429, headers={"Retry-After": str(self.cfg.retry_after)})
+        if status is not None:
+            return await self._respond(t0, status)
+        return await self._respond(t0, 200, make_body(self.cfg, request.match_info["wallet"]))
+
+    # ---- handlers ----
+    async def home(self, request: web.Request) -> web.Response:
+        token = secrets.token_urlsafe(24)
+        self.clearances[token] = time.time()
+        resp = web.Response(text="<html><body>fake gmgn</body></html>", content_type="text/html")
+        resp.set_cookie("cf_clearance", token, path="/")
+        resp.set_cookie("__cf_bm", secrets.token_hex(8), path="/")
+        return resp
+
+    async def wallet_stat(self, request: web.Request) -> web.Response:
+        return await self._api(request, make_wallet_stat)
+
+    async def wallet_holdings(self, request: web.Request) -> web.Response:
+        return await self._api(request, make_holdings)
+
+    async def stats_view(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.as_dict())
+
+    async def reset_view(self, request: web.Request) -> web.Response:
+        self.stats = ServerStats()
+        return web.json_response({"ok": True})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.home)
+        app.router.add_get("/api/v1/wallet_stat/{chain}/{wallet}/{period}", self.wallet_stat)
+        app.router.add_get("/api/v1/wallet_holdings/{chain}/{wallet}", self.wallet_holdings)
+        app.router.add_get("/__stats", self.stats_view)
+        app.router.add_post("/__reset", self.reset_view)
+        return app
+
+
+def serve(cfg: FakeConfig, host: str = "127.0.0.1", port: int = 8765) -> None:
+    """Блокирующий запуск (удобно как target для multiprocessing.Process)."""
+    web.run_app(FakeGmgn(cfg).make_app(), host=host, port=port, print=None, access_log=None)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    xs = sorted(values)
+    k = max(0, min(len(xs) - 1, math.ceil(q / 100.0 * len(xs)) - 1))
+    return xs[k]
+
+
+def add_config_args(prs: argparse.ArgumentParser) -> None:
+    d = FakeConfig()
+    prs.add_argument("--latency", default=d.latency, help="const:MS | uniform:A:B | lognorm:MU:SIGMA | exp:MEAN")
+    prs.add_argument("--p403", type=float, default=d.p403)
+    prs.add_argument("--p429", type=float, default=d.p429)
+    prs.add_argument("--p5xx", type=float, default=d.p5xx)
+    prs.add_argument("--retry-after", type=float, default=d.retry_after)
+    prs.add_argument("--no-challenge", action="store_true", help="Не требовать cf_clearance")
+    prs.add_argument("--cookie-ttl", type=float, default=d.cookie_ttl)
+    prs.add_argument("--holdings-min", type=int, default=d.holdings_min)
+    prs.add_argument("--holdings-max", type=int, default=d.holdings_max)
+    prs.add_argument("--seed", type=int, default=d.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latency=args.latency,
+        p403=args.p403,
+        p429=args.p429,
+        p5xx=args.p5xx,
+        retry_after=args.retry_after,
+        challenge=not args.no_challenge,
+        cookie_ttl=args.cookie_ttl,
+        holdings_min=args.holdings_min,
+        holdings_max=args.holdings_max,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    prs = argparse.ArgumentParser("Fake GMGN server")
+    prs.add_argument("--host", default="127.0.0.1")
+    prs.add_argument("--port", type=int, default=8765)
+    add_config_args(prs)
+    args = prs.parse_args()
+    serve(config_from_args(args), args.host, args.port)
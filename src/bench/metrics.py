@@ -0,0 +1,82 @@
+# src/bench/metrics.py
+"""
+CPU-бенчмарк расчёта метрик holdings: эталон (calc_basic + calc_quality)
+против пакетного движка metrics_np, плюс сверка результатов.
+
+Данные — синтетика фейкового GMGN или ответы из архива GMGN_HTTP_RECORD:
+    python -m src.bench.metrics --wallets 2000 --holdings-max 2000
+    python -m src.bench.metrics --replay captures/holdings.jsonl.gz --batch 64
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+from src.bench.fake_gmgn import FakeConfig, make_holdings
+from src.scraper.gmgn.metrics import calc_basic, calc_quality
+from src.scraper.gmgn.metrics_np import calc_metrics_batch, check_parity
+
+
+def load_datas(args: argparse.Namespace) -> List[List[Dict[str, Any]]]:
+    if args.replay:
+        datas = []
+        with gzip.open(args.replay, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                rec = json.loads(line)
+                if "/wallet_holdings/" in rec.get("url", "") and rec.get("status") == 200:
+                    try:
+                        datas.append(json.loads(rec["body"])["data"]["holdings"])
+                    except Exception:
+                        continue
+        return datas[: args.wallets] if args.wallets else datas
+    cfg = FakeConfig(holdings_min=args.holdings_min, holdings_max=args.holdings_max, seed=args.seed)
+    return [make_holdings(cfg, f"bench-{i}")["data"]["holdings"] for i in range(args.wallets)]
+
+
+def main() -> None:
+    prs = argparse.ArgumentParser("Holdings metrics CPU bench")
+    prs.add_argument("--wallets", type=int, default=1000)
+    prs.add_argument("--holdings-min", type=int, default=20)
+    prs.add_argument("--holdings-max", type=int, default=300)
+    prs.add_argument("--batch", type=int, default=64)
+    prs.add_argument("--seed", type=int, default=42)
+    prs.add_argument("--replay", help="Архив GMGN_HTTP_RECORD с ответами wallet_holdings")
+    args = prs.parse_args()
+
+    datas = load_datas(args)
+    items = sum(len(d) for d in datas)
+
+    t0 = time.process_time()
+    for data in datas:
+        try:
+            calc_basic(data)
+            calc_quality(data)
+        except Exception:
+            pass
+    ref_cpu = time.process_time() - t0
+
+    t0 = time.process_time()
+    for i in range(0, len(datas), args.batch):
+        calc_metrics_batch(datas[i:i + args.batch])
+    np_cpu = time.process_time() - t0
+
+    diffs = []
+    for i in range(0, len(datas), args.batch):
+        diffs.extend((i + w, k, a, b) for w, k, a, b in check_parity(datas[i:i + args.batch]))
+
+    print(
+        f"wallets={len(datas)} holdings={items} batch={args.batch} | "
+        f"reference={ref_cpu:.3f}s numpy={np_cpu:.3f}s "
+        f"(×{ref_cpu / np_cpu if np_cpu else 0:.2f}) | parity diffs={len(diffs)}",
+        file=sys.stderr,
+    )
+    for d in diffs[:20]:
+        print(f"  wallet#{d[0]} {d[1]}: reference={d[2]!r} numpy={d[3]!r}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
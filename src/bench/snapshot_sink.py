@@ -0,0 +1,115 @@
+# src/bench/snapshot_sink.py
+"""
+Бенчмарк записи WalletSnapshot: ORM (add + commit на строку, как было в
+holdings_scraper), Core executemany с upsert и COPY → staging → upsert.
+
+Пишет синтетические строки с адресами ``bench_*`` в настоящую БД из
+POSTGRES_* и удаляет их после каждого прогона:
+    python -m src.bench.snapshot_sink --rows 2000 --batch 500
+    python -m src.bench.snapshot_sink --rows 20000 --paths executemany,copy
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import delete
+
+from src.sdk.databases.postgres.dependency import AsyncSessionLocal, engine
+from src.sdk.databases.postgres.models import WalletLatest, WalletSnapshot
+from src.sdk.databases.postgres.snapshot_sink import write_copy, write_executemany
+
+BENCH_PREFIX = "bench_"
+
+
+def make_rows(n: int, seed: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    ts = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=3650)
+    return [
+        {
+            "address": f"{BENCH_PREFIX}{i:08d}",
+            "ts_utc": ts,
+            "profit_factor": round(rnd.uniform(0, 10), 8),
+            "expectancy": round(rnd.uniform(-500, 500), 8),
+            "risk_reward": round(rnd.uniform(0, 5), 8),
+            "winrate_pct": round(rnd.uniform(0, 100), 2),
+            "net_pnl_30d_usd": round(rnd.uniform(-1e5, 1e5), 2),
+            "median_liquidity_usd": round(rnd.uniform(0, 1e6), 2),
+            "hhi": round(rnd.random(), 6),
+            "honeypot_share_pct": round(rnd.uniform(0, 10), 2),
+            "days_idle": round(rnd.uniform(0, 30), 2),
+            "total_trades": rnd.randint(1, 2000),
+            "avg_hold_human": "2h 5m",
+            "avg_interval_human": "1d 3h",
+            "turnover_usd": round(rnd.uniform(0, 1e6), 2),
+            "pnl_per_turnover": round(rnd.uniform(-1, 1), 6),
+            "pnl": round(rnd.uniform(-1e5, 1e5), 2),
+        }
+        for i in range(n)
+    ]
+
+
+async def path_orm(rows: List[Dict[str, Any]], batch: int) -> None:
+    async with AsyncSessionLocal() as session:
+        for r in rows:
+            session.add(WalletSnapshot(**r))
+            await session.commit()
+
+
+async def path_executemany(rows: List[Dict[str, Any]], batch: int) -> None:
+    for i in range(0, len(rows), batch):
+        await write_executemany(engine, rows[i:i + batch])
+
+
+async def path_copy(rows: List[Dict[str, Any]], batch: int) -> None:
+    for i in range(0, len(rows), batch):
+        await write_copy(engine, rows[i:i + batch])
+
+
+PATHS = {"orm": path_orm, "executemany": path_executemany, "copy": path_copy}
+
+
+async def cleanup() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(delete(WalletSnapshot).where(WalletSnapshot.address.like(f"{BENCH_PREFIX}%")))
+        await conn.execute(delete(WalletLatest).where(WalletLatest.address.like(f"{BENCH_PREFIX}%")))
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    rows = make_rows(args.rows, args.seed)
+    await cleanup()
+    try:
+        for name in args.paths.split(","):
+            n = args.orm_rows if name == "orm" else len(rows)
+            t0 = time.perf_counter()
+            await PATHS[name](rows[:n], args.batch)
+            dt = time.perf_counter() - t0
+            print(
+                f"[{name}] rows={n} batch={args.batch} → {dt:.3f}s, "
+                f"{n / dt if dt else 0:.0f} rows/s, {dt * 1000 / n:.3f} ms/row",
+                file=sys.stderr,
+            )
+            await cleanup()
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+def main() -> None:
+    prs = argparse.ArgumentParser("WalletSnapshot write paths bench")
+    prs.add_argument("--rows", type=int, default=2000)
+    prs.add_argument("--orm-rows", type=int, default=200, help="ORM-путь медленный — меньше строк")
+    prs.add_argument("--batch", type=int, default=500)
+    prs.add_argument("--paths", default="orm,executemany,copy")
+    prs.add_argument("--seed", type=int, default=42)
+    args = prs.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
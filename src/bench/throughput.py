@@ -0,0 +1,317 @@
+# src/bench/throughput.py
+"""
+End-to-end бенчмарк пропускной способности скрейперов против локального фейкового GMGN.
+
+Гоняет настоящие ``pnl_scraper.run_worker_requests`` и
+``holdings_scraper.HoldingsClient`` / ``analyse_wallet``; прокси и Playwright
+заменяются прямым подключением и запросом ``GET /`` к фейковому серверу.
+Фейковый сервер живёт в отдельном процессе, поэтому CPU считается только
+для клиента. С ``--replay`` сервер не поднимается: ответы берутся из архива,
+записанного через ``GMGN_HTTP_RECORD`` (см. ``src.sdk.infrastructure.http``).
+
+Примеры:
+    python -m src.bench.throughput --mode pnl --wallets 2000 --workers 8
+    python -m src.bench.throughput --mode holdings --wallets 300 --workers 4 \\
+        --latency lognorm:4.5:0.4 --p429 0.02 --p403 0.005
+    python -m src.bench.throughput --mode holdings --workers 4 \\
+        --replay captures/holdings.jsonl.gz --replay-scale 0 --dump-metrics /tmp/metrics.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import random
+import string
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Tuple
+
+from src.bench.fake_gmgn import add_config_args, config_from_args, percentile, serve
+
+B58 = "".join(c for c in string.ascii_letters + string.digits if c not in "0OIl")
+
+# ───────────────────────── helpers ──────────────────────────────────
+
+@dataclass
+class DirectProxy:
+    """Заглушка ProxyCfg: прямое подключение к локальному серверу."""
+    server_url: str = "direct"
+    username: str = ""
+    password: str = ""
+
+    def for_playwright(self) -> dict:
+        return {}
+
+    def for_curl(self) -> dict:
+        return {}
+
+
+@dataclass
+class BenchReport:
+    mode: str
+    wallets: int
+    workers: int
+    elapsed_s: float
+    wallets_per_s: float
+    requests: int
+    by_status: Dict[str, int]
+    wallet_errors: int          # кошельки без успешного ответа; в wallet_p* не входят
+    req_p50_ms: float
+    req_p99_ms: float
+    wallet_p50_ms: float
+    wallet_p99_ms: float
+    cpu_s: float
+    cpu_ms_per_request: float
+
+
+def fake_wallets(n: int, seed: int) -> List[str]:
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(B58) for _ in range(44)) for _ in range(n)]
+
+
+def make_cookie_fetcher(base_url: str | None):
+    if base_url is None:
+        async def static(worker) -> Dict[str, str]:
+            return {"cf_clearance": "replay"}
+        return static
+
+    from curl_cffi import requests as curl
+
+    async def fetch(worker) -> Dict[str, str]:
+        resp = await asyncio.to_thread(curl.get, base_url + "/", impersonate="chrome", timeout=30)
+        return dict(resp.cookies)
+    return fetch
+
+
+def _server_call(base_url: str, path: str, method: str = "GET") -> dict:
+    from curl_cffi import requests as curl
+    resp = curl.request(method, base_url + path, timeout=30)
+    return resp.json()
+
+
+def wallets_from_archive(path: str, mode: str) -> List[str]:
+    from src.sdk.infrastructure.http import get_replay_archive
+
+    marker = "/wallet_stat/" if mode == "pnl" else "/wallet_holdings/"
+    out = []
+    for key in get_replay_archive(path).keys():
+        if marker in key:
+            # /api/v1/wallet_stat/sol/<wallet>/7d | /api/v1/wallet_holdings/sol/<wallet>
+            tail = key.split(marker, 1)[1].split("/")
+            if len(tail) >= 2 and tail[1]:
+                out.append(tail[1])
+    return out
+
+
+def _wait_ready(base_url: str, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _server_call(base_url, "/__stats")
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"fake server at {base_url} is not ready")
+
+# ───────────────────────── pnl ──────────────────────────────────────
+
+async def run_pnl(wallets: List[str], n_workers: int, base_url: str | None,
+                  dump: str | None = None) -> Tuple[List[float], int]:
+    from src.scraper.gmgn import pnl_scraper as ps
+
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()     # хук зовётся из потоков воркеров
+
+    def on_wallet(_wallet: str, ms: float, ok: bool) -> None:
+        nonlocal errors
+        with lock:
+            if ok:
+                latencies.append(ms)
+            else:
+                errors += 1
+
+    fetcher = make_cookie_fetcher(base_url)
+    ps.COOKIE_QUEUE = ps.CookieRefreshQueue(asyncio.get_running_loop(), max_parallel=1, cookie_fetcher=fetcher)
+
+    parts = ps.split_evenly(wallets, n_workers)
+    workers = []
+    for i in range(n_workers):
+        ua_idx = i % len(ps.UA_LIST)
+        w = ps.Worker(name=f"B{i+1}", user_agent=ps.UA_LIST[ua_idx], proxy=DirectProxy(), ua_idx=ua_idx)
+        w.headers = ps.headers_for_worker(ua_idx, w.user_agent)
+        w.params = ps.make_worker_params(ps.PARAMS, ua_idx, w.user_agent)
+        w.wallets = parts[i]
+        w.cookies = await fetcher(w)
+        w.cookies_ts = time.time()
+        workers.append(w)
+
+    loop = asyncio.get_running_loop()
+    ps.WALLET_TIMING_HOOK = on_wallet
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            await asyncio.gather(*(loop.run_in_executor(pool, ps.run_worker_requests, w) for w in workers))
+    finally:
+        ps.WALLET_TIMING_HOOK = None
+    return latencies, errors
+
+# ───────────────────────── holdings ─────────────────────────────────
+
+async def run_holdings(wallets: List[str], n_workers: int, base_url: str | None,
+                       dump: str | None = None) -> Tuple[List[float], int]:
+    from src.scraper.gmgn import holdings_scraper as hs
+
+    fetcher = make_cookie_fetcher(base_url)
+    workers = hs.build_workers(n_workers)
+    parts = hs.split_evenly(wallets, n_workers)
+    latencies: List[float] = []
+    results: List[Dict] = []
+    errors = 0
+
+    async def one(w, addrs: List[str]) -> None:
+        nonlocal errors
+        w.proxy = DirectProxy()
+        w.cookies = await fetcher(w)
+        w.cookies_ts = time.time()
+        client = hs.HoldingsClient(w, cookie_fetcher=fetcher)
+        try:
+            for addr in addrs:
+                t0 = time.perf_counter()
+                try:
+                    results.append(await hs.analyse_wallet(addr, client))
+                except Exception:
+                    errors += 1     # неудачные не входят в латентность
+                    continue
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+        finally:
+            client.close()
+
+    await asyncio.gather(*(one(w, parts[i]) for i, w in enumerate(workers)))
+    if dump:
+        # метрики без полей, зависящих от момента запуска, — для сравнения прогонов
+        with open(dump, "w", encoding="utf-8") as fh:
+            for row in sorted(results, key=lambda r: r["address"]):
+                row = {k: v for k, v in row.items() if k not in ("timestamp_utc", "days_idle")}
+                fh.write(json.dumps(row, ensure_ascii=False, sort_keys=True) + "\n")
+    return latencies, errors
+
+# ───────────────────────── main ─────────────────────────────────────
+
+def _run_replay(args: argparse.Namespace) -> BenchReport:
+    from src.sdk.infrastructure.http import get_replay_archive, set_replay
+
+    set_replay(args.replay, args.replay_scale)
+
+    wallets = wallets_from_archive(args.replay, args.mode)
+    if args.wallets:
+        wallets = wallets[: args.wallets]
+    runner = run_pnl if args.mode == "pnl" else run_holdings
+
+    archive = get_replay_archive(args.replay)
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    try:
+        wallet_lat, errors = asyncio.run(runner(wallets, args.workers, None, args.dump_metrics))
+    finally:
+        set_replay(None)
+    elapsed, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    stats = {
+        "requests": archive.stats.served,
+        "by_status": {"missing": archive.stats.missing},
+        "latencies_ms": archive.stats.latencies_ms,
+    }
+    return _make_report(args, wallets, elapsed, cpu, stats, wallet_lat, errors)
+
+
+def run_bench(args: argparse.Namespace) -> BenchReport:
+    # настройки скрейперов читаются при импорте → выставляем env до него
+    for key in ("REQ_SLEEP_MIN", "REQ_SLEEP_MAX", "PNL_REQ_SLEEP_MIN", "PNL_REQ_SLEEP_MAX"):
+        os.environ[key] = str(args.req_sleep)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SUCCESS_LOG_SAMPLE_RATE", "0")
+    if args.replay:
+        return _run_replay(args)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    os.environ["GMGN_BASE_URL"] = base_url
+
+    proc = mp.get_context("spawn").Process(
+        target=serve, args=(config_from_args(args), "127.0.0.1", args.port), daemon=True,
+    )
+    proc.start()
+    try:
+        _wait_ready(base_url)
+        wallets = fake_wallets(args.wallets, args.seed)
+        runner = run_pnl if args.mode == "pnl" else run_holdings
+
+        _server_call(base_url, "/__reset", "POST")
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        wallet_lat, errors = asyncio.run(runner(wallets, args.workers, base_url, args.dump_metrics))
+        elapsed, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+        stats = _server_call(base_url, "/__stats")
+    finally:
+        proc.terminate()
+        proc.join(5)
+    return _make_report(args, wallets, elapsed, cpu, stats, wallet_lat, errors)
+
+
+def _make_report(args: argparse.Namespace, wallets: List[str], elapsed: float, cpu: float,
+                 stats: dict, wallet_lat: List[float], wallet_errors: int = 0) -> BenchReport:
+    req_lat = stats["latencies_ms"]
+    requests = stats["requests"]
+    by_status = dict(stats["by_status"])
+    if wallet_errors:
+        by_status["wallet_error"] = wallet_errors
+    return BenchReport(
+        mode=args.mode,
+        wallets=len(wallets),
+        workers=args.workers,
+        elapsed_s=round(elapsed, 3),
+        wallets_per_s=round(len(wallets) / elapsed, 2) if elapsed else 0.0,
+        requests=requests,
+        by_status=by_status,
+        wallet_errors=wallet_errors,
+        req_p50_ms=round(percentile(req_lat, 50), 2),
+        req_p99_ms=round(percentile(req_lat, 99), 2),
+        wallet_p50_ms=round(percentile(wallet_lat, 50), 2),
+        wallet_p99_ms=round(percentile(wallet_lat, 99), 2),
+        cpu_s=round(cpu, 3),
+        cpu_ms_per_request=round(cpu * 1000.0 / requests, 3) if requests else 0.0,
+    )
+
+
+def main() -> None:
+    prs = argparse.ArgumentParser("GMGN scrapers throughput bench")
+    prs.add_argument("--mode", choices=("pnl", "holdings"), default="pnl")
+    prs.add_argument("--wallets", type=int, default=1000)
+    prs.add_argument("--workers", type=int, default=5)
+    prs.add_argument("--port", type=int, default=8765)
+    prs.add_argument("--req-sleep", type=float, default=0.0, help="Пауза скрейпера между запросами (сек)")
+    prs.add_argument("--json", dest="json_out", help="Куда дописать отчёт (JSONL)")
+    prs.add_argument("--replay", help="Архив GMGN_HTTP_RECORD вместо фейкового сервера")
+    prs.add_argument("--replay-scale", type=float, default=1.0, help="Масштаб исходных таймингов (0 — без пауз)")
+    prs.add_argument("--dump-metrics", help="holdings: записать метрики кошельков (JSONL) для сравнения прогонов")
+    add_config_args(prs)
+    args = prs.parse_args()
+
+    rep = run_bench(args)
+    print(
+        f"[{rep.mode}] wallets={rep.wallets} workers={rep.workers} elapsed={rep.elapsed_s}s "
+        f"→ {rep.wallets_per_s} wallets/s | requests={rep.requests} {rep.by_status} | "
+        f"req p50={rep.req_p50_ms}ms p99={rep.req_p99_ms}ms | "
+        f"wallet p50={rep.wallet_p50_ms}ms p99={rep.wallet_p99_ms}ms errors={rep.wallet_errors} | "
+        f"cpu={rep.cpu_s}s ({rep.cpu_ms_per_request} ms/req)",
+        file=sys.stderr,
+    )
+    if args.json_out:
+        with open(args.json_out, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(asdict(rep), ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
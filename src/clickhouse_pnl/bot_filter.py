@@ -0,0 +1,213 @@
+"""
+Классификатор ботов / MEV по ритму свопов → denylist в Redis.
+
+Снайперы, MEV-сёрчеры и агрегаторы всплывают почти на каждом токене, жгут
+запросы GMGN и копировать их бессмысленно. Задача периодически проходит по
+сырым свопам PumpSwap и Raydium и для кошельков, активных с прошлого прогона
+(watermark), считает за последние BOT_WINDOW_H часов:
+
+ * trades_per_min   — свопов на активную минуту;
+ * tokens           — разных токенов;
+ * same_block_pairs — (токен, блок), где кошелёк и купил, и продал.
+
+Блок — колонка BOT_BLOCK_COLS[src] (по умолчанию block_time; если в таблице
+есть slot — лучше указать её). Любое сработавшее правило → кошелёк в
+denylist:
+
+ * <BOT_DENYLIST>       → SET кошельков; pnl_producer проверяет SMISMEMBER перед пушем
+ * <BOT_DENYLIST>:ts    → ZSET кошелёк → время последнего срабатывания; старше
+                          BOT_DENY_TTL_DAYS — удаляется из обоих ключей
+ * <BOT_DENYLIST>:wm    → watermark (unix, с) прошлого прогона
+
+    python -m src.clickhouse_pnl.bot_filter              # один прогон
+    python -m src.clickhouse_pnl.bot_filter --every 900  # по расписанию
+    python -m src.clickhouse_pnl.bot_filter --dry-run    # только посчитать
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from src.sdk.databases.clickhouse.click_connect import ClickHouseDB, get_db
+
+BOT_DENYLIST = os.getenv("BOT_DENYLIST", "bot_denylist")
+BOT_WINDOW_H = int(os.getenv("BOT_WINDOW_H", "24"))
+BOT_LAG_S = int(os.getenv("BOT_LAG_S", "120"))                 # запас на поздние вставки свопов
+BOT_DENY_TTL_DAYS = float(os.getenv("BOT_DENY_TTL_DAYS", "14"))
+BOT_MAX_TRADES_PER_MIN = float(os.getenv("BOT_MAX_TRADES_PER_MIN", "6"))
+BOT_MAX_TOKENS = int(os.getenv("BOT_MAX_TOKENS", "150"))
+BOT_MIN_SAME_BLOCK_PAIRS = int(os.getenv("BOT_MIN_SAME_BLOCK_PAIRS", "3"))
+BOT_MIN_TRADES = int(os.getenv("BOT_MIN_TRADES", "20"))        # меньше свопов — не судим
+BOT_BLOCK_COLS: Dict[str, str] = {
+    k.strip(): v.strip()
+    for k, v in (
+        pair.split("=", 1)
+        for pair in os.getenv("BOT_BLOCK_COLS", "PumpSwap=block_time,Raydium=block_time").split(",")
+        if "=" in pair
+    )
+}
+
+# источник → (таблица, колонка кошелька, колонка токена)
+SOURCES: Dict[str, tuple] = {
+    "PumpSwap": ("pumpswap_all_swaps", "signing_wallet", "base_token"),
+    "Raydium":  ("raydium_cpmm_swaps", "fee_payer", "base_coin"),
+}
+
+
+def _source_rows(src: str) -> str:
+    """(wallet, token, blk, n, buys, sells, minute) по кошелькам, активным после {since}."""
+    table, wallet, token = SOURCES[src]
+    blk = BOT_BLOCK_COLS.get(src, "block_time")
+    return f"""
+        SELECT
+            {wallet}                          AS wallet,
+            {token}                           AS token,
+            toString({blk})                   AS blk,
+            count()                           AS n,
+            countIf(direction = 'B')          AS buys,
+            countIf(direction = 'S')          AS sells,
+            toStartOfMinute(min(block_time))  AS minute
+        FROM {table}
+        WHERE block_time >= now() - INTERVAL {{window_h:UInt32}} HOUR
+          AND {wallet} IN (
+              SELECT DISTINCT {wallet} FROM {table}
+              WHERE block_time > toDateTime({{since:UInt32}})
+          )
+        GROUP BY wallet, token, blk
+    """
+
+
+def features_query() -> str:
+    union = "\n        UNION ALL\n".join(_source_rows(src) for src in SOURCES)
+    return f"""
+    SELECT
+        wallet,
+        sum(n)                                   AS trades,
+        uniqExact(minute)                        AS active_minutes,
+        uniqExact(token)                         AS tokens,
+        countIf(buys > 0 AND sells > 0)          AS same_block_pairs
+    FROM ({union})
+    GROUP BY wallet
+    HAVING trades >= {{min_trades:UInt32}}
+    """
+
+
+@dataclass
+class WalletCadence:
+    wallet: str
+    trades: int
+    active_minutes: int
+    tokens: int
+    same_block_pairs: int
+
+    @property
+    def trades_per_min(self) -> float:
+        return self.trades / max(1, self.active_minutes)
+
+    def reasons(self) -> List[str]:
+        out = []
+        if self.trades_per_min > BOT_MAX_TRADES_PER_MIN:
+            out.append("cadence")
+        if self.tokens > BOT_MAX_TOKENS:
+            out.append("tokens")
+        if self.same_block_pairs >= BOT_MIN_SAME_BLOCK_PAIRS:
+            out.append("same_block")
+        return out
+
+
+def fetch_cadence(since: int, db: Optional[ClickHouseDB] = None) -> List[WalletCadence]:
+    db = db or get_db()
+    rows = db.fetchall(
+        features_query(),
+        params={"since": since, "window_h": BOT_WINDOW_H, "min_trades": BOT_MIN_TRADES},
+        tags={"source": "bot_filter", "fetcher": "fetch_cadence"},
+    )
+    return [
+        WalletCadence(r[0], int(r[1]), int(r[2]), int(r[3]), int(r[4])) if not isinstance(r, dict)
+        else WalletCadence(r["wallet"], int(r["trades"]), int(r["active_minutes"]),
+                           int(r["tokens"]), int(r["same_block_pairs"]))
+        for r in rows
+    ]
+
+
+def refresh_denylist(rds, db: Optional[ClickHouseDB] = None, *, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Один инкрементальный прогон: кошельки, активные после watermark → правила →
+    SADD/ZADD в denylist, чистка просроченных, новый watermark. Синхронный redis-py.
+    """
+    started = int(time.time())
+    wm = rds.get(f"{BOT_DENYLIST}:wm")
+    since = int(wm) if wm else started - BOT_WINDOW_H * 3600
+    since -= BOT_LAG_S
+
+    flagged: Dict[str, List[str]] = {}
+    for c in fetch_cadence(since, db):
+        reasons = c.reasons()
+        if reasons:
+            flagged[c.wallet] = reasons
+    by_reason = Counter(r for rs in flagged.values() for r in rs)
+
+    expired: List[str] = []
+    if not dry_run:
+        pipe = rds.pipeline(transaction=False)
+        if flagged:
+            pipe.sadd(BOT_DENYLIST, *flagged)
+            pipe.zadd(f"{BOT_DENYLIST}:ts", {w: started for w in flagged})
+        pipe.set(f"{BOT_DENYLIST}:wm", started)
+        pipe.execute()
+
+        cutoff = started - BOT_DENY_TTL_DAYS * 86400
+        expired = [w.decode() if isinstance(w, (bytes, bytearray)) else w
+                   for w in rds.zrangebyscore(f"{BOT_DENYLIST}:ts", "-inf", cutoff)]
+        if expired:
+            pipe = rds.pipeline(transaction=False)
+            pipe.srem(BOT_DENYLIST, *expired)
+            pipe.zrem(f"{BOT_DENYLIST}:ts", *expired)
+            pipe.execute()
+
+    return {"flagged": len(flagged), "expired": len(expired), "since": since, **by_reason}
+
+
+def filter_denied(rds, wallets: Sequence[str]) -> List[str]:
+    """Кошельки без попавших в denylist (один SMISMEMBER на пачку)."""
+    if not wallets:
+        return []
+    denied = rds.smismember(BOT_DENYLIST, list(wallets))
+    return [w for w, d in zip(wallets, denied) if not int(d)]
+
+
+def main() -> None:
+    from src.sdk.queues.redis_connect import get_redis_sync
+
+    prs = argparse.ArgumentParser("Bot / MEV wallet denylist refresher")
+    prs.add_argument("--every", type=int, default=0, help="Повторять каждые N секунд (0 — один прогон)")
+    prs.add_argument("--dry-run", action="store_true", help="Посчитать, но не писать в Redis")
+    args = prs.parse_args()
+
+    rds = get_redis_sync()
+    while True:
+        t0 = time.perf_counter()
+        res = refresh_denylist(rds, dry_run=args.dry_run)
+        print(f"🤖 denylist «{BOT_DENYLIST}»: {res} за {time.perf_counter() - t0:.1f}s, "
+              f"всего {rds.scard(BOT_DENYLIST)}", file=sys.stderr)
+        if args.every <= 0:
+            return
+        time.sleep(args.every)
+
+
+__all__: list[str] = [
+    "BOT_DENYLIST",
+    "WalletCadence",
+    "fetch_cadence",
+    "refresh_denylist",
+    "filter_denied",
+]
+
+
+if __name__ == "__main__":
+    main()
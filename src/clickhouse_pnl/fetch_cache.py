@@ -0,0 +1,137 @@
+"""
+Кэш результатов fetcher-ов в Redis по (источник, токен) с инвалидацией по watermark.
+
+Один и тот же трендовый токен приходит в token-очереди на каждом прогоне
+dexscreener, и каждый раз fetcher заново считает тяжёлый агрегат. Здесь перед
+агрегатом идёт дешёвый probe — max(FETCH_CACHE_TIME_COLS[src]) и count() по
+свопам токена; если watermark совпал с сохранённым, берём список кошельков
+из Redis.
+
+Probe выполняется ДО агрегата: свопы, вставленные между ними, попадут в
+результат, но не в watermark — следующий probe увидит разницу и пересчитает.
+Кэш никогда не отдаёт результат старее своего watermark.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.sdk.databases.clickhouse.click_connect import ClickHouseDB, get_db
+
+FETCH_CACHE = os.getenv("FETCH_CACHE", "0").lower() in ("1", "true", "yes")
+FETCH_CACHE_PREFIX = os.getenv("FETCH_CACHE_PREFIX", "fetch_cache")
+FETCH_CACHE_TTL = int(os.getenv("FETCH_CACHE_TTL", str(3 * 24 * 3600)))
+# колонка времени/слота свопа для probe, по источнику
+FETCH_CACHE_TIME_COLS: Dict[str, str] = {
+    k.strip(): v.strip()
+    for k, v in (
+        pair.split("=", 1)
+        for pair in os.getenv(
+            "FETCH_CACHE_TIME_COLS",
+            "PumpSwap=block_time,Raydium=block_time,Meteora=block_time",
+        ).split(",")
+        if "=" in pair
+    )
+}
+
+# источник → (сырая таблица свопов, колонки, по которым fetcher отбирает токен)
+SOURCE_TABLES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "PumpSwap": ("pumpswap_all_swaps", ("base_token",)),
+    "Raydium":  ("raydium_cpmm_swaps", ("base_coin",)),
+    "Meteora":  ("meteora_swaps", ("base_coin", "quote_coin")),
+}
+
+
+@dataclass
+class FetchCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def add(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+
+STATS = FetchCacheStats()
+
+
+def cache_key(src: str, token: str, variant: str = "") -> str:
+    # variant — формат записи (например, "pct" для пар [кошелёк, перцентиль])
+    return f"{FETCH_CACHE_PREFIX}:{src}:{variant + ':' if variant else ''}{token}"
+
+
+def probe_query(src: str) -> str:
+    table, cols = SOURCE_TABLES[src]
+    time_col = FETCH_CACHE_TIME_COLS.get(src, "block_time")
+    if len(cols) == 1:
+        token_expr = cols[0]
+    else:
+        token_expr = f"arrayJoin(arrayFilter(t -> has({{tokens:Array(String)}}, t), [{', '.join(cols)}]))"
+    where = " OR ".join(f"{c} IN {{tokens:Array(String)}}" for c in cols)
+    return (
+        f"SELECT {token_expr} AS token, toString(max({time_col})) AS wm_max, count() AS wm_cnt "
+        f"FROM {table} WHERE {where} GROUP BY token"
+    )
+
+
+def probe_watermarks(src: str, tokens: Sequence[str],
+                     db: Optional[ClickHouseDB] = None) -> Dict[str, str]:
+    """{token: "max_time|count"}; токенов без свопов в ответе нет (watermark "")."""
+    tags = {"source": src, "fetcher": "probe_watermarks", "tokens": len(tokens)}
+    rows = (db or get_db()).fetchall(probe_query(src), params={"tokens": list(tokens)}, tags=tags)
+    return {r[0]: f"{r[1]}|{r[2]}" for r in rows}
+
+
+def cached_fetch(
+    rds,
+    src: str,
+    tokens: Sequence[str],
+    fetch: Callable[[List[str]], Dict[str, List[Any]]],
+    db: Optional[ClickHouseDB] = None,
+    variant: str = "",
+) -> Dict[str, List[Any]]:
+    """
+    {token: wallets} для пачки токенов: совпавшие по watermark — из Redis,
+    остальные — одним вызовом fetch(stale) с записью в кэш.
+    """
+    tokens = list(tokens)
+    if not FETCH_CACHE or src not in SOURCE_TABLES or not tokens:
+        return fetch(tokens)
+
+    watermarks = probe_watermarks(src, tokens, db)
+    out: Dict[str, List[Any]] = {}
+    stale: List[str] = []
+    for token, raw in zip(tokens, rds.mget([cache_key(src, t, variant) for t in tokens])):
+        entry = json.loads(raw) if raw else None
+        if entry is not None and entry.get("wm") == watermarks.get(token, ""):
+            out[token] = entry["wallets"]
+        else:
+            stale.append(token)
+
+    if stale:
+        fresh = fetch(stale)
+        pipe = rds.pipeline(transaction=False)
+        for token in stale:
+            wallets = fresh.get(token, [])
+            out[token] = wallets
+            entry = {"wm": watermarks.get(token, ""), "wallets": wallets}
+            pipe.set(cache_key(src, token, variant), json.dumps(entry, separators=(",", ":")), ex=FETCH_CACHE_TTL)
+        pipe.execute()
+
+    STATS.add(len(tokens) - len(stale), len(stale))
+    return out
+
+
+__all__: list[str] = [
+    "FETCH_CACHE",
+    "STATS",
+    "cached_fetch",
+    "probe_watermarks",
+]
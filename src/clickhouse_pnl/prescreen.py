@@ -0,0 +1,312 @@
+"""
+Предфильтр кошельков перед GMGN: дешёвые признаки из ClickHouse + модель.
+
+Каждый кошелёк в wallet_queue — платный запрос wallet_stat через прокси, а
+нужны только те, у кого GMGN pnl > PNL_MIN_THRESHOLD. История свопов у нас
+уже есть, поэтому перед пушем продюсер одним агрегатом (UNION ALL по
+PumpSwap и Raydium, окно PRESCREEN_DAYS) считает по каждому кошельку:
+
+ * pnl_sol   — реализованный quote-PnL за окно в SOL (lamports / 1e9): PumpSwap
+               целиком, Raydium — только пулы с quote = WSOL (у остальных
+               quote_coin_amount в единицах другой монеты и складывать их нельзя);
+ * trades    — число свопов;
+ * tokens    — число разных токенов;
+ * win_ratio — доля токенов с положительным PnL.
+
+Решение принимает PrescreenModel: пороги (kind="threshold") или логистическая
+регрессия (kind="logistic"), обученная на прошлых ответах GMGN. pnl_scraper
+при PRESCREEN_LABELS=1 пишет их в Redis HASH PRESCREEN_LABELS_KEY
+(кошелёк → pnl), обучение:
+
+    python -m src.clickhouse_pnl.prescreen train --out prescreen_model.json
+    python -m src.clickhouse_pnl.prescreen eval  --model prescreen_model.json
+
+Кошельки без свопов в окне (нет признаков) пропускаются дальше при
+PRESCREEN_KEEP_UNKNOWN=1 — фильтр только отсекает, но не гадает.
+
+Цена: таблицы свопов отсортированы по токену, поэтому signing_wallet IN /
+fee_payer IN не используют ключ — каждый запрос (PRESCREEN_CHUNK кошельков)
+читает окно PRESCREEN_DAYS обеих таблиц целиком. 100k кошельков при
+PRESCREEN_CHUNK=5000 — 20 таких сканов; крупнее чанк — меньше сканов.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.sdk.databases.clickhouse.click_connect import ClickHouseDB, get_db, np
+
+PRESCREEN = os.getenv("PRESCREEN", "0").lower() in ("1", "true", "yes")
+PRESCREEN_DAYS = int(os.getenv("PRESCREEN_DAYS", "7"))
+PRESCREEN_CHUNK = int(os.getenv("PRESCREEN_CHUNK", "5000"))    # кошельков в одном запросе (= один скан окна)
+WSOL_MINT = os.getenv("WSOL_MINT", "So11111111111111111111111111111111111111112")
+PRESCREEN_MODEL = os.getenv("PRESCREEN_MODEL", "prescreen_model.json")
+PRESCREEN_KEEP_UNKNOWN = os.getenv("PRESCREEN_KEEP_UNKNOWN", "1").lower() in ("1", "true", "yes")
+PRESCREEN_LABELS_KEY = os.getenv("PRESCREEN_LABELS_KEY", "prescreen:labels")
+# пороги по умолчанию (kind="threshold", если файла модели нет)
+PRESCREEN_MIN_PNL_SOL = float(os.getenv("PRESCREEN_MIN_PNL_SOL", "0"))
+PRESCREEN_MIN_TRADES = int(os.getenv("PRESCREEN_MIN_TRADES", "0"))
+PRESCREEN_MIN_WIN_RATIO = float(os.getenv("PRESCREEN_MIN_WIN_RATIO", "0"))
+
+PNL_MIN_THRESHOLD = float(os.getenv("PNL_MIN_THRESHOLD", "0.6"))   # тот же, что у pnl_scraper
+
+FEATURE_NAMES = ("pnl_sol", "trades", "tokens", "win_ratio")
+
+# (wallet, token) → PnL и число свопов, затем по кошельку; block_time — как у fetch_cache
+FEATURES_QUERY = """
+    SELECT
+        wallet,
+        sum(pnl) / 1e9           AS pnl_sol,
+        sum(trades)              AS trades,
+        count()                  AS tokens,
+        countIf(pnl > 0) / count() AS win_ratio
+    FROM (
+        SELECT
+            signing_wallet AS wallet,
+            base_token     AS token,
+            toFloat64(
+                sumIf(quote_token_amount, direction = 'S')
+                  - sumIf(quote_token_amount, direction = 'B')
+                  - sum(lp_fee + protocol_fee + fee)
+            )              AS pnl,
+            count()        AS trades
+        FROM pumpswap_all_swaps
+        WHERE signing_wallet IN {wallets:Array(String)}
+          AND block_time >= now() - INTERVAL {days:UInt32} DAY
+        GROUP BY wallet, token
+
+        UNION ALL
+
+        SELECT
+            fee_payer      AS wallet,
+            base_coin      AS token,
+            toFloat64(sum(
+                if(direction = 'S', toInt128(quote_coin_amount), -toInt128(quote_coin_amount))
+            ))             AS pnl,
+            count()        AS trades
+        FROM raydium_cpmm_swaps
+        WHERE fee_payer IN {wallets:Array(String)}
+          AND quote_coin = {wsol:String}          -- только SOL-котировка: те же lamports, что у PumpSwap
+          AND block_time >= now() - INTERVAL {days:UInt32} DAY
+        GROUP BY wallet, token
+    )
+    GROUP BY wallet
+"""
+
+
+def fetch_features(wallets: Sequence[str], db: Optional[ClickHouseDB] = None,
+                   days: int = PRESCREEN_DAYS) -> Dict[str, Tuple[float, ...]]:
+    """{кошелёк: (pnl_sol, trades, tokens, win_ratio)}; кошельков без свопов в окне в ответе нет."""
+    db = db or get_db()
+    wallets = list(dict.fromkeys(wallets))
+    out: Dict[str, Tuple[float, ...]] = {}
+    for i in range(0, len(wallets), PRESCREEN_CHUNK):
+        chunk = wallets[i:i + PRESCREEN_CHUNK]
+        rows = db.fetchall(FEATURES_QUERY, params={"wallets": chunk, "days": days, "wsol": WSOL_MINT},
+                           tags={"source": "prescreen", "fetcher": "fetch_features", "wallets": len(chunk)})
+        for r in rows:
+            if isinstance(r, dict):
+                r = (r["wallet"], *(r[k] for k in FEATURE_NAMES))
+            out[r[0]] = tuple(float(x) for x in r[1:])
+    return out
+
+
+def _transform(f: Sequence[float]) -> List[float]:
+    """Признаки для логистической модели: лог-шкала для PnL и счётчиков."""
+    pnl, trades, tokens, win = f
+    return [math.copysign(math.log1p(abs(pnl)), pnl), math.log1p(trades), math.log1p(tokens), win]
+
+
+@dataclass
+class PrescreenModel:
+    kind: str = "threshold"                      # threshold | logistic
+    min_pnl_sol: float = PRESCREEN_MIN_PNL_SOL
+    min_trades: int = PRESCREEN_MIN_TRADES
+    min_win_ratio: float = PRESCREEN_MIN_WIN_RATIO
+    weights: List[float] = field(default_factory=list)
+    bias: float = 0.0
+    cutoff: float = 0.5
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def score(self, f: Sequence[float]) -> float:
+        z = self.bias + sum(w * x for w, x in zip(self.weights, _transform(f)))
+        return 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, z))))
+
+    def accept(self, f: Sequence[float]) -> bool:
+        if self.kind == "logistic":
+            return self.score(f) >= self.cutoff
+        pnl, trades, _tokens, win = f
+        return pnl >= self.min_pnl_sol and trades >= self.min_trades and win >= self.min_win_ratio
+
+    def save(self, path: str) -> None:
+        Path(path).write_text(json.dumps(asdict(self), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str = PRESCREEN_MODEL) -> "PrescreenModel":
+        """Модель из JSON; нет файла — пороги из ENV."""
+        p = Path(path)
+        if not p.exists():
+            return cls()
+        return cls(**json.loads(p.read_text(encoding="utf-8")))
+
+
+@dataclass
+class PrescreenStats:
+    seen: int = 0
+    passed: int = 0
+    unknown: int = 0
+    failed: int = 0          # кошельков, пропущенных без проверки из-за ошибки
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def add(self, seen: int, passed: int, unknown: int) -> None:
+        with self._lock:
+            self.seen += seen
+            self.passed += passed
+            self.unknown += unknown
+
+    def add_failed(self, n: int) -> None:
+        with self._lock:
+            self.failed += n
+
+
+STATS = PrescreenStats()
+_MODEL: Optional[PrescreenModel] = None
+
+
+def get_model() -> PrescreenModel:
+    global _MODEL
+    if _MODEL is None:
+        _MODEL = PrescreenModel.load()
+    return _MODEL
+
+
+def prescreen(wallets: Sequence[str], db: Optional[ClickHouseDB] = None,
+              model: Optional[PrescreenModel] = None) -> set[str]:
+    """Множество кошельков, которые стоит отправить в GMGN."""
+    model = model or get_model()
+    uniq = set(wallets)
+    feats = fetch_features(list(uniq), db)
+    keep = set()
+    unknown = 0
+    for w in uniq:
+        f = feats.get(w)
+        if f is None:
+            unknown += 1
+            if PRESCREEN_KEEP_UNKNOWN:
+                keep.add(w)
+        elif model.accept(f):
+            keep.add(w)
+    STATS.add(len(uniq), len(keep), unknown)
+    return keep
+
+# ───────────────────────── training CLI ──────────────────────────────
+
+def load_labels(rds) -> Dict[str, float]:
+    """{кошелёк: GMGN pnl} из PRESCREEN_LABELS_KEY (sync redis-py)."""
+    out: Dict[str, float] = {}
+    for k, v in rds.hscan_iter(PRESCREEN_LABELS_KEY, count=5000):
+        k = k.decode() if isinstance(k, (bytes, bytearray)) else k
+        out[k] = float(v)
+    return out
+
+
+def dataset(labels: Dict[str, float], db: Optional[ClickHouseDB] = None,
+            days: int = PRESCREEN_DAYS) -> Tuple[List[Tuple[float, ...]], List[int]]:
+    """Признаки (на момент вызова) + метка pnl > PNL_MIN_THRESHOLD для размеченных кошельков со свопами."""
+    feats = fetch_features(list(labels), db, days)
+    X, y = [], []
+    for w, f in feats.items():
+        X.append(f)
+        y.append(int(labels[w] > PNL_MIN_THRESHOLD))
+    return X, y
+
+
+def train_logistic(X: List[Tuple[float, ...]], y: List[int], *, epochs: int = 500,
+                   lr: float = 0.1, l2: float = 1e-3, recall: float = 0.95) -> PrescreenModel:
+    """
+    Логистическая регрессия (batch gradient descent, class-balanced веса) на NumPy.
+    cutoff подбирается так, чтобы на обучающих данных пропускать ≥ recall положительных.
+    """
+    if np is None:
+        raise RuntimeError("train требует numpy")
+    A = np.array([_transform(f) for f in X], dtype=np.float64)
+    t = np.array(y, dtype=np.float64)
+    pos = max(1.0, t.sum())
+    neg = max(1.0, len(t) - t.sum())
+    sw = np.where(t > 0, len(t) / (2 * pos), len(t) / (2 * neg))
+    w = np.zeros(A.shape[1])
+    b = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-np.clip(A @ w + b, -50, 50)))
+        g = sw * (p - t)
+        w -= lr * (A.T @ g / len(t) + l2 * w)
+        b -= lr * g.mean()
+
+    p = 1.0 / (1.0 + np.exp(-np.clip(A @ w + b, -50, 50)))
+    pos_scores = np.sort(p[t > 0])
+    cutoff = float(pos_scores[int((1 - recall) * len(pos_scores))]) if len(pos_scores) else 0.5
+    return PrescreenModel(kind="logistic", weights=[float(x) for x in w], bias=float(b), cutoff=cutoff,
+                          meta={"rows": len(t), "positives": int(t.sum()), "target_recall": recall,
+                                "days": PRESCREEN_DAYS, "features": list(FEATURE_NAMES)})
+
+
+def evaluate(model: PrescreenModel, X: List[Tuple[float, ...]], y: List[int]) -> Dict[str, float]:
+    """Доля пропущенных (= доля оставшихся запросов GMGN) и полнота по положительным."""
+    acc = [model.accept(f) for f in X]
+    pos = sum(y)
+    return {
+        "rows": len(y),
+        "positives": pos,
+        "pass_rate": sum(acc) / len(y) if y else 0.0,
+        "recall": sum(a and t for a, t in zip(acc, y)) / pos if pos else 0.0,
+    }
+
+
+def main() -> None:
+    from src.sdk.queues.redis_connect import get_redis_sync
+
+    prs = argparse.ArgumentParser("PnL prescreen model")
+    sub = prs.add_subparsers(dest="cmd", required=True)
+    tr = sub.add_parser("train", help="Обучить логистическую модель на метках GMGN из Redis")
+    tr.add_argument("--out", default=PRESCREEN_MODEL)
+    tr.add_argument("--recall", type=float, default=0.95, help="Какую долю положительных сохранить")
+    tr.add_argument("--epochs", type=int, default=500)
+    ev = sub.add_parser("eval", help="Оценить модель (или пороги из ENV) на метках")
+    ev.add_argument("--model", default=PRESCREEN_MODEL)
+    args = prs.parse_args()
+
+    labels = load_labels(get_redis_sync())
+    X, y = dataset(labels)
+    print(f"меток: {len(labels)}, с признаками: {len(y)}, положительных: {sum(y)}", file=sys.stderr)
+    if not y:
+        return
+    if args.cmd == "train":
+        model = train_logistic(X, y, epochs=args.epochs, recall=args.recall)
+        model.meta.update(evaluate(model, X, y))
+        model.save(args.out)
+        print(f"модель → {args.out}: {model.meta}", file=sys.stderr)
+    else:
+        print(evaluate(PrescreenModel.load(args.model), X, y), file=sys.stderr)
+
+
+__all__: list[str] = [
+    "PRESCREEN",
+    "PrescreenModel",
+    "STATS",
+    "fetch_features",
+    "prescreen",
+    "train_logistic",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,89 @@
-from typing import List, Dict
-from src.sdk.databases.clickhouse.click_connect import get_db
+import os
+from collections import defaultdict
+from typing import Any, Iterator, List, Dict, Optional, Sequence
+from src.sdk.databases.clickhouse.click_connect import ARROW_AVAILABLE, ClickHouseDB, get_db, np
+from src.sdk.databases.clickhouse.schema import PUMPSWAP_AGG, RAYDIUM_AGG
 
+# строк в блоке для потоковых iter_*_wallets (settings.max_block_size)
+STREAM_BLOCK_ROWS = int(os.getenv("CLICKHOUSE_STREAM_BLOCK", "65536"))
 
-def _rows_to_dict(rows) -> List[Dict]:
-    """ClickHouse чаще отдаёт кортежи; нормализуем в [{signing_wallet: …}, …]."""
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except Exception:  # pyarrow не установлен → колонки приходят NumPy-массивами
+    pa = pc = None
+
+# ширина <U…-строк в NumPy-пути (base58-адрес Solana ≤ 44 символов)
+WALLET_STR_LEN = int(os.getenv("CLICKHOUSE_WALLET_STR_LEN", "64"))
+
+# читать предагрегаты (AggregatingMergeTree, см. sdk/databases/clickhouse/schema.py)
+# вместо сырых свопов; включать после `python -m src.sdk.databases.clickhouse.schema`
+CLICKHOUSE_PNL_AGG = os.getenv("CLICKHOUSE_PNL_AGG", "0").lower() in ("1", "true", "yes")
+
+
+def _tags(source: str, fetcher: str, tokens: Sequence[str]) -> Dict[str, Any]:
+    """Теги запроса → query_id/log_comment и профиль (sdk/databases/clickhouse/profiling.py)."""
+    tags: Dict[str, Any] = {"source": source, "fetcher": fetcher, "tokens": len(tokens)}
+    if tokens:
+        # у пачки — первые 10, чтобы log_comment не разрастался
+        tags["token"] = tokens[0] if len(tokens) == 1 else ",".join(tokens[:10])
+    return tags
+
+
+def _group_by_token(rows, keys: Sequence[str]) -> Dict[str, List[Dict]]:
+    """Строки (token, *keys) батч-запроса → {token: [{keys…}, …]} в исходном порядке."""
+    out: Dict[str, List[Dict]] = defaultdict(list)
+    for r in rows:
+        if isinstance(r, dict):
+            out[r["token"]].append({k: r[k] for k in keys})
+        else:
+            out[r[0]].append(dict(zip(keys, r[1:])))
+    return dict(out)
+
+
+def _rows_to_dict(rows, keys: Sequence[str] = ("signing_wallet",)) -> List[Dict]:
+    """ClickHouse чаще отдаёт кортежи; нормализуем в [{signing_wallet: …, *keys}, …]."""
     if rows and not isinstance(rows[0], dict):
-        rows = [{"signing_wallet": r[0]} for r in rows]
+        rows = [dict(zip(keys, r)) for r in rows]
     return rows
 
 
-def fetch_pumpswap_pnl(token_address: str) -> List[Dict]:
+PUMPSWAP_RAW_QUERY = """
+    SELECT
+        signing_wallet,
+        sumIf(quote_token_amount, direction = 'S')
+          - sumIf(quote_token_amount, direction = 'B')
+          - sum(lp_fee + protocol_fee + fee)   AS pnl_quote,
+        countIf(direction = 'B')               AS buys
+    FROM pumpswap_all_swaps
+    WHERE base_token = {token:String}
+    GROUP BY signing_wallet
+    HAVING buys < 5 AND pnl_quote > 200000000
+    ORDER BY pnl_quote DESC
+"""
+
+# те же числа из состояний: *Merge по строкам (token, wallet) вместо скана всех свопов токена
+PUMPSWAP_AGG_QUERY = f"""
+    SELECT
+        signing_wallet,
+        sumIfMerge(sell_quote_state)
+          - sumIfMerge(buy_quote_state)
+          - sumMerge(fees_state)               AS pnl_quote,
+        countIfMerge(buys_state)               AS buys
+    FROM {PUMPSWAP_AGG}
+    WHERE base_token = {{token:String}}
+    GROUP BY signing_wallet
+    HAVING buys < 5 AND pnl_quote > 200000000
+    ORDER BY pnl_quote DESC
+"""
+
+
+def fetch_pumpswap_pnl(token_address: str, db: Optional[ClickHouseDB] = None) -> List[Dict]:
     """Старая функция — перенесена сюда без изменений."""
-    db = get_db()
-    query = """
-        SELECT
-            signing_wallet,
-            sumIf(quote_token_amount, direction = 'S')
-              - sumIf(quote_token_amount, direction = 'B')
-              - sum(lp_fee + protocol_fee + fee)   AS pnl_quote,
-            countIf(direction = 'B')               AS buys
-        FROM pumpswap_all_swaps
-        WHERE base_token = {token:String}
-        GROUP BY signing_wallet
-        HAVING buys < 5 AND pnl_quote > 200000000
-        ORDER BY pnl_quote DESC
-    """
-    rows = db.fetchall(query, params={"token": token_address})
+    db = db or get_db()
+    query = _pumpswap_query()
+    rows = db.fetchall(query, params={"token": token_address},
+                       tags=_tags("PumpSwap", "fetch_pumpswap_pnl", [token_address]))
     # нормализуем только если ClickHouse вернул кортежи
     if rows and not isinstance(rows[0], dict):
         keys = ("signing_wallet", "pnl_quote", "buys")
@@ -33,46 +91,269 @@ def fetch_pumpswap_pnl(token_address: str) -> List[Dict]:
     return rows
 
 
-def fetch_raydium_wallets(token_address: str) -> List[Dict]:
-
-    db = get_db()
-
-    query = """
-        WITH swaps AS (
-            SELECT
-                fee_payer,
-                /* +quote, если 'S' (продажа базы); –quote, если не 'S' */
-                CASE
-                    WHEN direction = 'S'
-                        THEN toInt128(quote_coin_amount)
-                    ELSE
-                        -toInt128(quote_coin_amount)
-                END AS delta_quote
-            FROM raydium_cpmm_swaps
-            WHERE base_coin = {token:String}
-        )
+RAYDIUM_RAW_QUERY = """
+    WITH swaps AS (
         SELECT
             fee_payer,
-            sum(delta_quote) AS pnl_quote_coin,
-            count()          AS trades_cnt
-        FROM swaps
-        GROUP BY fee_payer
-        HAVING pnl_quote_coin > 0
-        ORDER BY pnl_quote_coin DESC
-    """
-
-    rows = db.fetchall(query, params={"token": token_address})
-    return _rows_to_dict(rows)
+            /* +quote, если 'S' (продажа базы); –quote, если не 'S' */
+            CASE
+                WHEN direction = 'S'
+                    THEN toInt128(quote_coin_amount)
+                ELSE
+                    -toInt128(quote_coin_amount)
+            END AS delta_quote
+        FROM raydium_cpmm_swaps
+        WHERE base_coin = {token:String}
+    )
+    SELECT
+        fee_payer,
+        sum(delta_quote) AS pnl_quote_coin,
+        count()          AS trades_cnt
+    FROM swaps
+    GROUP BY fee_payer
+    HAVING pnl_quote_coin > 0
+    ORDER BY pnl_quote_coin DESC
+"""
+
+RAYDIUM_AGG_QUERY = f"""
+    SELECT
+        fee_payer,
+        sumMerge(pnl_state)      AS pnl_quote_coin,
+        countMerge(trades_state) AS trades_cnt
+    FROM {RAYDIUM_AGG}
+    WHERE base_coin = {{token:String}}
+    GROUP BY fee_payer
+    HAVING pnl_quote_coin > 0
+    ORDER BY pnl_quote_coin DESC
+"""
+
+
+def fetch_raydium_wallets(token_address: str, db: Optional[ClickHouseDB] = None) -> List[Dict]:
 
+    db = db or get_db()
+    query = _raydium_query()
+    rows = db.fetchall(query, params={"token": token_address},
+                       tags=_tags("Raydium", "fetch_raydium_wallets", [token_address]))
+    return _rows_to_dict(rows, ("signing_wallet", "pnl_quote_coin", "trades_cnt"))
 
-def fetch_meteora_wallets(token_address: str) -> List[Dict]:
+
+METEORA_QUERY = """
+    SELECT DISTINCT signing_wallet
+    FROM meteora_swaps
+    WHERE base_coin  = {token:String}
+       OR quote_coin = {token:String}
+"""
+
+
+def fetch_meteora_wallets(token_address: str, db: Optional[ClickHouseDB] = None) -> List[Dict]:
     """Meteora: берём обмены в обе стороны."""
-    db = get_db()
-    query = """
-        SELECT DISTINCT signing_wallet
-        FROM meteora_swaps
-        WHERE base_coin  = {token:String}
-           OR quote_coin = {token:String}
-    """
-    rows = db.fetchall(query, params={"token": token_address})
+    db = db or get_db()
+    rows = db.fetchall(METEORA_QUERY, params={"token": token_address},
+                       tags=_tags("Meteora", "fetch_meteora_wallets", [token_address]))
     return _rows_to_dict(rows)
+
+
+# ───────────── батч: один запрос на пачку токенов (token IN …) ─────────────
+# Группировка та же, но с токеном в ключе — HAVING/ORDER действуют внутри токена.
+
+PUMPSWAP_RAW_MANY_QUERY = """
+    SELECT
+        base_token                             AS token,
+        signing_wallet,
+        sumIf(quote_token_amount, direction = 'S')
+          - sumIf(quote_token_amount, direction = 'B')
+          - sum(lp_fee + protocol_fee + fee)   AS pnl_quote,
+        countIf(direction = 'B')               AS buys
+    FROM pumpswap_all_swaps
+    WHERE base_token IN {tokens:Array(String)}
+    GROUP BY base_token, signing_wallet
+    HAVING buys < 5 AND pnl_quote > 200000000
+    ORDER BY base_token, pnl_quote DESC
+"""
+
+PUMPSWAP_AGG_MANY_QUERY = f"""
+    SELECT
+        base_token                             AS token,
+        signing_wallet,
+        sumIfMerge(sell_quote_state)
+          - sumIfMerge(buy_quote_state)
+          - sumMerge(fees_state)               AS pnl_quote,
+        countIfMerge(buys_state)               AS buys
+    FROM {PUMPSWAP_AGG}
+    WHERE base_token IN {{tokens:Array(String)}}
+    GROUP BY base_token, signing_wallet
+    HAVING buys < 5 AND pnl_quote > 200000000
+    ORDER BY base_token, pnl_quote DESC
+"""
+
+RAYDIUM_RAW_MANY_QUERY = """
+    SELECT
+        base_coin                AS token,
+        fee_payer,
+        sum(if(direction = 'S', toInt128(quote_coin_amount), -toInt128(quote_coin_amount)))
+                                 AS pnl_quote_coin,
+        count()                  AS trades_cnt
+    FROM raydium_cpmm_swaps
+    WHERE base_coin IN {tokens:Array(String)}
+    GROUP BY base_coin, fee_payer
+    HAVING pnl_quote_coin > 0
+    ORDER BY base_coin, pnl_quote_coin DESC
+"""
+
+RAYDIUM_AGG_MANY_QUERY = f"""
+    SELECT
+        base_coin                AS token,
+        fee_payer,
+        sumMerge(pnl_state)      AS pnl_quote_coin,
+        countMerge(trades_state) AS trades_cnt
+    FROM {RAYDIUM_AGG}
+    WHERE base_coin IN {{tokens:Array(String)}}
+    GROUP BY base_coin, fee_payer
+    HAVING pnl_quote_coin > 0
+    ORDER BY base_coin, pnl_quote_coin DESC
+"""
+
+# своп может попасть в оба токена пачки (base и quote) — arrayJoin раздаёт его каждому
+METEORA_MANY_QUERY = """
+    SELECT DISTINCT
+        arrayJoin(arrayFilter(t -> has({tokens:Array(String)}, t), [base_coin, quote_coin])) AS token,
+        signing_wallet
+    FROM meteora_swaps
+    WHERE base_coin  IN {tokens:Array(String)}
+       OR quote_coin IN {tokens:Array(String)}
+"""
+
+
+# выбор запроса: сырые свопы / предагрегаты (CLICKHOUSE_PNL_AGG), один токен / пачка
+def _pumpswap_query(many: bool = False) -> str:
+    if many:
+        return PUMPSWAP_AGG_MANY_QUERY if CLICKHOUSE_PNL_AGG else PUMPSWAP_RAW_MANY_QUERY
+    return PUMPSWAP_AGG_QUERY if CLICKHOUSE_PNL_AGG else PUMPSWAP_RAW_QUERY
+
+
+def _raydium_query(many: bool = False) -> str:
+    if many:
+        return RAYDIUM_AGG_MANY_QUERY if CLICKHOUSE_PNL_AGG else RAYDIUM_RAW_MANY_QUERY
+    return RAYDIUM_AGG_QUERY if CLICKHOUSE_PNL_AGG else RAYDIUM_RAW_QUERY
+
+
+def fetch_pumpswap_pnl_many(tokens: Sequence[str], db: Optional[ClickHouseDB] = None) -> Dict[str, List[Dict]]:
+    query = _pumpswap_query(many=True)
+    rows = (db or get_db()).fetchall(query, params={"tokens": list(tokens)},
+                                     tags=_tags("PumpSwap", "fetch_pumpswap_pnl_many", tokens))
+    return _group_by_token(rows, ("signing_wallet", "pnl_quote", "buys"))
+
+
+def fetch_raydium_wallets_many(tokens: Sequence[str], db: Optional[ClickHouseDB] = None) -> Dict[str, List[Dict]]:
+    # single-вариант отдаёт fee_payer под ключом signing_wallet — сохраняем
+    query = _raydium_query(many=True)
+    rows = (db or get_db()).fetchall(query, params={"tokens": list(tokens)},
+                                     tags=_tags("Raydium", "fetch_raydium_wallets_many", tokens))
+    return _group_by_token(rows, ("signing_wallet", "pnl_quote_coin", "trades_cnt"))
+
+
+def fetch_meteora_wallets_many(tokens: Sequence[str], db: Optional[ClickHouseDB] = None) -> Dict[str, List[Dict]]:
+    rows = (db or get_db()).fetchall(METEORA_MANY_QUERY, params={"tokens": list(tokens)},
+                                     tags=_tags("Meteora", "fetch_meteora_wallets_many", tokens))
+    return _group_by_token(rows, ("signing_wallet",))
+
+
+# ───────────── поток: кошельки блоками по мере прихода из ClickHouse ─────────────
+# Те же запросы, но без fetchall/_rows_to_dict: в Python живёт один блок за раз.
+
+def _iter_first_column(db: ClickHouseDB, query: str, params: dict,
+                       tags: Optional[Dict[str, Any]] = None) -> Iterator[List[str]]:
+    for block in db.iterate(query, params=params, chunk_size=STREAM_BLOCK_ROWS, tags=tags):
+        yield [r[0] for r in block if r[0]]
+
+
+def iter_pumpswap_wallets(token_address: str, db: Optional[ClickHouseDB] = None) -> Iterator[List[str]]:
+    yield from _iter_first_column(db or get_db(), _pumpswap_query(), {"token": token_address},
+                                  _tags("PumpSwap", "iter_pumpswap_wallets", [token_address]))
+
+
+def iter_raydium_wallets(token_address: str, db: Optional[ClickHouseDB] = None) -> Iterator[List[str]]:
+    yield from _iter_first_column(db or get_db(), _raydium_query(), {"token": token_address},
+                                  _tags("Raydium", "iter_raydium_wallets", [token_address]))
+
+
+def iter_meteora_wallets(token_address: str, db: Optional[ClickHouseDB] = None) -> Iterator[List[str]]:
+    yield from _iter_first_column(db or get_db(), METEORA_QUERY, {"token": token_address},
+                                  _tags("Meteora", "iter_meteora_wallets", [token_address]))
+
+
+# ───────────── колонки: Arrow / NumPy без объекта на строку ─────────────
+# Из ClickHouse приходит только колонка кошельков (и токена для батча);
+# фильтр пустых и дедуп — векторно, Python-строки создаются лишь для уникальных.
+
+def is_wallet_column(obj: Any) -> bool:
+    if pa is not None and isinstance(obj, (pa.Array, pa.ChunkedArray)):
+        return True
+    return np is not None and isinstance(obj, np.ndarray)
+
+
+def unique_wallets(col: Any) -> List[str]:
+    """Колонка кошельков → уникальные непустые адреса в порядке первого появления."""
+    if pa is not None and isinstance(col, (pa.Array, pa.ChunkedArray)):
+        col = pc.unique(pc.drop_null(col))  # hash-unique сохраняет порядок
+        return pc.filter(col, pc.not_equal(col, "")).to_pylist()
+    arr = np.asarray(col)
+    if arr.dtype == object:
+        arr = arr[np.not_equal(arr, None)]
+    arr = arr[arr != ""]
+    if not arr.size:
+        return []
+    _, first = np.unique(arr, return_index=True)
+    return arr[np.sort(first)].tolist()
+
+
+def wallet_column(db: ClickHouseDB, query: str, params: dict,
+                  tags: Optional[Dict[str, Any]] = None) -> Any:
+    """Первая колонка результата как pyarrow.ChunkedArray / np.ndarray."""
+    if ARROW_AVAILABLE:
+        return db.fetch_arrow(query, params, tags=tags).column(0)
+    return db.fetch_np(query, params, max_str_len=WALLET_STR_LEN, tags=tags)[0]
+
+
+def wallet_columns_by_token(db: ClickHouseDB, query: str, params: dict,
+                            tokens: Sequence[str], tags: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Батч-запрос (token, wallet, …) → {token: колонка кошельков}."""
+    if ARROW_AVAILABLE:
+        tbl = db.fetch_arrow(query, params, tags=tags)
+        tok, wal = tbl.column(0), tbl.column(1)
+        return {t: pc.filter(wal, pc.equal(tok, t)) for t in tokens}
+    cols = db.fetch_np(query, params, max_str_len=WALLET_STR_LEN, tags=tags)
+    if len(cols) < 2:  # пустой результат
+        return {t: np.empty(0, dtype=f"<U{WALLET_STR_LEN}") for t in tokens}
+    tok, wal = cols[0], cols[1]
+    return {t: wal[tok == t] for t in tokens}
+
+
+def fetch_pumpswap_column(token_address: str, db: Optional[ClickHouseDB] = None) -> Any:
+    return wallet_column(db or get_db(), _pumpswap_query(), {"token": token_address},
+                         _tags("PumpSwap", "fetch_pumpswap_column", [token_address]))
+
+
+def fetch_raydium_column(token_address: str, db: Optional[ClickHouseDB] = None) -> Any:
+    return wallet_column(db or get_db(), _raydium_query(), {"token": token_address},
+                         _tags("Raydium", "fetch_raydium_column", [token_address]))
+
+
+def fetch_meteora_column(token_address: str, db: Optional[ClickHouseDB] = None) -> Any:
+    return wallet_column(db or get_db(), METEORA_QUERY, {"token": token_address},
+                         _tags("Meteora", "fetch_meteora_column", [token_address]))
+
+
+def fetch_pumpswap_columns_many(tokens: Sequence[str], db: Optional[ClickHouseDB] = None) -> Dict[str, Any]:
+    return wallet_columns_by_token(db or get_db(), _pumpswap_query(many=True), {"tokens": list(tokens)}, tokens,
+                                   _tags("PumpSwap", "fetch_pumpswap_columns_many", tokens))
+
+
+def fetch_raydium_columns_many(tokens: Sequence[str], db: Optional[ClickHouseDB] = None) -> Dict[str, Any]:
+    return wallet_columns_by_token(db or get_db(), _raydium_query(many=True), {"tokens": list(tokens)}, tokens,
+                                   _tags("Raydium", "fetch_raydium_columns_many", tokens))
+
+
+def fetch_meteora_columns_many(tokens: Sequence[str], db: Optional[ClickHouseDB] = None) -> Dict[str, Any]:
+    return wallet_columns_by_token(db or get_db(), METEORA_MANY_QUERY, {"tokens": list(tokens)}, tokens,
+                                   _tags("Meteora", "fetch_meteora_columns_many", tokens))
@@ -3,8 +3,10 @@ from __future__ import annotations
 import json
 import os
 import time
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Callable, Iterable, Any
+from typing import Dict, List, Callable, Iterable, Iterator, Any, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
 
@@ -12,8 +14,30 @@ from src.clickhouse_pnl.wallet_fetchers import (
     fetch_pumpswap_pnl,
     fetch_raydium_wallets,
     fetch_meteora_wallets,
+    fetch_pumpswap_pnl_many,
+    fetch_raydium_wallets_many,
+    fetch_meteora_wallets_many,
+    iter_pumpswap_wallets,
+    iter_raydium_wallets,
+    iter_meteora_wallets,
+    fetch_pumpswap_column,
+    fetch_raydium_column,
+    fetch_meteora_column,
+    fetch_pumpswap_columns_many,
+    fetch_raydium_columns_many,
+    fetch_meteora_columns_many,
+    is_wallet_column,
+    unique_wallets,
 )
+from src.clickhouse_pnl.bot_filter import BOT_DENYLIST, filter_denied
+from src.clickhouse_pnl.fetch_cache import FETCH_CACHE, STATS as FETCH_CACHE_STATS, cached_fetch
+from src.clickhouse_pnl.prescreen import PRESCREEN, STATS as PRESCREEN_STATS, prescreen
+from src.sdk.databases.clickhouse.click_connect import ClickHousePool, new_db
+from src.sdk.databases.clickhouse.profiling import ProfileAggregator, add_hook, redis_stream_exporter
+from src.sdk.queues.flow_control import FLOW_CONTROL, FlowController
 from src.sdk.queues.redis_connect import get_redis_sync as get_redis
+from src.sdk.queues.token_lease import TokenLeases
+from src.sdk.queues.token_queue import TOKEN_PRIORITY, DRRScheduler, pop_tokens, prio_key, wait_token
 
 load_dotenv()
 
@@ -36,6 +60,21 @@ QUEUE_FLAGS: Dict[str, str] = {
 }
 
 WALLETS_QUEUE       = os.getenv("WALLETS_QUEUE", "wallet_queue")
+# list — JSON-батчи в WALLETS_QUEUE (FIFO); zset — кошелёк → score в WALLETS_ZSET,
+# pnl_scraper снимает лучших первыми (ZPOPMAX).
+# Шкала score: PnL из fetcher-а в разных единицах (PumpSwap — lamports, Raydium —
+# сырые единицы quote-монеты пула, у Meteora PnL нет), поэтому сравнивать их
+# напрямую нельзя. В очередь идёт перцентиль PnL кошелька среди кошельков того же
+# токена: (0, 1], 1 — лучший; без PnL (Meteora) — WALLET_SCORE_DEFAULT (медиана).
+# Старение: при пуше вычитается time() / WALLET_SCORE_AGE_S — кошелёк, ждущий
+# WALLET_SCORE_AGE_S дольше, обгоняет лучшего свежего (0 — без старения).
+# В zset-режиме PRODUCER_STREAMING / PRODUCER_COLUMNAR не действуют: нужны строки целиком.
+WALLET_QUEUE_MODE   = os.getenv("WALLET_QUEUE_MODE", "list").lower()
+WALLETS_ZSET        = os.getenv("WALLETS_ZSET", f"{WALLETS_QUEUE}:zset")
+WALLET_SCORE_DEFAULT = float(os.getenv("WALLET_SCORE_DEFAULT", "0.5"))
+WALLET_SCORE_AGE_S  = float(os.getenv("WALLET_SCORE_AGE_S", "3600"))
+WALLET_ZSET = WALLET_QUEUE_MODE == "zset"
+WALLETS_KEY = WALLETS_ZSET if WALLET_ZSET else WALLETS_QUEUE
 RESET_WALLETS_QUEUE = False
 CLEAR_MARKER_KEY    = os.getenv("CLEAR_MARKER_KEY", "wallet_queue_cleared")
 
@@ -44,6 +83,60 @@ CLEAR_MARKER_TTL    = int(os.getenv("CLEAR_MARKER_TTL", "0"))
 BLPOP_TIMEOUT = int(os.getenv("BLPOP_TIMEOUT", "300"))
 DELAY_SEC     = float(os.getenv("DELAY_SEC", "0"))
 BATCH_SIZE    = int(os.getenv("WALLET_BATCH", "15000"))
+# >1 — снимать до N токенов с каждой очереди и делать один запрос на источник (token IN …)
+TOKEN_BATCH   = int(os.getenv("TOKEN_BATCH", "1"))
+
+# fifo — BLPOP/LPOP по порядку TOKEN_QUEUES; drr — взвешенный round-robin (sdk/queues/token_queue.py)
+TOKEN_SCHEDULER = os.getenv("TOKEN_SCHEDULER", "fifo").lower()
+TOKEN_WEIGHTS: Dict[str, int] = {
+    k.strip(): int(v)
+    for k, v in (
+        pair.split("=", 1)
+        for pair in os.getenv("TOKEN_WEIGHTS", "").split(",")
+        if "=" in pair
+    )
+}
+
+# параллельные запросы к ClickHouse: свой пул потоков на источник, лимит — из SOURCE_CONCURRENCY
+PRODUCER_CONCURRENT = os.getenv("PRODUCER_CONCURRENT", "0").lower() in ("1", "true", "yes")
+SOURCE_CONCURRENCY: Dict[str, int] = {
+    k.strip(): int(v)
+    for k, v in (
+        pair.split("=", 1)
+        for pair in os.getenv("SOURCE_CONCURRENCY", "PumpSwap=2,Raydium=2,Meteora=4").split(",")
+        if "=" in pair
+    )
+}
+DEFAULT_SOURCE_CONCURRENCY = int(os.getenv("SOURCE_CONCURRENCY_DEFAULT", "2"))
+CONCURRENT_POLL_SEC = float(os.getenv("CONCURRENT_POLL_SEC", "0.5"))
+
+# настройки запросов fetcher-ов: таймаут (→ max_execution_time + KILL QUERY) и ClickHouse settings
+FETCH_TIMEOUT_S = float(os.getenv("FETCH_TIMEOUT_S", "0")) or None
+# профили запросов fetcher-ов (source/token, read_rows, elapsed) → Redis stream CLICKHOUSE_PROFILE_STREAM
+PROFILE_EXPORT = os.getenv("CLICKHOUSE_PROFILE_EXPORT", "0").lower() in ("1", "true", "yes")
+CH_PROFILE = add_hook(ProfileAggregator())
+
+FETCH_SETTINGS: Dict[str, str] = {
+    k.strip(): v.strip()
+    for k, v in (
+        pair.split("=", 1)
+        for pair in os.getenv("FETCH_SETTINGS", "").split(",")
+        if "=" in pair
+    )
+}
+
+# читать результат ClickHouse блоками и пушить чанки по мере прихода (одиночный режим)
+PRODUCER_STREAMING = os.getenv("PRODUCER_STREAMING", "0").lower() in ("1", "true", "yes")
+
+# забирать кошельки колонкой (Arrow/NumPy) вместо кортежей → dict → list
+PRODUCER_COLUMNAR = os.getenv("PRODUCER_COLUMNAR", "0").lower() in ("1", "true", "yes")
+
+# не пушить кошельки из denylist ботов/MEV (python -m src.clickhouse_pnl.bot_filter --every 900)
+BOT_FILTER = os.getenv("BOT_FILTER", "0").lower() in ("1", "true", "yes")
+BOT_DROPPED = 0
+
+# несколько реплик продюсера: аренда (источник, токен) в Redis, heartbeat, возврат токенов упавших реплик
+PRODUCER_LEASES = os.getenv("PRODUCER_LEASES", "0").lower() in ("1", "true", "yes")
 
 LOG_QUEUE_STATS = os.getenv("LOG_QUEUE_STATS", "1") not in ("0", "false", "False")
 
@@ -52,6 +145,26 @@ FETCHERS: Dict[str, Callable[[str], List[Any]]] = {
     "Raydium":  fetch_raydium_wallets,
     "Meteora":  fetch_meteora_wallets,
 }
+BATCH_FETCHERS: Dict[str, Callable[[Sequence[str]], Dict[str, List[Any]]]] = {
+    "PumpSwap": fetch_pumpswap_pnl_many,
+    "Raydium":  fetch_raydium_wallets_many,
+    "Meteora":  fetch_meteora_wallets_many,
+}
+COLUMN_FETCHERS: Dict[str, Callable[[str], Any]] = {
+    "PumpSwap": fetch_pumpswap_column,
+    "Raydium":  fetch_raydium_column,
+    "Meteora":  fetch_meteora_column,
+}
+COLUMN_BATCH_FETCHERS: Dict[str, Callable[[Sequence[str]], Dict[str, Any]]] = {
+    "PumpSwap": fetch_pumpswap_columns_many,
+    "Raydium":  fetch_raydium_columns_many,
+    "Meteora":  fetch_meteora_columns_many,
+}
+STREAM_FETCHERS: Dict[str, Callable[[str], Iterable[List[str]]]] = {
+    "PumpSwap": iter_pumpswap_wallets,
+    "Raydium":  iter_raydium_wallets,
+    "Meteora":  iter_meteora_wallets,
+}
 
 # ───────────────────────── helpers ────────────────────────────────────
 def _json_dumps(obj: Any) -> str:
@@ -63,6 +176,8 @@ CANDIDATE_KEYS = (
 )
 
 def to_wallet_list(rows: Iterable[Any]) -> List[str]:
+    if is_wallet_column(rows):
+        return unique_wallets(rows)
     rows = list(rows or [])
     if not rows:
         return []
@@ -77,17 +192,60 @@ def to_wallet_list(rows: Iterable[Any]) -> List[str]:
         return []
     return []
 
+SCORE_KEYS = ("pnl_quote", "pnl_quote_coin")
+
+def to_scored_wallets(rows: Iterable[Any]) -> List[Tuple[str, float]]:
+    """
+    [(кошелёк, score)] из строк fetcher-а одного токена. score — перцентиль PnL
+    внутри токена, (0, 1]; без PnL — WALLET_SCORE_DEFAULT. Повторный кошелёк — с лучшим PnL.
+    """
+    pnl: Dict[str, Optional[float]] = {}
+    for r in rows or []:
+        if isinstance(r, dict):
+            wallet = next((r[k] for k in CANDIDATE_KEYS if r.get(k)), None)
+            raw = next((r[k] for k in SCORE_KEYS if r.get(k) is not None), None)
+        else:
+            wallet, raw = r, None
+        if not isinstance(wallet, str) or not wallet:
+            continue
+        value = float(raw) if raw is not None else None
+        cur = pnl.get(wallet)
+        if wallet not in pnl or (value is not None and (cur is None or value > cur)):
+            pnl[wallet] = value
+    ranked = sorted((v for v in pnl.values() if v is not None))
+    n = len(ranked)
+    # доля кошельков токена с PnL не выше этого (bisect_right) — одинаковый PnL, одинаковый score
+    return [(w, bisect_right(ranked, v) / n if v is not None else WALLET_SCORE_DEFAULT)
+            for w, v in pnl.items()]
+
 def _llen_safe(rds, key: str) -> int:
     try:
         return int(rds.llen(key))
     except Exception:
         return -1
 
-def _log_token_queues_state(rds) -> None:
+def _wallets_len(rds) -> int:
+    if not WALLET_ZSET:
+        return _llen_safe(rds, WALLETS_QUEUE)
+    try:
+        return int(rds.zcard(WALLETS_ZSET))
+    except Exception:
+        return -1
+
+def _log_token_queues_state(rds, sched: Optional[DRRScheduler] = None) -> None:
     if not LOG_QUEUE_STATS:
         return
     try:
-        states = {q: _llen_safe(rds, q) for q in TOKEN_QUEUES}
+        if sched is not None:
+            states = dict(sched.lengths)  # уже получены в pipeline раунда
+        else:
+            pipe = rds.pipeline(transaction=False)
+            for q in TOKEN_QUEUES:
+                pipe.llen(q)
+                if TOKEN_PRIORITY:
+                    pipe.zcard(prio_key(q))
+            sizes = iter(pipe.execute())
+            states = {q: int(next(sizes)) + (int(next(sizes)) if TOKEN_PRIORITY else 0) for q in TOKEN_QUEUES}
         print(f"ℹ️  Остатки в TOKEN_QUEUES: " + ", ".join(f"{k}={v}" for k, v in states.items()))
     except Exception as e:
         print(f"⚠️  Не удалось получить состояние TOKEN_QUEUES: {e!r}")
@@ -104,20 +262,487 @@ def clear_queues_once(rds) -> None:
         if not rds.setnx(CLEAR_MARKER_KEY, int(time.time())):
             print("🔸 Очереди уже были очищены ранее — пропускаем очистку")
             return
-    rds.delete(WALLETS_QUEUE, *TOKEN_QUEUES)
-    print(f"🧹  Очистили {WALLETS_QUEUE} и все queues из TOKEN_QUEUES")
-
-def push_wallets_to_redis(rds, wallets: List[str], *, token: str, src_flag: str) -> None:
+    rds.delete(WALLETS_QUEUE, WALLETS_ZSET, *TOKEN_QUEUES, *(prio_key(q) for q in TOKEN_QUEUES))
+    print(f"🧹  Очистили {WALLETS_QUEUE}, {WALLETS_ZSET} и все queues из TOKEN_QUEUES")
+
+def _drop_bots(rds, wallets: List[Any]) -> List[Any]:
+    """BOT_FILTER=1: убрать кошельки из BOT_DENYLIST одним SMISMEMBER."""
+    global BOT_DROPPED
+    keep = set(filter_denied(rds, [_wallet_of(x) for x in wallets]))
+    kept = [x for x in wallets if _wallet_of(x) in keep]
+    BOT_DROPPED += len(wallets) - len(kept)
+    return kept
+
+def push_wallets_to_redis(rds, wallets: List[Any], *, token: str, src_flag: str) -> int:
+    """Пуш в очередь кошельков; возвращает, сколько реально ушло (после отсева ботов)."""
+    if BOT_FILTER and wallets:
+        wallets = _drop_bots(rds, wallets)
     if not wallets:
-        return
+        return 0
+    if WALLET_ZSET:
+        push_scored_wallets(rds, wallets)
+        return len(wallets)
     payload = {"v": 1, "src": src_flag, "token": token, "wallets": wallets, "ts": int(time.time())}
     rds.rpush(WALLETS_QUEUE, _json_dumps(payload))
+    flow = _flow(rds)
+    if flow is not None:
+        flow.note_pushed(len(wallets))
     if LOG_QUEUE_STATS:
-        llen = _llen_safe(rds, WALLETS_QUEUE)
+        llen = _wallets_len(rds)
         print(f"📦  RPUSH → {WALLETS_QUEUE} len={llen}")
+    return len(wallets)
+
+def push_scored_wallets(rds, wallets: List[Any]) -> None:
+    """
+    Пары (кошелёк, перцентиль) → ZADD GT в WALLETS_ZSET со старением
+    (− time() / WALLET_SCORE_AGE_S): новый кошелёк добавляется, уже стоящий в
+    очереди только повышается — повторная находка не сбрасывает ему «стаж».
+    """
+    age = time.time() / WALLET_SCORE_AGE_S if WALLET_SCORE_AGE_S > 0 else 0.0
+    scores: Dict[str, float] = {}
+    for wallet, score in wallets:  # из кэша пары приходят списками [w, s]
+        if float(score) - age > scores.get(wallet, float("-inf")):
+            scores[wallet] = float(score) - age
+    rds.zadd(WALLETS_ZSET, scores, gt=True)
+    if LOG_QUEUE_STATS:
+        print(f"📦  ZADD → {WALLETS_ZSET} +{len(scores)} len={_wallets_len(rds)}")
+
+FLOW: Optional[FlowController] = None
+LEASES: Optional[TokenLeases] = None
+
+def _flow(rds) -> Optional[FlowController]:
+    """FlowController очереди кошельков (FLOW_CONTROL=1), создаётся при первом пуше."""
+    global FLOW
+    if FLOW_CONTROL and FLOW is None:
+        FLOW = FlowController(rds, WALLETS_KEY, max_batch=BATCH_SIZE, zset=WALLET_ZSET)
+    return FLOW
+
+def _push_full_chunks(rds, buffer: List[Any], pending: Optional["PendingTokens"] = None) -> int:
+    """
+    Выгружает из буфера все полные чанки, возвращает число отправленных.
+    Без FLOW_CONTROL чанк — BATCH_SIZE. С ним — размер по скорости консюмеров,
+    пауза, пока очередь выше предела, а если консюмеры простаивают (очередь
+    пуста) — уходит и неполный чанк от FLOW_MIN_BATCH. pending — после каждого
+    чанка отмечаются обработанными токены, чьи кошельки целиком ушли в Redis.
+    """
+    flow = _flow(rds)
+    pushed = 0
+    while buffer:
+        size = flow.batch_size() if flow is not None else BATCH_SIZE
+        if len(buffer) < size and not (
+            flow is not None and len(buffer) >= flow.min_batch and flow.starving()
+        ):
+            break
+        if flow is not None:
+            flow.wait_for_room()
+        chunk = buffer[:size]
+        n = push_wallets_to_redis(rds, chunk, token="batch", src_flag="mix")
+        pushed += n
+        print(f"📤  Отправили чанку {n}/{len(chunk)} кошельков в {WALLETS_KEY}")
+        del buffer[:size]
+        if pending is not None:
+            pending.advance(len(chunk))
+    return pushed
+
+def _push_chunks_safe(rds, buffer: List[Any], pending: Optional["PendingTokens"], what: str) -> int:
+    """
+    _push_full_chunks, переживающий сбой Redis: неотправленный чанк остаётся в
+    буфере, аренды его токенов держатся — повторим на следующем пуше.
+    """
+    try:
+        return _push_full_chunks(rds, buffer, pending)
+    except Exception as e:
+        print(f"⚠️  Ошибка при отправке кошельков ({what}), в буфере {len(buffer)}: {e}")
+        return 0
+
+def _push_tail(rds, buffer: List[Any], pending: Optional["PendingTokens"] = None) -> int:
+    """Финальный хвост буфера (меньше чанка); после пуша — done по оставшимся токенам."""
+    if not buffer:
+        return 0
+    size = len(buffer)
+    n = push_wallets_to_redis(rds, buffer, token="batch", src_flag="mix")
+    print(f"📤  Финальный хвост {n}/{size} кошельков в {WALLETS_KEY}")
+    buffer.clear()
+    if pending is not None:
+        pending.advance(size)
+    return n
+
+def fetch_wallets(rds, src_flag: str, tokens: List[str], db=None) -> Dict[str, List[Any]]:
+    """
+    {token: кошельки} для токенов одного источника: один токен — обычный
+    fetcher, пачка — *_many (PRODUCER_COLUMNAR=1 — их колоночные варианты);
+    поверх — Redis-кэш с watermark (FETCH_CACHE=1). В zset-режиме вместо
+    кошельков — пары (кошелёк, score).
+    """
+    if WALLET_ZSET:
+        single, many, convert = FETCHERS, BATCH_FETCHERS, to_scored_wallets
+    elif PRODUCER_COLUMNAR:
+        single, many, convert = COLUMN_FETCHERS, COLUMN_BATCH_FETCHERS, to_wallet_list
+    else:
+        single, many, convert = FETCHERS, BATCH_FETCHERS, to_wallet_list
+
+    def fetch(todo: List[str]) -> Dict[str, List[Any]]:
+        if len(todo) == 1:
+            return {todo[0]: convert(single[src_flag](todo[0], db=db))}
+        rows_by_token = many[src_flag](todo, db=db)
+        return {t: convert(rows_by_token.get(t, [])) for t in todo}
+
+    by_token = cached_fetch(rds, src_flag, tokens, fetch, db=db, variant="pct" if WALLET_ZSET else "")
+    return _prescreen_by_token(by_token, db=db) if PRESCREEN else by_token
+
+def _wallet_of(item: Any) -> str:
+    return item if isinstance(item, str) else item[0]   # в zset-режиме — пара (кошелёк, score)
+
+def _prescreen_by_token(by_token: Dict[str, List[Any]], db=None) -> Dict[str, List[Any]]:
+    """
+    PRESCREEN=1: один запрос признаков на все кошельки пачки, дальше только принятые моделью.
+    Предфильтр — оптимизация: если он упал (ClickHouse, модель), кошельки идут дальше без фильтра.
+    """
+    wallets = [_wallet_of(x) for items in by_token.values() for x in items]
+    if not wallets:
+        return by_token
+    try:
+        keep = prescreen(wallets, db=db)
+    except Exception as e:
+        PRESCREEN_STATS.add_failed(len(wallets))
+        print(f"⚠️  prescreen не удался ({len(wallets)} кошельков пропускаем без фильтра): {e!r}")
+        return by_token
+    return {t: [x for x in items if _wallet_of(x) in keep] for t, items in by_token.items()}
+
+def _stats_summary() -> str:
+    out = ""
+    if FETCH_CACHE:
+        out += f" | кэш: hit={FETCH_CACHE_STATS.hits} miss={FETCH_CACHE_STATS.misses}"
+    if BOT_FILTER:
+        out += f" | {BOT_DENYLIST}: отброшено {BOT_DROPPED}"
+    if PRESCREEN:
+        out += (f" | prescreen: {PRESCREEN_STATS.passed}/{PRESCREEN_STATS.seen} "
+                f"(без признаков {PRESCREEN_STATS.unknown}, без фильтра из-за ошибок {PRESCREEN_STATS.failed})")
+    if FLOW is not None:
+        out += f" | поток: {FLOW.summary()}"
+    if LEASES is not None:
+        out += f" | аренды: {LEASES.summary()}"
+    ch = CH_PROFILE.summary()
+    if ch:
+        out += f"\n📊 ClickHouse: {ch}"
+    return out
+
+def _stream_token(rds, src_flag: str, token: str, buffer: List[str], db=None,
+                  pending: Optional["PendingTokens"] = None) -> Tuple[int, int]:
+    """
+    Кошельки токена блоками из ClickHouse: каждый блок сразу в буфер, полные
+    чанки — сразу в Redis, не дожидаясь конца результата. Дедуп не нужен —
+    запросы уже GROUP BY / DISTINCT по кошельку. Возвращает (найдено, отправлено).
+    """
+    found = pushed = 0
+    for block in STREAM_FETCHERS[src_flag](token, db=db):
+        found += len(block)
+        if PRESCREEN:
+            block = _prescreen_by_token({token: block}, db=db)[token]
+        buffer.extend(block)
+        pushed += _push_full_chunks(rds, buffer, pending)
+    return found, pushed
+
+def pop_token_batches(rds, k: int, queues: Optional[List[str]] = None,
+                      block: bool = True) -> Optional[Dict[str, List[str]]]:
+    """
+    До k токенов с каждой очереди за один round trip (при TOKEN_PRIORITY — сначала
+    лучшие из <queue>:prio, затем LPOP списка). Если все очереди пусты — ждём первый
+    токен (BLPOP / BZPOPMAX) и добираем его очередь (block=False — сразу возвращаем {}).
+    None — за BLPOP_TIMEOUT ничего не пришло.
+    """
+    queues = TOKEN_QUEUES if queues is None else queues
+    batches = pop_tokens(rds, queues, k)
+    if batches or not block:
+        return batches
+
+    popped = wait_token(rds, queues, BLPOP_TIMEOUT)
+    if popped is None:
+        return None
+    queue_name, token = popped
+    rest = pop_tokens(rds, [queue_name], k - 1).get(queue_name, []) if k > 1 else []
+    return {queue_name: [token] + rest}
+
+def pop_one_token(rds) -> Optional[Tuple[str, str]]:
+    """fifo с TOKEN_BATCH=1: BLPOP; при TOKEN_PRIORITY — по одному токену из :prio/списков по порядку очередей."""
+    if not TOKEN_PRIORITY:
+        return rds.blpop(TOKEN_QUEUES, timeout=BLPOP_TIMEOUT)
+    for q in TOKEN_QUEUES:
+        got = pop_tokens(rds, [q], 1).get(q)
+        if got:
+            return q, got[0]
+    return wait_token(rds, TOKEN_QUEUES, BLPOP_TIMEOUT)
+
+def _producer_db():
+    return new_db(settings=FETCH_SETTINGS, timeout=FETCH_TIMEOUT_S)
+
+def make_scheduler(rds, quantum: int = 1) -> Optional[DRRScheduler]:
+    if TOKEN_SCHEDULER != "drr":
+        return None
+    return DRRScheduler(rds, TOKEN_QUEUES, TOKEN_WEIGHTS, quantum=quantum, timeout=BLPOP_TIMEOUT)
+
+def next_token_batches(rds, sched: Optional[DRRScheduler], queues: Optional[List[str]] = None,
+                       block: bool = True) -> Optional[Dict[str, List[str]]]:
+    if sched is not None:
+        return sched.next_round(queues, block=block)
+    return pop_token_batches(rds, TOKEN_BATCH, queues=queues, block=block)
+
+def _make_leases(rds) -> Optional[TokenLeases]:
+    global LEASES
+    if PRODUCER_LEASES and LEASES is None:
+        LEASES = TokenLeases(rds).start()
+    return LEASES
+
+def _claim_tokens(leases: Optional[TokenLeases], src_flag: str, queue_name: str,
+                  tokens: List[str]) -> List[str]:
+    """Без PRODUCER_LEASES — все токены; иначе только взятые в аренду этой репликой."""
+    if leases is None:
+        return tokens
+    leases.recover()
+    mine = leases.claim(src_flag, queue_name, tokens)
+    if len(mine) < len(tokens):
+        print(f"🔒 {src_flag}: {len(tokens) - len(mine)} токенов уже в работе у другой реплики "
+              f"или недавно обработаны — пропускаем")
+    return mine
+
+def _release_tokens(leases: Optional[TokenLeases], src_flag: str, queue_name: str,
+                    tokens: List[str], *, done: bool = True) -> None:
+    if leases is not None:
+        leases.release(src_flag, queue_name, tokens, done=done)
+
+class PendingTokens:
+    """
+    Токены, чьи кошельки ещё лежат в буфере. Аренда таких токенов держится
+    (heartbeat продлевает), а в :done они попадают только после пуша чанка или
+    хвоста, где лежит их последний кошелёк. Упади реплика раньше — recover()
+    другой реплики вернёт токен в очередь, кошельки не теряются.
+
+    Позиции — сквозные: flushed — сколько кошельков ушло из головы буфера за
+    всё время, конец токена — flushed + len(buffer) сразу после extend.
+    """
+
+    def __init__(self, leases: Optional[TokenLeases]):
+        self.leases = leases
+        self.flushed = 0
+        self._marks: List[Tuple[int, str, str, str]] = []   # (конец, src, queue, token) по возрастанию
+
+    def add(self, src_flag: str, queue_name: str, tokens: List[str], buffer: List[Any]) -> None:
+        """Кошельки tokens только что добавлены в хвост buffer."""
+        if self.leases is None or not tokens:
+            return
+        end = self.flushed + len(buffer)
+        self._marks.extend((end, src_flag, queue_name, t) for t in tokens)
+        self.advance(0)
+
+    def advance(self, n: int) -> None:
+        """Из головы буфера успешно отправлено n кошельков."""
+        self.flushed += n
+        ready: Dict[Tuple[str, str], List[str]] = {}
+        while self._marks and self._marks[0][0] <= self.flushed:
+            _, src_flag, queue_name, token = self._marks.pop(0)
+            ready.setdefault((src_flag, queue_name), []).append(token)
+        for (src_flag, queue_name), tokens in ready.items():
+            try:
+                _release_tokens(self.leases, src_flag, queue_name, tokens)
+            except Exception as e:
+                # кошельки уже в Redis; аренда останется за нами до stop() / истечения —
+                # худшее, что будет, — токен посчитают ещё раз
+                print(f"⚠️  Не удалось отметить обработанными {len(tokens)} токенов {src_flag}: {e}")
+
+def _scheduled_tokens(sched: DRRScheduler) -> Iterator[Tuple[str, str]]:
+    """(queue, token) по одному из раундов DRR; конец — таймаут ожидания."""
+    while True:
+        batches = sched.next_round()
+        if batches is None:
+            return
+        for queue_name, tokens in batches.items():
+            for token in tokens:
+                yield queue_name, token
+
+def consume_tokens_batched() -> None:
+    rds = get_redis()
+    db = _producer_db()
+    sched = make_scheduler(rds, quantum=TOKEN_BATCH)
+    leases = _make_leases(rds)
+    pending = PendingTokens(leases)
+    clear_queues_once(rds)
+
+    buffer: List[str] = []
+    processed = 0
+    queries = 0
+    total_pushed = 0
+
+    try:
+        while True:
+            batches = next_token_batches(rds, sched)
+            if batches is None:
+                print(f"⌛ Нет новых токенов {BLPOP_TIMEOUT} с — завершаем сбор токенов")
+                _log_token_queues_state(rds, sched)
+                break
+
+            if LOG_QUEUE_STATS:
+                _log_token_queues_state(rds, sched)
+
+            for queue_name, tokens in batches.items():
+                src_flag = QUEUE_FLAGS.get(queue_name, queue_name)
+                fetcher = BATCH_FETCHERS.get(src_flag)
+                if fetcher is None:
+                    print(f"⚠️  Неизвестный src_flag={src_flag} — пропускаем {len(tokens)} токенов")
+                    continue
+
+                tokens = _claim_tokens(leases, src_flag, queue_name, list(dict.fromkeys(tokens)))
+                if not tokens:
+                    continue
+                processed += len(tokens)
+                queries += 1
+                print(f"🛠️  [{processed}] {src_flag}: обрабатываем пачку из {len(tokens)} токенов")
+
+                try:
+                    wallets_by_token = fetch_wallets(rds, src_flag, tokens, db=db)
+                except Exception as e:
+                    print(f"⚠️  Ошибка при обработке пачки {src_flag} ({len(tokens)} токенов): {e}")
+                    _release_tokens(leases, src_flag, queue_name, tokens, done=False)
+                    continue
+
+                for token in tokens:
+                    wallets = wallets_by_token.get(token) or []
+                    if not wallets:
+                        print(f"⚠️  {src_flag}:{token} — пусто")
+                    buffer.extend(wallets)
+                pending.add(src_flag, queue_name, tokens, buffer)
+                total_pushed += _push_chunks_safe(rds, buffer, pending, f"пачка {src_flag}")
+
+            if DELAY_SEC:
+                time.sleep(DELAY_SEC)
+
+        total_pushed += _push_tail(rds, buffer, pending)
+    finally:
+        if leases is not None:
+            leases.stop()   # не отправленные кошельки → их токены обратно в очереди
+
+    print(
+        f"🏁 Готово: обработано {processed} токенов за {queries} запросов | "
+        f"отправлено кошельков: {total_pushed} | "
+        f"размер чанка={BATCH_SIZE}, пачка токенов={TOKEN_BATCH}, "
+        f"очередь «{WALLETS_KEY}» len={_wallets_len(rds)}"
+        f"{_stats_summary()}"
+    )
+
+# ───────────────────── concurrent mode ────────────────────────────────
+def _fetch_job(rds, ch_pool: ClickHousePool, src_flag: str, tokens: List[str]) -> Dict[str, List[str]]:
+    """Выполняется в пуле источника: клиент из ClickHousePool, запрос, нормализация в кошельки."""
+    with ch_pool.connection() as db:
+        return fetch_wallets(rds, src_flag, tokens, db=db)
+
+def consume_tokens_concurrent() -> None:
+    """
+    Запросы разных источников идут параллельно: медленный Raydium не держит
+    Meteora. В полёте не больше SOURCE_CONCURRENCY[src] задач на источник —
+    токены снимаются только с очередей, у источника которых есть свободный слот.
+    Результаты сливаются в буфер в порядке готовности; в Redis пишет только
+    главный поток, так что чанки остаются целыми и по BATCH_SIZE.
+    """
+    rds = get_redis()
+    sched = make_scheduler(rds, quantum=TOKEN_BATCH)
+    leases = _make_leases(rds)
+    pending = PendingTokens(leases)
+    clear_queues_once(rds)
+
+    limits = {src: max(1, SOURCE_CONCURRENCY.get(src, DEFAULT_SOURCE_CONCURRENCY)) for src in FETCHERS}
+    # клиентов ровно столько, сколько задач может быть в полёте
+    ch_pool = ClickHousePool(sum(limits.values()), settings=FETCH_SETTINGS, timeout=FETCH_TIMEOUT_S)
+    pools = {
+        src: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"ch-{src}")
+        for src, n in limits.items()
+    }
+    inflight: Dict[Future, Tuple[str, str, List[str]]] = {}
+    busy: Dict[str, int] = {src: 0 for src in limits}
+
+    buffer: List[str] = []
+    processed = 0
+    total_pushed = 0
+
+    def queue_src(q: str) -> str:
+        return QUEUE_FLAGS.get(q, q)
+
+    try:
+        while True:
+            free = [q for q in TOKEN_QUEUES if busy.get(queue_src(q), 0) < limits.get(queue_src(q), 1)]
+            batches = next_token_batches(rds, sched, queues=free, block=not inflight) if free else {}
+            if batches is None:
+                print(f"⌛ Нет новых токенов {BLPOP_TIMEOUT} с — завершаем сбор токенов")
+                _log_token_queues_state(rds, sched)
+                break
+
+            for queue_name, tokens in batches.items():
+                src_flag = queue_src(queue_name)
+                if src_flag not in pools:
+                    print(f"⚠️  Неизвестный src_flag={src_flag} — пропускаем {len(tokens)} токенов")
+                    continue
+                tokens = _claim_tokens(leases, src_flag, queue_name, list(dict.fromkeys(tokens)))
+                if not tokens:
+                    continue
+                processed += len(tokens)
+                busy[src_flag] += 1
+                fut = pools[src_flag].submit(_fetch_job, rds, ch_pool, src_flag, tokens)
+                inflight[fut] = (src_flag, queue_name, tokens)
+                print(f"🛠️  [{processed}] {src_flag}: в работе {busy[src_flag]}/{limits[src_flag]}, "
+                      f"токенов в задаче {len(tokens)}")
+
+            if not inflight:
+                continue
+            # пока есть что снимать с очередей — только собираем готовое, иначе ждём
+            done, _ = wait(list(inflight), timeout=0 if batches else CONCURRENT_POLL_SEC,
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                src_flag, queue_name, tokens = inflight.pop(fut)
+                busy[src_flag] -= 1
+                try:
+                    wallets_by_token = fut.result()
+                except Exception as e:
+                    print(f"⚠️  Ошибка {src_flag} ({len(tokens)} токенов, первый {tokens[0]}): {e}")
+                    _release_tokens(leases, src_flag, queue_name, tokens, done=False)
+                    continue
+                for token in tokens:
+                    wallets = wallets_by_token.get(token) or []
+                    if not wallets:
+                        print(f"⚠️  {src_flag}:{token} — пусто")
+                    buffer.extend(wallets)
+                pending.add(src_flag, queue_name, tokens, buffer)
+                total_pushed += _push_chunks_safe(rds, buffer, pending, f"задача {src_flag}")
+
+        total_pushed += _push_tail(rds, buffer, pending)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        ch_pool.close()
+        if leases is not None:
+            leases.stop()   # аренды незавершённых задач и неотправленного буфера → токены обратно в очереди
+
+    print(
+        f"🏁 Готово: обработано {processed} токенов | "
+        f"отправлено кошельков: {total_pushed} | "
+        f"лимиты источников={limits}, "
+        f"очередь «{WALLETS_KEY}» len={_wallets_len(rds)}"
+        f"{_stats_summary()}"
+    )
 
 def consume_tokens_once() -> None:
+    if PROFILE_EXPORT:
+        add_hook(redis_stream_exporter(get_redis()))
+    if PRODUCER_CONCURRENT:
+        consume_tokens_concurrent()
+        return
+    if TOKEN_BATCH > 1:
+        consume_tokens_batched()
+        return
+
     rds = get_redis()
+    db = _producer_db()
+    sched = make_scheduler(rds)
+    scheduled = _scheduled_tokens(sched) if sched is not None else None
+    leases = _make_leases(rds)
+    pending = PendingTokens(leases)
     clear_queues_once(rds)
 
     buffer: List[str] = []
@@ -125,12 +750,15 @@ def consume_tokens_once() -> None:
     total_pushed = 0
 
     while True:
-        popped = rds.blpop(TOKEN_QUEUES, timeout=BLPOP_TIMEOUT)
+        if scheduled is not None:
+            popped = next(scheduled, None)
+        else:
+            popped = pop_one_token(rds)
         if popped is None:
             print(f"⌛ Нет новых токенов {BLPOP_TIMEOUT} с — завершаем сбор токенов")
-            _log_token_queues_state(rds)
+            _log_token_queues_state(rds, sched)
             if LOG_QUEUE_STATS:
-                print(f"ℹ️  {WALLETS_QUEUE} len={_llen_safe(rds, WALLETS_QUEUE)}")
+                print(f"ℹ️  {WALLETS_KEY} len={_wallets_len(rds)}")
             break
 
         queue_raw, token_raw = popped
@@ -140,52 +768,59 @@ def consume_tokens_once() -> None:
 
         if LOG_QUEUE_STATS:
             # показать, сколько осталось в каждой токенной очереди после этого BLPOP
-            _log_token_queues_state(rds)
+            _log_token_queues_state(rds, sched)
 
         fetcher = FETCHERS.get(src_flag)
         if fetcher is None:
             print(f"⚠️  Неизвестный src_flag={src_flag} — пропускаем токен {token}")
             continue
 
+        if not _claim_tokens(leases, src_flag, queue_name, [token]):
+            continue
+
         processed += 1
         print(f"🛠️  [{processed}] {src_flag}: обрабатываем {token}")
 
+        streaming = PRODUCER_STREAMING and not WALLET_ZSET and src_flag in STREAM_FETCHERS
         try:
-            rows = fetcher(token)
-            wallets = to_wallet_list(rows)
-            if not wallets:
-                print(f"⚠️  {src_flag}:{token} — пусто")
-                continue
+            if streaming:
+                found, pushed = _stream_token(rds, src_flag, token, buffer, db=db, pending=pending)
+                total_pushed += pushed
+            else:
+                wallets = fetch_wallets(rds, src_flag, [token], db=db)[token]
+                found = len(wallets)
+                # накапливаем в общий буфер
+                buffer.extend(wallets)
+        except Exception as e:
+            print(f"⚠️  Ошибка при обработке токена {token}: {e}")
+            # аренда снимается без отметки «обработан» — токен можно взять снова
+            _release_tokens(leases, src_flag, queue_name, [token], done=False)
+            continue
 
-            # накапливаем в общий буфер
-            buffer.extend(wallets)
+        if not found:
+            print(f"⚠️  {src_flag}:{token} — пусто")
+        # «обработан» — когда последний кошелёк токена уйдёт в Redis
+        pending.add(src_flag, queue_name, [token], buffer)
 
+        if not streaming:
             # выгружаем чанки
-            while len(buffer) >= BATCH_SIZE:
-                chunk = buffer[:BATCH_SIZE]
-                push_wallets_to_redis(rds, chunk, token="batch", src_flag="mix")
-                total_pushed += len(chunk)
-                print(f"📤  Отправили чанку {len(chunk)} кошельков в {WALLETS_QUEUE}")
-                del buffer[:BATCH_SIZE]
-
-            if DELAY_SEC:
-                time.sleep(DELAY_SEC)
+            total_pushed += _push_chunks_safe(rds, buffer, pending, f"токен {token}")
 
-        except Exception as e:
-            print(f"⚠️  Ошибка при обработке токена {token}: {e}")
-            continue
+        if DELAY_SEC:
+            time.sleep(DELAY_SEC)
 
     # финальный хвост
-    if buffer:
-        push_wallets_to_redis(rds, buffer, token="batch", src_flag="mix")
-        total_pushed += len(buffer)
-        print(f"📤  Финальный хвост {len(buffer)} кошельков в {WALLETS_QUEUE}")
-        buffer.clear()
+    try:
+        total_pushed += _push_tail(rds, buffer, pending)
+    finally:
+        if leases is not None:
+            leases.stop()
 
     print(
         f"🏁 Готово: обработано {processed} токенов | "
         f"отправлено кошельков: {total_pushed} | "
-        f"размер чанка={BATCH_SIZE}, очередь «{WALLETS_QUEUE}» len={_llen_safe(rds, WALLETS_QUEUE)}"
+        f"размер чанка={BATCH_SIZE}, очередь «{WALLETS_KEY}» len={_wallets_len(rds)}"
+        f"{_stats_summary()}"
     )
 
 
@@ -13,6 +13,7 @@ from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
 
 from src.sdk.queues.redis_connect import get_redis_sync as get_redis
+from src.sdk.queues.token_queue import TOKEN_PRIORITY, prio_key, push_tokens as publish_tokens
 
 # ────────────────────────── Конфиг ──────────────────────────
 
@@ -58,10 +59,11 @@ def push_tokens(tokens: List[str], queue: str) -> None:
         return
     rds = get_redis()
     if RESET_TOKENS_QUEUE:
-        rds.delete(queue)
+        rds.delete(queue, prio_key(queue))
         print(f"🧹  Очистили очередь {queue}")
-    rds.rpush(queue, *tokens)
-    print(f"🚚  Отправили {len(tokens)} токенов → {queue}")
+    # TOKEN_PRIORITY=1 → ZSET <queue>:prio, порядок трендов = приоритет
+    publish_tokens(rds, queue, tokens)
+    print(f"🚚  Отправили {len(tokens)} токенов → {prio_key(queue) if TOKEN_PRIORITY else queue}")
 
 # ────────────────────────── Парсер HTML ─────────────────────
 
@@ -11,8 +11,7 @@ import time
 from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from statistics import mean, median
-from typing import Any, Dict, List, Sequence, Optional, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Optional, Tuple
 from urllib.parse import quote, urlparse
 
 from loguru import logger
@@ -23,14 +22,31 @@ from sqlalchemy import select
 
 from src.sdk.databases.postgres.dependency import AsyncSessionLocal
 from src.sdk.databases.postgres.models import Wallet, WalletSnapshot
+from src.sdk.databases.postgres.snapshot_sink import SnapshotSink
+from src.sdk.queues.holdings_queue import HOLDINGS_QUEUE, pop_wallet
+from src.sdk.queues.redis_connect import get_redis
+from src.scraper.gmgn.scheduler import iter_prioritized_addresses
+from src.sdk.infrastructure.http import new_session
+from src.scraper.gmgn.metrics import humanize, calc_basic, calc_quality  # noqa: F401 (реэкспорт)
+
+try:
+    from src.scraper.gmgn.metrics_np import calc_metrics_batch
+except Exception:  # numpy не установлен → эталонные функции по одному кошельку
+    calc_metrics_batch = None
+
+try:
+    from src.scraper.gmgn.metrics_stream import STREAMING_AVAILABLE, metrics_from_chunks
+except Exception:
+    STREAMING_AVAILABLE, metrics_from_chunks = False, None
 
 # ───────────────────────── constants / env ──────────────────────────
 
 LOG_DIR = Path("logs"); LOG_DIR.mkdir(exist_ok=True)
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 GMGN_CHAIN = "sol"
-HOME_URL = f"https://gmgn.ai/?chain={GMGN_CHAIN}"
-API_ENDPOINT_TMPL = "https://gmgn.ai/api/v1/wallet_holdings/{chain}/{address}"
+GMGN_BASE_URL = os.getenv("GMGN_BASE_URL", "https://gmgn.ai").rstrip("/")
+HOME_URL = f"{GMGN_BASE_URL}/?chain={GMGN_CHAIN}"
+API_ENDPOINT_TMPL = GMGN_BASE_URL + "/api/v1/wallet_holdings/{chain}/{address}"
 
 # мягкая пауза между запросами API
 SLEEP_BETWEEN_REQ = (
@@ -48,6 +64,22 @@ COOKIE_REFRESH_TIMEOUT = int(os.getenv("COOKIE_REFRESH_TIMEOUT", "180"))
 COOKIES_MAX_AGE_S = int(os.getenv("COOKIES_MAX_AGE_S", "5400"))
 HEADLESS = os.getenv("HEADLESS", "0") not in ("0", "false", "False")
 
+# сколько кошельков копить перед пакетным расчётом метрик (metrics_np)
+METRICS_BATCH = max(1, int(os.getenv("METRICS_BATCH", "32")))
+
+# размер страницы keyset-чтения таблицы wallets
+WALLET_PAGE_SIZE = max(1, int(os.getenv("WALLET_PAGE_SIZE", "5000")))
+
+# порядок обхода: priority — scheduler (устаревшие и ценные первыми), id — подряд по wallets.id
+HOLDINGS_ORDER = os.getenv("HOLDINGS_ORDER", "priority")
+
+# потоковый разбор ответа (ijson): метрики без материализации списка holdings
+HOLDINGS_STREAMING = os.getenv("HOLDINGS_STREAMING", "0") not in ("0", "false", "False")
+
+# --daemon: кошельки из очереди pnl_scraper (HOLDINGS_QUEUE)
+HOLDINGS_BLPOP_TIMEOUT = int(os.getenv("HOLDINGS_BLPOP_TIMEOUT", "30"))
+DAEMON_FLUSH_S = float(os.getenv("HOLDINGS_DAEMON_FLUSH_S", "2"))
+
 # ───────────────────────── logging setup ────────────────────────────
 
 def setup_logger():
@@ -94,7 +126,7 @@ def headers_for_worker(idx: int, ua: str) -> Dict[str, str]:
         "accept-language": lang,
         "user-agent": ua,
         "referer": HOME_URL,
-        "origin": "https://gmgn.ai",
+        "origin": GMGN_BASE_URL,
     }
 
 def ensure_browser_like_headers(sess: curl.Session):
@@ -277,7 +309,7 @@ def split_evenly(items: List[str], n: int) -> List[List[str]]:
 async def wait_for_cf_clearance(context, timeout_s: int) -> bool:
     deadline = time.monotonic() + max(0, timeout_s)
     while time.monotonic() < deadline:
-        cookies = await context.cookies("https://gmgn.ai")
+        cookies = await context.cookies(GMGN_BASE_URL)
         if any(c.get("name") == "cf_clearance" and c.get("value") for c in cookies):
             return True
         await asyncio.sleep(1.5)
@@ -314,7 +346,7 @@ async def fetch_cookies_for_worker(worker: Worker) -> Dict[str, str]:
                     log.warning(f"reload() исключение: {e!r}")
                 _ = await wait_for_cf_clearance(context, max(0, WAIT_CLEARANCE_SECONDS - 10))
 
-            cookies_list = await context.cookies("https://gmgn.ai")
+            cookies_list = await context.cookies(GMGN_BASE_URL)
             cookies_dict = {c["name"]: c["value"] for c in cookies_list}
             if "cf_clearance" in cookies_dict and cookies_dict["cf_clearance"]:
                 log.success("cf_clearance получен")
@@ -335,19 +367,29 @@ def maybe_log_success(log, sc: int, dt_ms: float, resp_len: int):
     elif SUCCESS_LOG_SAMPLE_RATE and random.random() < SUCCESS_LOG_SAMPLE_RATE:
         log.bind(sample=True).info(f"{sc} OK in {dt_ms:.0f} ms, bytes={resp_len}")
 
-def get_with_retry(sess, url, params, log, cookies, max_attempts=3, sleep_base=2.0):
+def get_with_retry(sess, url, params, log, cookies, max_attempts=3, sleep_base=2.0, stream=False):
+    """
+    GET с ретраями. При stream=True тело 2xx не читается (его дочитывает
+    вызывающий через iter_content), dt — время до заголовков.
+    """
     last_resp = None
     for attempt in range(1, max_attempts + 1):
         t0 = time.perf_counter()
         try:
-            resp = sess.get(url, params=params, cookies=cookies)
+            if stream:
+                resp = sess.get(url, params=params, cookies=cookies, stream=True)
+            else:
+                resp = sess.get(url, params=params, cookies=cookies)
             dt = (time.perf_counter() - t0) * 1000.0
             sc = resp.status_code
             log_attempt = log.bind(attempt=attempt)
             if 200 <= sc < 300:
-                maybe_log_success(log_attempt, sc, dt, len(resp.content))
+                resp_len = int(resp.headers.get("content-length") or -1) if stream else len(resp.content)
+                maybe_log_success(log_attempt, sc, dt, resp_len)
                 return resp
-            elif sc == 403:
+            if stream:
+                resp.close()  # тело ошибки не нужно, статус и заголовки уже есть
+            if sc == 403:
                 log_attempt.warning(f"{sc} FORBIDDEN in {dt:.0f} ms")
             elif sc == 429:
                 log_attempt.warning(f"{sc} RATE_LIMIT in {dt:.0f} ms")
@@ -375,21 +417,47 @@ def get_with_retry(sess, url, params, log, cookies, max_attempts=3, sleep_base=2
 # ───────────────────── holdings client (stateful) ───────────────────
 
 class HoldingsClient:
-    def __init__(self, worker: Worker):
+    def __init__(self, worker: Worker,
+                 cookie_fetcher: Optional[Callable[[Worker], Awaitable[Dict[str, str]]]] = None):
         self.worker = worker
-        self.sess = curl.Session(impersonate="chrome", proxies=worker.proxy.for_curl(), timeout=30)
+        # по умолчанию — Playwright; бенчмарки подставляют свой fetcher
+        self.cookie_fetcher = cookie_fetcher or fetch_cookies_for_worker
+        self.sess = new_session(proxies=worker.proxy.for_curl(), timeout=30)
         self.sess.headers.update(worker.headers)
         ensure_browser_like_headers(self.sess)
 
     async def ensure_cookies(self, reason: str) -> None:
         self.worker.stats.refreshes += 1
-        new_cookies = await fetch_cookies_for_worker(self.worker)
+        new_cookies = await self.cookie_fetcher(self.worker)
         if new_cookies:
             self.worker.cookies = new_cookies
             self.worker.cookies_ts = time.time()
             await asyncio.sleep(random.uniform(1.0, 2.0))
 
     async def fetch_holdings(self, address: str, *, max_retry: int = 5) -> List[Dict[str, Any]]:
+        def parse(resp) -> List[Dict[str, Any]]:
+            self.worker.stats.bytes_rx += len(resp.content)
+            try:
+                return resp.json()["data"]["holdings"]
+            except Exception as exc:
+                raise RuntimeError(f"bad payload: {exc}") from exc
+
+        return await self._request(address, parse, max_retry=max_retry)
+
+    async def fetch_metrics(self, address: str, *, max_retry: int = 5) -> Dict[str, Any]:
+        """Метрики calc_basic + calc_quality, посчитанные по потоку ответа (см. metrics_stream)."""
+        def parse(resp) -> Dict[str, Any]:
+            try:
+                metrics, nbytes = metrics_from_chunks(resp.iter_content())
+            finally:
+                resp.close()
+            self.worker.stats.bytes_rx += nbytes
+            return metrics
+
+        return await self._request(address, parse, max_retry=max_retry, stream=True)
+
+    async def _request(self, address: str, parse: Callable[[Any], Any], *,
+                       max_retry: int = 5, stream: bool = False) -> Any:
         log = logger.bind(worker=self.worker.name, wallet=address, proxy=mask_proxy(self.worker.proxy.server_url))
         url = API_ENDPOINT_TMPL.format(chain=quote(GMGN_CHAIN), address=quote(address))
 
@@ -404,7 +472,8 @@ class HoldingsClient:
             attempt += 1
             # ВАЖНО: синхронный HTTP с ретраями — уводим в thread, чтобы не блокировать loop
             resp = await asyncio.to_thread(
-                get_with_retry, self.sess, url, self.worker.params, log, self.worker.cookies, 3
+                get_with_retry, self.sess, url, self.worker.params, log, self.worker.cookies, 3,
+                stream=stream,
             )
             self.worker.stats.attempts += 1
 
@@ -415,11 +484,10 @@ class HoldingsClient:
                 sc = resp.status_code
                 if 200 <= sc < 300:
                     self.worker.stats.ok += 1
-                    self.worker.stats.bytes_rx += len(resp.content)
-                    try:
-                        return resp.json()["data"]["holdings"]
-                    except Exception as exc:
-                        raise RuntimeError(f"bad payload: {exc}") from exc
+                    if stream:
+                        # чтение и разбор тела идут вместе с сетью → тоже в thread
+                        return await asyncio.to_thread(parse, resp)
+                    return parse(resp)
                 elif sc == 403:
                     self.worker.stats.forbidden += 1
                     rotate_identity(self.worker, self.sess, reason=f"403 on {address}")
@@ -441,106 +509,11 @@ class HoldingsClient:
         except Exception:
             pass
 
-# ─────────────────────────── utils (unchanged) ──────────────────────
-
-def humanize(sec: int | float | None) -> str | None:
-    if sec is None:
-        return None
-    td = timedelta(seconds=sec)
-    d, rem = divmod(int(td.total_seconds()), 86_400)
-    h, rem = divmod(rem, 3_600)
-    m, s = divmod(rem, 60)
-    parts = []
-    if d:
-        parts.append(f"{d}d")
-    if h or (d and (m or s)):
-        parts.append(f"{h}h")
-    if m or (d or h) and s:
-        parts.append(f"{m}m")
-    parts.append(f"{s}s")
-    return " ".join(parts)
-
-def calc_basic(data: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
-    pnl = [float(it["total_profit_pnl"]) for it in data]
-    wins = sum(p >= 0 for p in pnl)
-    losses = len(pnl) - wins
-    winrate = wins / len(pnl) * 100 if pnl else 0
-
-    durations = [
-        (it["end_holding_at"] - it["start_holding_at"])
-        for it in data
-        if it.get("start_holding_at") and it.get("end_holding_at")
-    ]
-    avg_hold = mean(durations) if durations else None
-
-    starts = sorted(int(it["start_holding_at"]) for it in data if it.get("start_holding_at"))
-    intervals = [b - a for a, b in zip(starts, starts[1:])]
-    avg_gap = mean(intervals) if intervals else None
-
-    return {
-        "total_trades": len(pnl),
-        "winrate_pct": round(winrate, 2),
-        "wins": wins,
-        "losses": losses,
-        "avg_hold_human": humanize(avg_hold),
-        "avg_interval_human": humanize(avg_gap),
-    }
+# ─────────────────────────── utils ──────────────────────────────────
 
-def calc_quality(data: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
-    pnl = [float(it["total_profit_pnl"]) for it in data]
-    gross_p = sum(p for p in pnl if p > 0)
-    gross_l = -sum(p for p in pnl if p < 0)
-    profit_factor = gross_p / gross_l if gross_l else None
-    expectancy = mean(pnl) if pnl else 0
-    total_pnl = sum(pnl)
-
-    wins = [p for p in pnl if p > 0]
-    losses = [p for p in pnl if p < 0]
-    rr = abs(mean(wins) / mean(losses)) if wins and losses else None
-
-    liqs = [float(it["liquidity"]) for it in data if it.get("liquidity")]
-    med_liq = median(liqs) if liqs else None
-
-    usd_vals = [float(it["usd_value"]) for it in data if float(it["usd_value"]) > 0]
-    hhi = None
-    if usd_vals:
-        total = sum(usd_vals)
-        hhi = sum((v / total) ** 2 for v in usd_vals) if total else None
-
-    honeypot_share = (
-        sum(bool(it.get("token", {}).get("is_honeypot")) for it in data) / len(data) * 100 if data else 0
-    )
-
-    net_pnl_30d = sum(
-        float(it.get("realized_profit_30d", 0)) + float(it.get("unrealized_profit", 0))
-        for it in data
-    )
-
-    turnover = sum(
-        float(it.get("history_bought_cost", 0)) + float(it.get("history_sold_income", 0))
-        for it in data
-    )
-    pnl_per_turn = net_pnl_30d / turnover if turnover else None
-
-    last_ts = max((int(it["last_active_timestamp"]) for it in data if it.get("last_active_timestamp")), default=None)
-    days_idle = (time.time() - last_ts) / 86_400 if last_ts else None
-
-    return {
-        "profit_factor": round(profit_factor, 8) if profit_factor else 0,
-        "expectancy": round(expectancy, 8),
-        "risk_reward": round(rr, 8) if rr else 0,
-        "median_liquidity_usd": round(med_liq, 2) if med_liq else 0,
-        "hhi": round(hhi, 6) if hhi else 0,
-        "honeypot_share_pct": round(honeypot_share, 2),
-        "net_pnl_30d_usd": round(net_pnl_30d, 2),
-        "turnover_usd": round(turnover, 2),
-        "pnl_per_turnover": round(pnl_per_turn, 6) if pnl_per_turn else 0,
-        "days_idle": round(days_idle, 2) if days_idle else 0,
-        "pnl": round(total_pnl, 2),
-    }
-
-def build_snapshot(row: Dict[str, Any]) -> WalletSnapshot:
-    return WalletSnapshot(
+def snapshot_values(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка метрик → значения колонок wallet_snapshot."""
+    return dict(
         address              = row["address"],
         ts_utc               = datetime.fromisoformat(row["timestamp_utc"]),
         profit_factor        = row["profit_factor"],
@@ -560,13 +533,58 @@ def build_snapshot(row: Dict[str, Any]) -> WalletSnapshot:
         pnl                  = row["pnl"],
     )
 
+def build_snapshot(row: Dict[str, Any]) -> WalletSnapshot:
+    return WalletSnapshot(**snapshot_values(row))
+
+async def iter_wallet_addresses(limit: int | None = None, *, page_size: int = WALLET_PAGE_SIZE,
+                                min_pnl: float | None = None) -> AsyncIterator[str]:
+    """
+    Адреса из wallets по возрастанию id, страницами ``id > last_id LIMIT n``
+    (keyset: каждая страница — index range scan по PK, без OFFSET).
+    Фильтр min_pnl и limit выполняются в SQL; соединение занято только на время страницы.
+    """
+    last_id, left = 0, limit
+    while left is None or left > 0:
+        n = page_size if left is None else min(page_size, left)
+        stmt = select(Wallet.id, Wallet.address).where(Wallet.id > last_id)
+        if min_pnl is not None:
+            stmt = stmt.where(Wallet.pnl >= min_pnl)
+        stmt = stmt.order_by(Wallet.id).limit(n)
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+        for _, address in rows:
+            yield address
+        if len(rows) < n:
+            return
+        last_id = rows[-1][0]
+        if left is not None:
+            left -= len(rows)
+
 async def load_wallet_addresses(limit: int | None = None) -> List[str]:
-    async with AsyncSessionLocal() as session:
-        result = await session.scalars(select(Wallet.address).order_by(Wallet.id))
-        addresses = result.all()
-        if limit is not None:
-            addresses = addresses[:limit]
-        return addresses
+    return [a async for a in iter_wallet_addresses(limit)]
+
+async def feed_wallets(queue: asyncio.Queue, source: AsyncIterator[str], consumers: int) -> int:
+    """Перекладывает адреса в ограниченную очередь (backpressure), в конце — по None на воркера."""
+    fed = 0
+    cancelled = False
+    try:
+        async for address in source:
+            await queue.put(address)
+            fed += 1
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        for _ in range(consumers):
+            if not cancelled:
+                await queue.put(None)
+                continue
+            # отмена — воркеры уже не читают очередь, ждать места в ней нельзя (завис бы shutdown)
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                break
+    return fed
 
 # ───────────────────────── app logic (unchanged API) ────────────────
 
@@ -581,29 +599,65 @@ async def analyse_wallet(addr: str, client: HoldingsClient) -> Dict[str, Any]:
         **qual,
     }
 
+def score_holdings(datas: Sequence[List[Dict[str, Any]]]) -> List[Dict[str, Any] | BaseException]:
+    """Метрики для пачки ответов; вместо метрик битого кошелька — его исключение."""
+    if calc_metrics_batch is not None and len(datas) > 1:
+        return calc_metrics_batch(datas)
+    out: List[Dict[str, Any] | BaseException] = []
+    for data in datas:
+        try:
+            out.append({**calc_basic(data), **calc_quality(data)})
+        except Exception as exc:
+            out.append(exc)
+    return out
+
 # ───────────────────────── workers processing ───────────────────────
 
-async def process_chunk(worker: Worker, addresses: List[str], fixed_delay: Optional[float]) -> Tuple[str, Stats, int]:
+async def process_chunk(worker: Worker, queue: asyncio.Queue, fixed_delay: Optional[float],
+                        sink: SnapshotSink, metrics_batch: int = METRICS_BATCH) -> Tuple[str, Stats, int]:
     client = HoldingsClient(worker)
     processed = 0
+    streaming = HOLDINGS_STREAMING and STREAMING_AVAILABLE
+    # (address, timestamp_utc, holdings) — ждут пакетного расчёта метрик
+    pending: List[Tuple[str, str, List[Dict[str, Any]]]] = []
+
+    async def save(addr: str, ts: str, res: Dict[str, Any]) -> None:
+        nonlocal processed
+        # запись в БД — пачкой в sink (COPY + upsert), а не commit на кошелёк
+        await sink.add(snapshot_values({"address": addr, "timestamp_utc": ts, **res}))
+        processed += 1
+
+    async def flush() -> None:
+        results = score_holdings([data for _, _, data in pending])
+        for (addr, ts, _), res in zip(pending, results):
+            if isinstance(res, BaseException):
+                logger.bind(worker=worker.name, wallet=addr).opt(exception=res).error(f"⚠️  {addr}: {res!r}")
+                continue
+            await save(addr, ts, res)
+        pending.clear()
+
     try:
-        async with AsyncSessionLocal() as session:
-            for addr in addresses:
-                try:
-                    full: Dict[str, Any] = await analyse_wallet(addr, client)
-
-                    snapshot = build_snapshot(full)
-                    session.add(snapshot)
-                    await session.commit()
-                    processed += 1
-                except Exception as exc:
-                    await session.rollback()
-                    logger.bind(worker=worker.name, wallet=addr).exception(f"⚠️  {addr}: {exc!r}")
-                # пауза
-                if fixed_delay and fixed_delay > 0:
-                    await asyncio.sleep(fixed_delay)
+        while (addr := await queue.get()) is not None:
+            try:
+                if streaming:
+                    res = await client.fetch_metrics(addr)
+                    ts = datetime.now(timezone.utc).isoformat(timespec="seconds")
+                    await save(addr, ts, res)
                 else:
-                    await asyncio.sleep(random.uniform(*SLEEP_BETWEEN_REQ))
+                    data = await client.fetch_holdings(addr)
+                    ts = datetime.now(timezone.utc).isoformat(timespec="seconds")
+                    pending.append((addr, ts, data))
+                    if len(pending) >= metrics_batch:
+                        await flush()
+            except Exception as exc:
+                logger.bind(worker=worker.name, wallet=addr).exception(f"⚠️  {addr}: {exc!r}")
+            # пауза
+            if fixed_delay and fixed_delay > 0:
+                await asyncio.sleep(fixed_delay)
+            else:
+                await asyncio.sleep(random.uniform(*SLEEP_BETWEEN_REQ))
+        if pending:
+            await flush()
     finally:
         client.close()
     # итог по воркеру
@@ -617,25 +671,9 @@ async def process_chunk(worker: Worker, addresses: List[str], fixed_delay: Optio
 
 # ─────────────────────────── main loop ──────────────────────────────
 
-async def main_async(limit: int | None, delay: float, workers_num: int) -> None:
-    try:
-        wallets = await load_wallet_addresses(limit)
-    except Exception as exc:
-        sys.exit(f"Не удалось загрузить адреса из БД: {exc}")
-
-    if not wallets:
-        sys.exit("Список кошельков пуст — нечего анализировать")
-
-    # количество воркеров
-    NUM_WORKERS = max(1, min(workers_num, len(wallets)))
-    workers = build_workers(NUM_WORKERS)
-    parts = split_evenly(wallets, NUM_WORKERS)
-
-    for i, w in enumerate(workers):
-        logger.info(f"[{w.name}] назначено кошельков: {len(parts[i])} | proxy={mask_proxy(w.proxy.server_url)} | ua_idx={w.ua_idx}")
-
-    # последовательный съём cookies для каждого воркера
-    logger.info(f"Снимаю cookies последовательно для {NUM_WORKERS} воркеров...")
+async def init_worker_cookies(workers: List[Worker]) -> None:
+    """Последовательный съём cookies для каждого воркера."""
+    logger.info(f"Снимаю cookies последовательно для {len(workers)} воркеров...")
     for w in workers:
         try:
             c = await asyncio.wait_for(fetch_cookies_for_worker(w), timeout=COOKIE_REFRESH_TIMEOUT)
@@ -648,19 +686,59 @@ async def main_async(limit: int | None, delay: float, workers_num: int) -> None:
             logger.bind(worker=w.name).warning("Пустые cookies — возможны 403")
         await asyncio.sleep(0.5)
 
-    # параллельная обработка чанков
-    tasks = [
-        asyncio.create_task(process_chunk(w, parts[i], delay))
-        for i, w in enumerate(workers)
-        if parts[i]  # пропускаем пустые
-    ]
+async def main_async(limit: int | None, delay: float, workers_num: int,
+                     min_pnl: float | None = None, page_size: int = WALLET_PAGE_SIZE,
+                     order: str = HOLDINGS_ORDER) -> None:
+    # адреса читаются страницами параллельно с работой воркеров
+    if order == "priority":
+        source = iter_prioritized_addresses(limit, min_pnl=min_pnl, page_size=page_size)
+    else:
+        source = iter_wallet_addresses(limit, page_size=page_size, min_pnl=min_pnl)
+    try:
+        first = await anext(source)
+    except StopAsyncIteration:
+        sys.exit("Список кошельков пуст — нечего анализировать")
+    except Exception as exc:
+        sys.exit(f"Не удалось загрузить адреса из БД: {exc}")
+
+    async def wallets() -> AsyncIterator[str]:
+        yield first
+        async for a in source:
+            yield a
+
+    # количество воркеров
+    NUM_WORKERS = max(1, min(workers_num, limit) if limit else workers_num)
+    workers = build_workers(NUM_WORKERS)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2 * page_size)
+    feeder = asyncio.create_task(feed_wallets(queue, wallets(), NUM_WORKERS))
+
+    for w in workers:
+        logger.info(f"[{w.name}] proxy={mask_proxy(w.proxy.server_url)} | ua_idx={w.ua_idx}")
+
+    await init_worker_cookies(workers)
+
+    # параллельная обработка чанков; снимки всех воркеров пишутся одним sink
+    sink = SnapshotSink()
+    tasks = [asyncio.create_task(process_chunk(w, queue, delay, sink)) for w in workers]
 
     results: List[Tuple[str, Stats, int]] = []
-    for coro in asyncio.as_completed(tasks):
-        try:
-            results.append(await coro)
-        except Exception as e:
-            logger.exception(f"Исключение в таске воркера: {e!r}")
+    try:
+        for coro in asyncio.as_completed(tasks):
+            try:
+                results.append(await coro)
+            except Exception as e:
+                logger.exception(f"Исключение в таске воркера: {e!r}")
+    finally:
+        await sink.close()
+    if not feeder.done():
+        feeder.cancel()  # воркеры завершились раньше (упали) — очередь больше никто не читает
+    try:
+        fed = await feeder
+    except asyncio.CancelledError:
+        fed = None
+    except Exception as exc:
+        fed = None
+        logger.exception(f"Чтение адресов из БД прервано: {exc!r}")
 
     # свод
     total = Stats()
@@ -680,18 +758,73 @@ async def main_async(limit: int | None, delay: float, workers_num: int) -> None:
 
     logger.success(
         "Свод: "
-        f"processed={processed_total}, ok={total.ok}, 403={total.forbidden}, 429={total.rate_limited}, "
+        f"wallets={fed}, processed={processed_total}, ok={total.ok}, 403={total.forbidden}, 429={total.rate_limited}, "
         f"5xx={total.server_err}, other4xx={total.other_err}, exc={total.exceptions}, "
-        f"refreshes={total.refreshes}, ua_switches={total.ua_switches}, bytes={total.bytes_rx}, attempts={total.attempts}"
+        f"refreshes={total.refreshes}, ua_switches={total.ua_switches}, bytes={total.bytes_rx}, attempts={total.attempts}, "
+        f"snapshots_written={sink.written}, snapshots_unchanged={sink.unchanged}, snapshots_failed={sink.failed}"
     )
 
+# ─────────────────────────── daemon mode ────────────────────────────
+
+async def feed_from_redis(queue: asyncio.Queue) -> None:
+    """Перекладывает кошельки из HOLDINGS_QUEUE (их публикует pnl_scraper) в локальную очередь воркеров."""
+    rds = get_redis()
+    while True:
+        try:
+            item = await pop_wallet(rds, HOLDINGS_BLPOP_TIMEOUT)
+        except Exception as exc:
+            logger.exception(f"BLPOP {HOLDINGS_QUEUE} error: {exc!r}")
+            await asyncio.sleep(3)
+            continue
+        if item and item.get("address"):
+            logger.bind(wallet=item["address"]).debug(f"из {HOLDINGS_QUEUE}: pnl={item.get('pnl')} token={item.get('token')}")
+            await queue.put(item["address"])
+
+async def flush_periodically(sink: SnapshotSink, every: float) -> None:
+    while True:
+        await asyncio.sleep(every)
+        await sink.flush()
+
+async def main_daemon(delay: float, workers_num: int) -> None:
+    """
+    Непрерывный режим: кошельки приходят из HOLDINGS_QUEUE по одному, метрики
+    считаются сразу (без пакетного накопления), снимки сбрасываются раз в DAEMON_FLUSH_S.
+    """
+    workers = build_workers(max(1, workers_num))
+    await init_worker_cookies(workers)
+
+    # маленькая локальная очередь: взятое из Redis, но не начатое, теряется только при падении
+    queue: asyncio.Queue = asyncio.Queue(maxsize=len(workers))
+    sink = SnapshotSink(flush_interval=DAEMON_FLUSH_S)
+    background = [
+        asyncio.create_task(feed_from_redis(queue)),
+        asyncio.create_task(flush_periodically(sink, DAEMON_FLUSH_S)),
+    ]
+    logger.success(f"Daemon started: queue '{HOLDINGS_QUEUE}', workers={len(workers)}")
+    try:
+        await asyncio.gather(*(process_chunk(w, queue, delay, sink, metrics_batch=1) for w in workers))
+    finally:
+        for t in background:
+            t.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await sink.close()
+
 if __name__ == "__main__":
     prs = argparse.ArgumentParser("GMGN holdings scraper → WalletSnapshot")
     prs.add_argument("--limit", "-l", type=int, help="Максимум адресов для обработки")
     prs.add_argument("--delay", "-d", type=float, default=0.0, help="Пауза между кошельками (сек); если 0 — используется REQ_SLEEP_MIN..MAX")
     prs.add_argument("--workers", "-w", type=int, default=int(os.getenv("GMGN_WORKERS", "5")), help="Количество параллельных воркеров")
+    prs.add_argument("--min-pnl", type=float, help="Только кошельки с wallets.pnl >= значения (фильтр в SQL)")
+    prs.add_argument("--page-size", type=int, default=WALLET_PAGE_SIZE, help="Размер страницы при чтении wallets")
+    prs.add_argument("--order", choices=("priority", "id"), default=HOLDINGS_ORDER,
+                     help="priority — по приоритету scheduler, id — подряд по wallets.id")
+    prs.add_argument("--daemon", action="store_true",
+                     help=f"Непрерывно обрабатывать кошельки из Redis-очереди {HOLDINGS_QUEUE} (от pnl_scraper)")
     args = prs.parse_args()
     try:
-        asyncio.run(main_async(args.limit, args.delay, args.workers))
+        if args.daemon:
+            asyncio.run(main_daemon(args.delay, args.workers))
+        else:
+            asyncio.run(main_async(args.limit, args.delay, args.workers, args.min_pnl, args.page_size, args.order))
     except KeyboardInterrupt:
         pass
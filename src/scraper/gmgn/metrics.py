@@ -0,0 +1,111 @@
+# src/scraper/gmgn/metrics.py
+"""
+Метрики кошелька по ответу GMGN ``wallet_holdings`` (эталонная реализация).
+
+calc_basic / calc_quality перенесены сюда из holdings_scraper без изменений:
+модуль без тяжёлых зависимостей, его используют и скрейпер, и пакетный
+движок ``metrics_np`` (как эталон для сверки).
+"""
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+from statistics import mean, median
+from typing import Any, Dict, Sequence
+
+
+def humanize(sec: int | float | None) -> str | None:
+    if sec is None:
+        return None
+    td = timedelta(seconds=sec)
+    d, rem = divmod(int(td.total_seconds()), 86_400)
+    h, rem = divmod(rem, 3_600)
+    m, s = divmod(rem, 60)
+    parts = []
+    if d:
+        parts.append(f"{d}d")
+    if h or (d and (m or s)):
+        parts.append(f"{h}h")
+    if m or (d or h) and s:
+        parts.append(f"{m}m")
+    parts.append(f"{s}s")
+    return " ".join(parts)
+
+def calc_basic(data: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    pnl = [float(it["total_profit_pnl"]) for it in data]
+    wins = sum(p >= 0 for p in pnl)
+    losses = len(pnl) - wins
+    winrate = wins / len(pnl) * 100 if pnl else 0
+
+    durations = [
+        (it["end_holding_at"] - it["start_holding_at"])
+        for it in data
+        if it.get("start_holding_at") and it.get("end_holding_at")
+    ]
+    avg_hold = mean(durations) if durations else None
+
+    starts = sorted(int(it["start_holding_at"]) for it in data if it.get("start_holding_at"))
+    intervals = [b - a for a, b in zip(starts, starts[1:])]
+    avg_gap = mean(intervals) if intervals else None
+
+    return {
+        "total_trades": len(pnl),
+        "winrate_pct": round(winrate, 2),
+        "wins": wins,
+        "losses": losses,
+        "avg_hold_human": humanize(avg_hold),
+        "avg_interval_human": humanize(avg_gap),
+    }
+
+def calc_quality(data: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    pnl = [float(it["total_profit_pnl"]) for it in data]
+    gross_p = sum(p for p in pnl if p > 0)
+    gross_l = -sum(p for p in pnl if p < 0)
+    profit_factor = gross_p / gross_l if gross_l else None
+    expectancy = mean(pnl) if pnl else 0
+    total_pnl = sum(pnl)
+
+    wins = [p for p in pnl if p > 0]
+    losses = [p for p in pnl if p < 0]
+    rr = abs(mean(wins) / mean(losses)) if wins and losses else None
+
+    liqs = [float(it["liquidity"]) for it in data if it.get("liquidity")]
+    med_liq = median(liqs) if liqs else None
+
+    usd_vals = [float(it["usd_value"]) for it in data if float(it["usd_value"]) > 0]
+    hhi = None
+    if usd_vals:
+        total = sum(usd_vals)
+        hhi = sum((v / total) ** 2 for v in usd_vals) if total else None
+
+    honeypot_share = (
+        sum(bool(it.get("token", {}).get("is_honeypot")) for it in data) / len(data) * 100 if data else 0
+    )
+
+    net_pnl_30d = sum(
+        float(it.get("realized_profit_30d", 0)) + float(it.get("unrealized_profit", 0))
+        for it in data
+    )
+
+    turnover = sum(
+        float(it.get("history_bought_cost", 0)) + float(it.get("history_sold_income", 0))
+        for it in data
+    )
+    pnl_per_turn = net_pnl_30d / turnover if turnover else None
+
+    last_ts = max((int(it["last_active_timestamp"]) for it in data if it.get("last_active_timestamp")), default=None)
+    days_idle = (time.time() - last_ts) / 86_400 if last_ts else None
+
+    return {
+        "profit_factor": round(profit_factor, 8) if profit_factor else 0,
+        "expectancy": round(expectancy, 8),
+        "risk_reward": round(rr, 8) if rr else 0,
+        "median_liquidity_usd": round(med_liq, 2) if med_liq else 0,
+        "hhi": round(hhi, 6) if hhi else 0,
+        "honeypot_share_pct": round(honeypot_share, 2),
+        "net_pnl_30d_usd": round(net_pnl_30d, 2),
+        "turnover_usd": round(turnover, 2),
+        "pnl_per_turnover": round(pnl_per_turn, 6) if pnl_per_turn else 0,
+        "days_idle": round(days_idle, 2) if days_idle else 0,
+        "pnl": round(total_pnl, 2),
+    }
@@ -0,0 +1,339 @@
+# src/scraper/gmgn/metrics_np.py
+"""
+Пакетный NumPy-движок метрик holdings для многих кошельков сразу.
+
+Холдинги всех кошельков батча раскладываются за один проход в колоночные
+массивы (``seg`` — номер кошелька для каждой позиции), после чего все метрики
+calc_basic + calc_quality считаются сегментными редукциями без
+Python-циклов по позициям. Эталон — ``src.scraper.gmgn.metrics``:
+
+ * суммы (gross profit/loss, pnl, HHI, net_pnl_30d, turnover) считаются
+   слева направо, как встроенный ``sum`` CPython ≤ 3.11 — через ``cumsum``
+   по строкам матрицы «кошелёк × позиция», дополненной нулями;
+ * средние длительностей/интервалов — из точных целых сумм;
+ * медиана ликвидности — та же схема (a + b) / 2, что в ``statistics.median``;
+ * ``mean`` по float (expectancy, risk/reward) — точное, как ``statistics.mean``:
+   сумма в виде double-double через ``math.fsum`` и одно деление Fraction на
+   кошелёк (считается в том же проходе загрузки).
+
+Кошельки нестандартной формы (строковые таймстемпы, ``token: null``,
+отсутствующие поля) отдаются эталонным функциям — результат, включая
+исключения, совпадает с ними. ``check_parity`` сверяет движок с эталоном.
+"""
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.scraper.gmgn.metrics import calc_basic, calc_quality, humanize
+
+Holdings = Sequence[Dict[str, Any]]
+MetricsOrError = Union[Dict[str, Any], BaseException]
+
+
+class _Fallback(Exception):
+    """Кошелёк не укладывается в быстрый путь — считаем эталоном."""
+
+# ───────────────────────── columnar load ────────────────────────────
+
+@dataclass
+class HoldingsColumns:
+    n_wallets: int
+    counts: np.ndarray          # позиций на кошелёк (0 для fallback)
+    seg: np.ndarray             # номер кошелька для каждой позиции
+    pnl: np.ndarray
+    usd: np.ndarray
+    net: np.ndarray             # realized_profit_30d + unrealized_profit
+    turn: np.ndarray            # history_bought_cost + history_sold_income
+    honeypot: np.ndarray        # bool
+    dur_seg: np.ndarray
+    dur: np.ndarray             # end - start (int64), только где оба заданы
+    start_seg: np.ndarray
+    start: np.ndarray           # int(start_holding_at), где задан
+    liq_seg: np.ndarray
+    liq: np.ndarray             # float(liquidity), где задана
+    last_seg: np.ndarray
+    last: np.ndarray            # int(last_active_timestamp), где задан
+    means: List[Tuple[float, Optional[float], Optional[float]]]  # mean(pnl), mean(wins), mean(losses)
+    fallback: List[int]
+
+
+def _exact_mean(xs: List[float]) -> float:
+    """statistics.mean для float: корректно округлённое (точная сумма) / n."""
+    hi = math.fsum(xs)
+    xs.append(-hi)
+    lo = math.fsum(xs)          # остаток S - hi
+    xs.pop()
+    return float((Fraction(hi) + Fraction(lo)) / len(xs))
+
+
+def _load_wallet(w: int, data: Holdings, cols: Tuple[list, ...]) -> Tuple[float, Optional[float], Optional[float]]:
+    (pnl, usd, net, turn, hp, dur_seg, dur, start_seg, start,
+     liq_seg, liq, last_seg, last) = cols
+    wins: List[float] = []
+    losses: List[float] = []
+    for it in data:
+        p = float(it["total_profit_pnl"])
+        if p > 0:
+            wins.append(p)
+        elif p < 0:
+            losses.append(p)
+        elif p != p:
+            raise _Fallback  # NaN
+        s = it.get("start_holding_at")
+        e = it.get("end_holding_at")
+        if (s and type(s) is not int) or (e and type(e) is not int):
+            raise _Fallback
+        lq = it.get("liquidity")
+        la = it.get("last_active_timestamp")
+        u = float(it["usd_value"])
+        n_ = float(it.get("realized_profit_30d", 0)) + float(it.get("unrealized_profit", 0))
+        t_ = float(it.get("history_bought_cost", 0)) + float(it.get("history_sold_income", 0))
+        h = bool(it.get("token", {}).get("is_honeypot"))
+
+        pnl.append(p); usd.append(u); net.append(n_); turn.append(t_); hp.append(h)
+        if s:
+            start_seg.append(w); start.append(s)
+            if e:
+                dur_seg.append(w); dur.append(e - s)
+        if lq:
+            liq_seg.append(w); liq.append(float(lq))
+        if la:
+            last_seg.append(w); last.append(int(la))
+    if not math.isfinite(math.fsum(pnl)):
+        raise _Fallback
+    return (
+        _exact_mean(pnl),
+        _exact_mean(wins) if wins else None,
+        _exact_mean(losses) if losses else None,
+    )
+
+
+def load_columns(datas: Sequence[Holdings]) -> HoldingsColumns:
+    """Один Python-проход по позициям батча → колонки NumPy."""
+    W = len(datas)
+    counts = np.zeros(W, dtype=np.int64)
+    fallback: List[int] = []
+    means: List[Tuple[float, Optional[float], Optional[float]]] = []
+    seg: List[int] = []
+    cols: Tuple[list, ...] = tuple([] for _ in range(13))
+    for w, data in enumerate(datas):
+        local: Tuple[list, ...] = tuple([] for _ in range(13))
+        try:
+            if not data:
+                raise _Fallback  # пустой ответ: эталон вернёт int-нули, не float
+            means.append(_load_wallet(w, data, local))
+        except Exception:
+            fallback.append(w)
+            means.append((0.0, None, None))
+            continue
+        counts[w] = len(local[0])
+        seg.extend([w] * len(local[0]))
+        for dst, src in zip(cols, local):
+            dst.extend(src)
+
+    (pnl, usd, net, turn, hp, dur_seg, dur, start_seg, start,
+     liq_seg, liq, last_seg, last) = cols
+    i64, f64 = np.int64, np.float64
+    return HoldingsColumns(
+        n_wallets=W,
+        counts=counts,
+        seg=np.asarray(seg, dtype=i64),
+        pnl=np.asarray(pnl, dtype=f64),
+        usd=np.asarray(usd, dtype=f64),
+        net=np.asarray(net, dtype=f64),
+        turn=np.asarray(turn, dtype=f64),
+        honeypot=np.asarray(hp, dtype=bool),
+        dur_seg=np.asarray(dur_seg, dtype=i64),
+        dur=np.asarray(dur, dtype=i64),
+        start_seg=np.asarray(start_seg, dtype=i64),
+        start=np.asarray(start, dtype=i64),
+        liq_seg=np.asarray(liq_seg, dtype=i64),
+        liq=np.asarray(liq, dtype=f64),
+        last_seg=np.asarray(last_seg, dtype=i64),
+        last=np.asarray(last, dtype=i64),
+        means=means,
+        fallback=fallback,
+    )
+
+# ───────────────────────── segment reductions ───────────────────────
+
+def _seq_sum(values: np.ndarray, seg: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Сумма по сегментам в порядке слева направо (как встроенный sum).
+    Позиции, исключённые фильтром, передаются нулями: x + 0.0 == x.
+    """
+    W = len(counts)
+    width = int(counts.max()) if W else 0
+    if width == 0:
+        return np.zeros(W, dtype=np.float64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(len(values)) - starts[seg]
+    mat = np.zeros((W, width), dtype=np.float64)
+    mat[seg, pos] = values
+    return np.cumsum(mat, axis=1)[:, -1]
+
+
+def _count(seg: np.ndarray, W: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    return np.bincount(seg if mask is None else seg[mask], minlength=W)
+
+
+def _int_sum(values: np.ndarray, seg: np.ndarray, W: int) -> List[int]:
+    out = np.zeros(W, dtype=np.int64)
+    np.add.at(out, seg, values)
+    return out.tolist()
+
+
+def _seg_median(values: np.ndarray, seg: np.ndarray, W: int) -> List[Optional[float]]:
+    order = np.lexsort((values, seg))
+    v = values[order]
+    cnt = np.bincount(seg, minlength=W)
+    starts = np.concatenate(([0], np.cumsum(cnt)[:-1]))
+    out: List[Optional[float]] = [None] * W
+    has = np.nonzero(cnt)[0]
+    lo = v[starts[has] + (cnt[has] - 1) // 2]
+    hi = v[starts[has] + cnt[has] // 2]
+    odd = (cnt[has] % 2) == 1
+    med = np.where(odd, lo, (lo + hi) / 2)
+    for w, m in zip(has.tolist(), med.tolist()):
+        out[w] = m
+    return out
+
+# ───────────────────────── engine ───────────────────────────────────
+
+def _mean_int(total: int, n: int) -> Union[int, float]:
+    # statistics.mean по int: целое, если делится нацело, иначе корректно округлённый float
+    q, r = divmod(total, n)
+    return q if r == 0 else total / n
+
+
+def calc_metrics_batch(datas: Sequence[Holdings], now: Optional[float] = None) -> List[MetricsOrError]:
+    """
+    ``{**calc_basic(d), **calc_quality(d)}`` для каждого элемента ``datas``.
+    Если эталон на кошельке бросает исключение, на его месте возвращается
+    само исключение — один битый ответ не роняет батч.
+    """
+    now = time.time() if now is None else now
+    c = load_columns(datas)
+    W = c.n_wallets
+    n = c.counts
+
+    pos = c.pnl > 0
+    neg = c.pnl < 0
+    zeros = np.zeros_like(c.pnl)
+    wins_ge = _count(c.seg, W, c.pnl >= 0).tolist()
+    gross_p = _seq_sum(np.where(pos, c.pnl, zeros), c.seg, n).tolist()
+    neg_sum = _seq_sum(np.where(neg, c.pnl, zeros), c.seg, n).tolist()
+    total_pnl = _seq_sum(c.pnl, c.seg, n).tolist()
+
+    usd_pos = c.usd > 0
+    usd_vals = np.where(usd_pos, c.usd, zeros)
+    usd_total = _seq_sum(usd_vals, c.seg, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = np.where(usd_pos, usd_vals / usd_total[c.seg], zeros)
+    hhi_sum = _seq_sum(np.where(usd_pos, shares ** 2, zeros), c.seg, n).tolist()
+    n_usd = _count(c.seg, W, usd_pos).tolist()
+    usd_total = usd_total.tolist()
+
+    honeypots = _count(c.seg, W, c.honeypot).tolist()
+    net = _seq_sum(c.net, c.seg, n).tolist()
+    turnover = _seq_sum(c.turn, c.seg, n).tolist()
+
+    n_dur = _count(c.dur_seg, W).tolist()
+    dur_sum = _int_sum(c.dur, c.dur_seg, W)
+    n_start = _count(c.start_seg, W).tolist()
+    s_min = np.full(W, np.iinfo(np.int64).max, dtype=np.int64)
+    s_max = np.full(W, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(s_min, c.start_seg, c.start)
+    np.maximum.at(s_max, c.start_seg, c.start)
+    s_min, s_max = s_min.tolist(), s_max.tolist()
+    last_max = np.zeros(W, dtype=np.int64)
+    np.maximum.at(last_max, c.last_seg, c.last)
+    n_last = _count(c.last_seg, W).tolist()
+    last_max = last_max.tolist()
+    med_liq = _seg_median(c.liq, c.liq_seg, W)
+
+    fallback = set(c.fallback)
+    counts = n.tolist()
+    out: List[MetricsOrError] = []
+    for w in range(W):
+        if w in fallback:
+            try:
+                out.append({**calc_basic(datas[w]), **calc_quality(datas[w])})
+            except Exception as exc:
+                out.append(exc)
+            continue
+
+        k = counts[w]
+        wins = wins_ge[w]
+        winrate = wins / k * 100
+        avg_hold = _mean_int(dur_sum[w], n_dur[w]) if n_dur[w] else None
+        avg_gap = _mean_int(s_max[w] - s_min[w], n_start[w] - 1) if n_start[w] > 1 else None
+
+        gl = -neg_sum[w]
+        profit_factor = gross_p[w] / gl if gl else None
+        expectancy, mean_win, mean_loss = c.means[w]
+        rr = abs(mean_win / mean_loss) if mean_win is not None and mean_loss is not None else None
+        med = med_liq[w]
+        hhi = (hhi_sum[w] if usd_total[w] else None) if n_usd[w] else None
+        honeypot_share = honeypots[w] / k * 100
+        pnl_per_turn = net[w] / turnover[w] if turnover[w] else None
+        last_ts = last_max[w] if n_last[w] else None
+        days_idle = (now - last_ts) / 86_400 if last_ts else None
+
+        out.append({
+            "total_trades": k,
+            "winrate_pct": round(winrate, 2),
+            "wins": wins,
+            "losses": k - wins,
+            "avg_hold_human": humanize(avg_hold),
+            "avg_interval_human": humanize(avg_gap),
+            "profit_factor": round(profit_factor, 8) if profit_factor else 0,
+            "expectancy": round(expectancy, 8),
+            "risk_reward": round(rr, 8) if rr else 0,
+            "median_liquidity_usd": round(med, 2) if med else 0,
+            "hhi": round(hhi, 6) if hhi else 0,
+            "honeypot_share_pct": round(honeypot_share, 2),
+            "net_pnl_30d_usd": round(net[w], 2),
+            "turnover_usd": round(turnover[w], 2),
+            "pnl_per_turnover": round(pnl_per_turn, 6) if pnl_per_turn else 0,
+            "days_idle": round(days_idle, 2) if days_idle else 0,
+            "pnl": round(total_pnl[w], 2),
+        })
+    return out
+
+
+def _same(ref: Any, got: Any) -> bool:
+    # NaN в метриках (nan в total_profit_pnl) совпадает с NaN, хотя nan != nan
+    return ref == got or (isinstance(ref, float) and isinstance(got, float) and ref != ref and got != got)
+
+
+def check_parity(datas: Sequence[Holdings], now: Optional[float] = None) -> List[Tuple[int, str, Any, Any]]:
+    """
+    Сверка с эталоном: [(индекс кошелька, метрика, эталон, движок), ...].
+    days_idle не сравнивается — эталон берёт time.time() сам.
+    """
+    got = calc_metrics_batch(datas, now)
+    diffs: List[Tuple[int, str, Any, Any]] = []
+    for w, data in enumerate(datas):
+        try:
+            ref: MetricsOrError = {**calc_basic(data), **calc_quality(data)}
+        except Exception as exc:
+            ref = exc
+        g = got[w]
+        if isinstance(ref, BaseException) or isinstance(g, BaseException):
+            if type(ref) is not type(g):
+                diffs.append((w, "<exception>", ref, g))
+            continue
+        for key, val in ref.items():
+            if key != "days_idle" and not _same(val, g.get(key)):
+                diffs.append((w, key, val, g.get(key)))
+    return diffs
+
+
+__all__: list[str] = ["HoldingsColumns", "load_columns", "calc_metrics_batch", "check_parity"]
@@ -0,0 +1,318 @@
+# src/scraper/gmgn/metrics_stream.py
+"""
+Однопроходный расчёт метрик holdings прямо из потока ответа GMGN.
+
+Тело ``wallet_holdings`` разбирается инкрементально (ijson, путь
+``data.holdings.item``), каждая позиция сразу уходит в ``HoldingsAccumulator``
+и выбрасывается — пиковая память на кошелёк не зависит от числа позиций.
+
+Аккумуляторы и расхождения с эталоном ``src.scraper.gmgn.metrics``:
+ * суммы (pnl, gross profit/loss, net_pnl_30d, turnover), счётчики, min/max
+   стартов (средний интервал = (max - min) / (k - 1)), целая сумма
+   длительностей, max last_active — те же операции, результат совпадает;
+ * средние (expectancy, risk/reward) — Welford; отличие от точного
+   ``statistics.mean`` — на уровне ulp;
+ * HHI = Σv² / (Σv)² — алгебраически то же, что Σ(v/Σv)², в пределах ulp;
+ * медиана ликвидности точная, пока значений ≤ LIQ_EXACT_MAX, дальше —
+   t-digest (приближённая, память O(compression)).
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import ijson
+except Exception:  # ijson не установлен → потоковый режим недоступен
+    ijson = None
+
+from src.scraper.gmgn.metrics import humanize
+
+STREAMING_AVAILABLE = ijson is not None
+HOLDINGS_PREFIX = "data.holdings.item"
+LIQ_EXACT_MAX = 2048
+
+# ───────────────────────── t-digest ─────────────────────────────────
+
+class TDigest:
+    """Компактный merging t-digest (Dunning) для квантилей потока."""
+
+    def __init__(self, compression: float = 100.0, buffer_size: int = 500):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self._centroids: List[Tuple[float, float]] = []   # (mean, weight), по возрастанию mean
+        self._buffer: List[float] = []
+        self.count = 0
+
+    def add(self, x: float) -> None:
+        self._buffer.append(x)
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        items = sorted(self._centroids + [(x, 1.0) for x in self._buffer])
+        self._buffer = []
+        total = float(self.count)
+        merged: List[Tuple[float, float]] = []
+        cur_m, cur_w = items[0]
+        seen = 0.0
+        k_lo = self._k(0.0)
+        for m, w in items[1:]:
+            q = (seen + cur_w + w) / total
+            if self._k(min(q, 1.0)) - k_lo <= 1.0:
+                cur_m += (m - cur_m) * w / (cur_w + w)
+                cur_w += w
+            else:
+                merged.append((cur_m, cur_w))
+                seen += cur_w
+                k_lo = self._k(seen / total)
+                cur_m, cur_w = m, w
+        merged.append((cur_m, cur_w))
+        self._centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        cs = self._centroids
+        if not cs:
+            return None
+        if len(cs) == 1:
+            return cs[0][0]
+        target = q * self.count
+        cum = 0.0
+        for i, (m, w) in enumerate(cs):
+            mid = cum + w / 2
+            if target < mid:
+                if i == 0:
+                    return m
+                pm, pw = cs[i - 1]
+                pmid = cum - pw / 2
+                return pm + (m - pm) * (target - pmid) / (mid - pmid)
+            cum += w
+        return cs[-1][0]
+
+
+class StreamingMedian:
+    """Точная медиана до LIQ_EXACT_MAX значений, дальше — t-digest."""
+
+    def __init__(self, exact_max: int = LIQ_EXACT_MAX):
+        self.exact_max = exact_max
+        self._values: Optional[List[float]] = []
+        self._digest: Optional[TDigest] = None
+
+    def add(self, x: float) -> None:
+        if self._values is not None:
+            self._values.append(x)
+            if len(self._values) > self.exact_max:
+                self._digest = TDigest()
+                for v in self._values:
+                    self._digest.add(v)
+                self._values = None
+        else:
+            self._digest.add(x)
+
+    def result(self) -> Optional[float]:
+        if self._values is not None:
+            xs = sorted(self._values)
+            n = len(xs)
+            if not n:
+                return None
+            return xs[n // 2] if n % 2 else (xs[n // 2 - 1] + xs[n // 2]) / 2
+        return self._digest.quantile(0.5)
+
+# ───────────────────────── accumulator ──────────────────────────────
+
+class HoldingsAccumulator:
+    """Все метрики calc_basic + calc_quality за один проход по позициям."""
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.wins_ge = 0
+        self.total_pnl = 0.0
+        self.gross_p = 0.0
+        self.neg_sum = 0.0
+        self.mean = 0.0
+        self.n_pos = 0
+        self.mean_pos = 0.0
+        self.n_neg = 0
+        self.mean_neg = 0.0
+        self.dur_sum = 0
+        self.n_dur = 0
+        self.start_min: Optional[int] = None
+        self.start_max: Optional[int] = None
+        self.n_start = 0
+        self.liq = StreamingMedian()
+        self.usd_sum = 0.0
+        self.usd_sq = 0.0
+        self.n_usd = 0
+        self.honeypots = 0
+        self.net = 0.0
+        self.turnover = 0.0
+        self.last_ts: Optional[int] = None
+
+    def add(self, it: Dict[str, Any]) -> None:
+        p = float(it["total_profit_pnl"])
+        self.n += 1
+        self.total_pnl += p
+        self.mean += (p - self.mean) / self.n
+        if p >= 0:
+            self.wins_ge += 1
+        if p > 0:
+            self.gross_p += p
+            self.n_pos += 1
+            self.mean_pos += (p - self.mean_pos) / self.n_pos
+        elif p < 0:
+            self.neg_sum += p
+            self.n_neg += 1
+            self.mean_neg += (p - self.mean_neg) / self.n_neg
+
+        s = it.get("start_holding_at")
+        e = it.get("end_holding_at")
+        if s and e:
+            self.dur_sum += e - s
+            self.n_dur += 1
+        if s:
+            s = int(s)
+            self.n_start += 1
+            self.start_min = s if self.start_min is None else min(self.start_min, s)
+            self.start_max = s if self.start_max is None else max(self.start_max, s)
+
+        if it.get("liquidity"):
+            self.liq.add(float(it["liquidity"]))
+
+        u = float(it["usd_value"])
+        if u > 0:
+            self.usd_sum += u
+            self.usd_sq += u * u
+            self.n_usd += 1
+
+        if it.get("token", {}).get("is_honeypot"):
+            self.honeypots += 1
+        self.net += float(it.get("realized_profit_30d", 0)) + float(it.get("unrealized_profit", 0))
+        self.turnover += float(it.get("history_bought_cost", 0)) + float(it.get("history_sold_income", 0))
+
+        la = it.get("last_active_timestamp")
+        if la:
+            la = int(la)
+            self.last_ts = la if self.last_ts is None else max(self.last_ts, la)
+
+    def result(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        n = self.n
+        winrate = self.wins_ge / n * 100 if n else 0
+        avg_hold = self.dur_sum / self.n_dur if self.n_dur else None
+        avg_gap = (self.start_max - self.start_min) / (self.n_start - 1) if self.n_start > 1 else None
+
+        gross_l = -self.neg_sum
+        profit_factor = self.gross_p / gross_l if gross_l else None
+        expectancy = self.mean if n else 0
+        rr = abs(self.mean_pos / self.mean_neg) if self.n_pos and self.n_neg else None
+        med_liq = self.liq.result()
+        hhi = None
+        if self.n_usd:
+            hhi = self.usd_sq / (self.usd_sum * self.usd_sum) if self.usd_sum else None
+        honeypot_share = self.honeypots / n * 100 if n else 0
+        pnl_per_turn = self.net / self.turnover if self.turnover else None
+        days_idle = (now - self.last_ts) / 86_400 if self.last_ts else None
+
+        return {
+            "total_trades": n,
+            "winrate_pct": round(winrate, 2),
+            "wins": self.wins_ge,
+            "losses": n - self.wins_ge,
+            "avg_hold_human": humanize(avg_hold),
+            "avg_interval_human": humanize(avg_gap),
+            "profit_factor": round(profit_factor, 8) if profit_factor else 0,
+            "expectancy": round(expectancy, 8),
+            "risk_reward": round(rr, 8) if rr else 0,
+            "median_liquidity_usd": round(med_liq, 2) if med_liq else 0,
+            "hhi": round(hhi, 6) if hhi else 0,
+            "honeypot_share_pct": round(honeypot_share, 2),
+            "net_pnl_30d_usd": round(self.net, 2),
+            "turnover_usd": round(self.turnover, 2),
+            "pnl_per_turnover": round(pnl_per_turn, 6) if pnl_per_turn else 0,
+            "days_idle": round(days_idle, 2) if days_idle else 0,
+            "pnl": round(self.total_pnl, 2),
+        }
+
+# ───────────────────────── incremental JSON ─────────────────────────
+
+class _HoldingsItems:
+    """
+    Собирает элементы ``data.holdings`` из событий ijson.parse по одному и
+    запоминает, встретился ли сам массив (без него ответ считается битым).
+    """
+
+    def __init__(self, on_item) -> None:
+        self.on_item = on_item
+        self.seen_array = False
+        self._builder = None
+        self._depth = 0
+
+    def feed(self, prefix: str, event: str, value: Any) -> None:
+        if self._builder is not None:
+            self._builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                self._depth += 1
+            elif event in ("end_map", "end_array"):
+                self._depth -= 1
+                if self._depth == 0:
+                    self.on_item(self._builder.value)
+                    self._builder = None
+            return
+        if prefix == HOLDINGS_PREFIX:
+            if event in ("start_map", "start_array"):
+                self._builder = ijson.ObjectBuilder()
+                self._builder.event(event, value)
+                self._depth = 1
+            else:
+                self.on_item(value)
+        elif prefix == "data.holdings" and event == "start_array":
+            self.seen_array = True
+
+
+def metrics_from_chunks(chunks: Iterable[bytes], now: Optional[float] = None) -> Tuple[Dict[str, Any], int]:
+    """
+    Разбирает тело ответа по кускам и считает метрики на лету.
+    Возвращает (метрики, принято байт). Ответ без ``data.holdings`` или
+    битый JSON → RuntimeError, как у HoldingsClient.fetch_holdings.
+    """
+    if ijson is None:
+        raise RuntimeError("ijson is not installed — streaming metrics unavailable")
+    acc = HoldingsAccumulator()
+    items = _HoldingsItems(acc.add)
+    events = ijson.sendable_list()
+    coro = ijson.parse_coro(events, use_float=True)
+    nbytes = 0
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            nbytes += len(chunk)
+            coro.send(chunk)
+            for ev in events:
+                items.feed(*ev)
+            del events[:]
+        coro.close()
+        for ev in events:
+            items.feed(*ev)
+    except Exception as exc:
+        raise RuntimeError(f"bad payload: {exc}") from exc
+    if not items.seen_array:
+        raise RuntimeError("bad payload: no data.holdings")
+    return acc.result(now), nbytes
+
+
+__all__: list[str] = [
+    "STREAMING_AVAILABLE",
+    "TDigest",
+    "StreamingMedian",
+    "HoldingsAccumulator",
+    "metrics_from_chunks",
+]
@@ -3,7 +3,7 @@ import asyncio, time, random, secrets, uuid, hashlib, json
 import datetime as dt
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Awaitable, Callable, List, Dict, Tuple, Optional
 from urllib.parse import quote, urlparse
 from concurrent.futures import ThreadPoolExecutor
 
@@ -15,6 +15,9 @@ from curl_cffi import requests as curl
 from src.sdk.databases.postgres.dependency import with_db_session
 from src.sdk.databases.postgres.models import Wallet
 from src.sdk.queues.redis_connect import get_redis
+from src.sdk.queues.holdings_queue import HOLDINGS_QUEUE, publish_wallets
+from src.sdk.queues.flow_control import FLOW_CONTROL, note_popped, record_drain
+from src.sdk.infrastructure.http import new_session
 
 try:
     from zoneinfo import ZoneInfo
@@ -41,16 +44,28 @@ logger = logger.bind(app="gmgn")
 
 # ─── настройки ───────────────────────────────────────────────────────
 CHAIN = "sol"
-HOME_URL = f"https://gmgn.ai/?chain={CHAIN}"
+GMGN_BASE_URL = os.getenv("GMGN_BASE_URL", "https://gmgn.ai").rstrip("/")
+HOME_URL = f"{GMGN_BASE_URL}/?chain={CHAIN}"
 
 # Очередь и её логи
 QUEUE_NAME = os.getenv("REDIS_QUEUE", "wallet_queue")
 REDIS_BLPOP_TIMEOUT = int(os.getenv("REDIS_BLPOP_TIMEOUT", "120"))  # таймаут BLPOP (сек)
 LOG_QUEUE_STATS = os.getenv("LOG_QUEUE_STATS", "1") not in ("0", "false", "False")
+# zset — pnl_producer кладёт кошельки с score в WALLETS_ZSET; снимаем лучших первыми (ZPOPMAX)
+WALLET_QUEUE_MODE = os.getenv("WALLET_QUEUE_MODE", "list").lower()
+WALLETS_ZSET = os.getenv("WALLETS_ZSET", f"{QUEUE_NAME}:zset")
+WALLET_ZPOP_CHUNK = int(os.getenv("WALLET_ZPOP_CHUNK", "500"))  # кошельков в батче process_batch
 
 # Порог PnL для записи в БД
 PNL_MIN_THRESHOLD = float(os.getenv("PNL_MIN_THRESHOLD", "0.6"))
 
+# все ответы GMGN (кошелёк → pnl) → Redis HASH для обучения prescreen-модели продюсера
+PRESCREEN_LABELS = os.getenv("PRESCREEN_LABELS", "0") not in ("0", "false", "False")
+PRESCREEN_LABELS_KEY = os.getenv("PRESCREEN_LABELS_KEY", "prescreen:labels")
+
+# новые позитивные кошельки → очередь holdings_scraper --daemon
+PUBLISH_TO_HOLDINGS = os.getenv("PUBLISH_TO_HOLDINGS", "1") not in ("0", "false", "False")
+
 # Базовые query-параметры (уникализируем на воркера ниже)
 PARAMS = {
     "from_app": "gmgn",
@@ -63,8 +78,11 @@ PARAMS = {
 
 WAIT_CLEARANCE_SECONDS = 75
 HEADLESS = False
-SLEEP_BETWEEN_REQ = (3.0, 4.0)
-API_TEMPLATE = "https://gmgn.ai/api/v1/wallet_stat/{chain}/{wallet}/7d"
+SLEEP_BETWEEN_REQ = (
+    float(os.getenv("PNL_REQ_SLEEP_MIN", "3.0")),
+    float(os.getenv("PNL_REQ_SLEEP_MAX", "4.0")),
+)
+API_TEMPLATE = GMGN_BASE_URL + "/api/v1/wallet_stat/{chain}/{wallet}/7d"
 
 COOKIE_REFRESH_JITTER = (1.0, 2.0)
 COOKIE_REFRESH_TIMEOUT = int(os.getenv("COOKIE_REFRESH_TIMEOUT", "180"))
@@ -113,7 +131,7 @@ def headers_for_worker(idx: int, ua: str) -> Dict[str, str]:
         "accept-language": lang,
         "user-agent": ua,
         "referer": HOME_URL,
-        "origin": "https://gmgn.ai",
+        "origin": GMGN_BASE_URL,
     }
 
 # ─── прокси ──────────────────────────────────────────────────────────
@@ -202,6 +220,7 @@ class Worker:
     params: Dict[str, str] = field(default_factory=dict)
     cookies_ts: float = 0.0
     stats: Stats = field(default_factory=Stats)
+    labels: List[Tuple[str, float]] = field(default_factory=list)  # (кошелёк, pnl) — все ответы GMGN
 
 # ─── UA/headers утилиты ──────────────────────────────────────────────
 def _choose_alt_ua_idx(current_idx: int) -> int:
@@ -280,11 +299,16 @@ def make_worker_params(base: dict, worker_idx: int, ua: str,
 
 # ─── Cookie refresh ──────────────────────────────────────────────────
 COOKIE_QUEUE: Optional["CookieRefreshQueue"] = None
+# (кошелёк, мс на запрос(ы) без паузы между кошельками, получен ли 2xx) — для src.bench.throughput
+WALLET_TIMING_HOOK: Optional[Callable[[str, float, bool], None]] = None
 
 class CookieRefreshQueue:
-    def __init__(self, loop: asyncio.AbstractEventLoop, max_parallel: int = 1):
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_parallel: int = 1,
+                 cookie_fetcher: Optional[Callable[[Worker], Awaitable[Dict[str, str]]]] = None):
         self.loop = loop
         self.sem = asyncio.Semaphore(max_parallel)
+        # по умолчанию — Playwright; бенчмарки подставляют свой fetcher
+        self.cookie_fetcher = cookie_fetcher or fetch_cookies_for_worker
 
     async def _refresh(self, worker: Worker, reason: str) -> Dict[str, str]:
         log = logger.bind(worker=worker.name, proxy=mask_proxy(worker.proxy.server_url))
@@ -293,7 +317,7 @@ class CookieRefreshQueue:
             log.warning("Получил слот → обновляю cookies через Playwright")
             try:
                 cookies = await asyncio.wait_for(
-                    fetch_cookies_for_worker(worker),
+                    self.cookie_fetcher(worker),
                     timeout=COOKIE_REFRESH_TIMEOUT,
                 )
             except asyncio.TimeoutError:
@@ -310,7 +334,7 @@ class CookieRefreshQueue:
 async def wait_for_cf_clearance(context, timeout_s: int) -> bool:
     deadline = time.monotonic() + max(0, timeout_s)
     while time.monotonic() < deadline:
-        cookies = await context.cookies("https://gmgn.ai")
+        cookies = await context.cookies(GMGN_BASE_URL)
         if any(c.get("name") == "cf_clearance" and c.get("value") for c in cookies):
             return True
         await asyncio.sleep(1.5)
@@ -347,7 +371,7 @@ async def fetch_cookies_for_worker(worker: Worker) -> Dict[str, str]:
                     log.warning(f"reload() исключение: {e!r}")
                 _ = await wait_for_cf_clearance(context, max(0, WAIT_CLEARANCE_SECONDS - 10))
 
-            cookies_list = await context.cookies("https://gmgn.ai")
+            cookies_list = await context.cookies(GMGN_BASE_URL)
             cookies_dict = {c["name"]: c["value"] for c in cookies_list}
             if "cf_clearance" in cookies_dict and cookies_dict["cf_clearance"]:
                 log.success("cf_clearance получен")
@@ -415,34 +439,37 @@ def get_with_retry(sess, url, params, log, cookies, max_attempts=3, sleep_base=2
 
 # ─── DB save (async) ─────────────────────────────────────────────────
 @with_db_session
-async def save_snapshot_if_positive(wallet: str, pnl_value: float, *, db_session):
+async def save_snapshot_if_positive(wallet: str, pnl_value: float, *, db_session) -> bool:
+    """True — кошелёк записан впервые (commit делает with_db_session после возврата)."""
     if pnl_value is None or pnl_value <= PNL_MIN_THRESHOLD:
-        return
+        return False
     snapshot = Wallet(address=wallet, pnl=round(pnl_value, 3))
     db_session.add(snapshot)
     try:
         await db_session.flush()
         logger.success(f"Snapshot saved for {wallet} (PnL {pnl_value:.3f})")
+        return True
     except Exception as e:
         try:
             from sqlalchemy.exc import IntegrityError
             if isinstance(e, IntegrityError):
                 await db_session.rollback()
                 logger.info(f"Snapshot duplicate ignored for {wallet}")
-                return
+                return False
         except Exception:
             pass
         await db_session.rollback()
         logger.exception(f"DB error on save {wallet}: {e!r}")
+        return False
 
 # ─── основная работа воркера (sync, в пуле) ─────────────────────────
 def run_worker_requests(worker: Worker) -> Tuple[str, Stats, List[Tuple[str, float]]]:
     log = logger.bind(worker=worker.name, proxy=mask_proxy(worker.proxy.server_url))
     proxies = worker.proxy.for_curl()
     try:
-        sess = curl.Session(impersonate="chrome", proxies=proxies, timeout=30)
+        sess = new_session(proxies=proxies, timeout=30)
     except Exception:
-        sess = curl.Session(impersonate="chrome", proxies=proxies, timeout=30)
+        sess = new_session(proxies=proxies, timeout=30)
 
     sess.headers.update(worker.headers)
     ensure_browser_like_headers(sess)
@@ -478,12 +505,16 @@ def run_worker_requests(worker: Worker) -> Tuple[str, Stats, List[Tuple[str, flo
                     req_log.exception(f"Ошибка proactive refresh: {e!r}")
 
         resp = None
+        t_req = time.perf_counter()
+        ok = False
         try:
             resp = get_with_retry(sess, url, worker.params, req_log, cookies=worker.cookies, max_attempts=3)
             worker.stats.attempts += 1
             if resp is None:
                 worker.stats.exceptions += 1
                 req_log.error("Нет ответа после всех попыток")
+                if WALLET_TIMING_HOOK is not None:
+                    WALLET_TIMING_HOOK(wallet, (time.perf_counter() - t_req) * 1000.0, False)
                 if SLEEP_BETWEEN_REQ[1] > 0:
                     time.sleep(random.uniform(*SLEEP_BETWEEN_REQ))
                 continue
@@ -518,12 +549,15 @@ def run_worker_requests(worker: Worker) -> Tuple[str, Stats, List[Tuple[str, flo
                                     try:
                                         data = resp2.json()
                                         pnl = (data or {}).get("data", {}).get("pnl")
+                                        if isinstance(pnl, (int, float)):
+                                            worker.labels.append((wallet, float(pnl)))
                                         if isinstance(pnl, (int, float)) and pnl > PNL_MIN_THRESHOLD:
                                             positives.append((wallet, float(pnl)))
                                     except Exception:
                                         pass
                                     worker.stats.ok += 1
                                     worker.stats.bytes_rx += len(resp2.content)
+                                    ok = True
                                 elif sc2 == 403:
                                     worker.stats.forbidden += 1
                                 elif sc2 == 429:
@@ -546,12 +580,15 @@ def run_worker_requests(worker: Worker) -> Tuple[str, Stats, List[Tuple[str, flo
                 try:
                     data = resp.json()
                     pnl = (data or {}).get("data", {}).get("pnl")
+                    if isinstance(pnl, (int, float)):
+                        worker.labels.append((wallet, float(pnl)))
                     if isinstance(pnl, (int, float)) and pnl > PNL_MIN_THRESHOLD:
                         positives.append((wallet, float(pnl)))
                 except Exception:
                     pass
                 worker.stats.ok += 1
                 worker.stats.bytes_rx += len(resp.content)
+                ok = True
 
             elif sc == 429:
                 worker.stats.rate_limited += 1
@@ -566,6 +603,8 @@ def run_worker_requests(worker: Worker) -> Tuple[str, Stats, List[Tuple[str, flo
             worker.stats.exceptions += 1
             req_log.exception(f"Исключение при запросе: {e!r}")
 
+        if WALLET_TIMING_HOOK is not None:
+            WALLET_TIMING_HOOK(wallet, (time.perf_counter() - t_req) * 1000.0, ok)
         if SLEEP_BETWEEN_REQ[1] > 0:
             time.sleep(random.uniform(*SLEEP_BETWEEN_REQ))
 
@@ -666,13 +705,30 @@ async def process_batch(wallets: List[str], *, token: str = "batch"):
         total_stats.ua_switches += st.ua_switches
         positives_all.extend(pos)
 
+    if PRESCREEN_LABELS:
+        labels = {w: pnl for wk in selected for w, pnl in wk.labels}
+        if labels:
+            try:
+                await get_redis().hset(PRESCREEN_LABELS_KEY, mapping=labels)
+                logger.info(f"Метки prescreen: {len(labels)} → {PRESCREEN_LABELS_KEY}")
+            except Exception as e:
+                logger.exception(f"Запись меток prescreen не удалась: {e!r}")
+
     if positives_all:
         logger.info(f"Сохранение {len(positives_all)} записей в БД (PnL > {PNL_MIN_THRESHOLD})")
+        fresh: List[Tuple[str, float]] = []
         for wallet, pnl in positives_all:
             try:
-                await save_snapshot_if_positive(wallet, pnl)
+                if await save_snapshot_if_positive(wallet, pnl):
+                    fresh.append((wallet, pnl))
             except Exception as e:
                 logger.exception(f"DB save failed for {wallet}: {e!r}")
+        if fresh and PUBLISH_TO_HOLDINGS:
+            try:
+                n = await publish_wallets(get_redis(), fresh, token=token)
+                logger.bind(queue=HOLDINGS_QUEUE).info(f"В очередь holdings: {n} новых кошельков")
+            except Exception as e:
+                logger.exception(f"Публикация в {HOLDINGS_QUEUE} не удалась: {e!r}")
 
     elapsed = time.perf_counter() - t_start
     logger.success(
@@ -734,8 +790,14 @@ async def redis_loop() -> None:
                 logger.warning(f"Пустое сообщение в очереди: {raw}")
                 continue
 
+            if FLOW_CONTROL:
+                await note_popped(rds, QUEUE_NAME, len(wallets))
+
             await process_batch(wallets, token=token)
 
+            if FLOW_CONTROL:
+                await record_drain(rds, QUEUE_NAME, len(wallets))
+
             if LOG_QUEUE_STATS:
                 qlen_post = await _llen_safe(rds, QUEUE_NAME)
                 logger.bind(queue=QUEUE_NAME).info(f"Батч завершён. Текущий {QUEUE_NAME} len={qlen_post}")
@@ -744,6 +806,61 @@ async def redis_loop() -> None:
             logger.exception(f"redis_loop error: {exc!r}")
             await asyncio.sleep(3)
 
+async def _zcard_safe(rds, key: str) -> int:
+    try:
+        return int(await rds.zcard(key))
+    except Exception:
+        return -1
+
+async def pop_scored_wallets(rds, n: int) -> List[str]:
+    """
+    До n кошельков с наибольшим score (ZPOPMAX). Пустой ZSET → ждём первый через
+    BZPOPMAX и добираем остальное; [] — за REDIS_BLPOP_TIMEOUT ничего не пришло.
+    """
+    popped = await rds.zpopmax(WALLETS_ZSET, n)
+    if not popped:
+        first = await rds.bzpopmax(WALLETS_ZSET, timeout=REDIS_BLPOP_TIMEOUT)
+        if first is None:
+            return []
+        popped = [(first[1], first[2])]
+        if n > 1:
+            popped += await rds.zpopmax(WALLETS_ZSET, n - 1)
+    wallets = [w.decode() if isinstance(w, (bytes, bytearray)) else str(w) for w, _score in popped]
+    if LOG_QUEUE_STATS and popped:
+        logger.bind(queue=WALLETS_ZSET).info(
+            f"ZPOPMAX {len(wallets)} кошельков, score {popped[0][1]:.0f}…{popped[-1][1]:.0f}"
+        )
+    return [w.strip() for w in wallets if w]
+
+async def redis_zset_loop() -> None:
+    rds = get_redis()
+    logger.success(f"Worker started, zset '{WALLETS_ZSET}' (chunk={WALLET_ZPOP_CHUNK})")
+
+    while True:
+        try:
+            wallets = await pop_scored_wallets(rds, WALLET_ZPOP_CHUNK)
+            if not wallets:
+                if LOG_QUEUE_STATS:
+                    logger.bind(queue=WALLETS_ZSET).warning(
+                        f"BZPOPMAX timeout {REDIS_BLPOP_TIMEOUT}s — очередь пуста? "
+                        f"len={await _zcard_safe(rds, WALLETS_ZSET)}"
+                    )
+                continue
+
+            await process_batch(wallets, token="zset")
+
+            if FLOW_CONTROL:
+                await record_drain(rds, WALLETS_ZSET, len(wallets))
+
+            if LOG_QUEUE_STATS:
+                logger.bind(queue=WALLETS_ZSET).info(
+                    f"Батч завершён. Текущий {WALLETS_ZSET} len={await _zcard_safe(rds, WALLETS_ZSET)}"
+                )
+
+        except Exception as exc:
+            logger.exception(f"redis_zset_loop error: {exc!r}")
+            await asyncio.sleep(3)
+
 # ─── entrypoint ──────────────────────────────────────────────────────
 async def main():
     logger.info("Старт gmgn_multi_workers (режим Redis→GMGN→DB)")
@@ -751,7 +868,10 @@ async def main():
     global COOKIE_QUEUE
     COOKIE_QUEUE = CookieRefreshQueue(asyncio.get_running_loop(), max_parallel=1)
     # запускаем консюмер очереди
-    await redis_loop()
+    if WALLET_QUEUE_MODE == "zset":
+        await redis_zset_loop()
+    else:
+        await redis_loop()
 
 if __name__ == "__main__":
     asyncio.run(main())
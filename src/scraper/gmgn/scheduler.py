@@ -0,0 +1,133 @@
+# src/scraper/gmgn/scheduler.py
+"""
+Приоритетный порядок обновления holdings-метрик.
+
+Вместо обхода wallets по id кошельки отдаются по убыванию приоритета:
+
+    score = W_STALE · min(дней с последнего снимка, STALE_CAP) / STALE_CAP
+          + W_PNL   · ln(1 + max(pnl, 0)) / ln(1 + PNL_REF)
+          + W_WIN   · winrate_pct / 100
+          − W_IDLE  · min(days_idle, IDLE_CAP) / IDLE_CAP
+
+Кошелёк без снимков считается устаревшим на STALE_CAP (максимум), у него
+нейтральный winrate (50) и days_idle = 0. Момент проверки — более поздний из
+ts_utc последнего снимка и wallets.holdings_checked_at (пересчёт без
+изменений, см. SNAPSHOT_DEDUP). Кошельки, проверенные свежее MIN_REFRESH_H
+часов, пропускаются.
+
+Последний снимок берётся из wallet_latest (LEFT JOIN по PK address) — без
+обращения к истории; фильтр min_pnl — по ix_wallets_pnl. score вычисляется
+на каждую строку, поэтому индекса под ORDER BY score нет: каждая страница —
+полный проход по wallets ⟕ wallet_latest с top-N сортировкой (LIMIT page_size,
+память ограничена страницей).
+
+Страницы читаются keyset'ом по (score, id), каждая — в своей короткой сессии:
+соединение и транзакция не держатся весь многочасовой прогон (pgbouncer/Neon
+pooler, idle-in-transaction). Чтобы score между страницами не «плыл», «сейчас»
+фиксируется в начале прогона (as_of); кошельки, проверенные уже после as_of,
+отсекаются фильтром свежести и повторно не выдаются.
+"""
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy import DateTime, Float, Select, and_, cast, func, literal, or_, select
+
+from src.sdk.databases.postgres.dependency import AsyncSessionLocal
+from src.sdk.databases.postgres.models import Wallet, WalletLatest
+
+
+@dataclass(frozen=True)
+class PriorityWeights:
+    stale: float = float(os.getenv("SCHED_W_STALE", "1.0"))
+    pnl: float = float(os.getenv("SCHED_W_PNL", "0.6"))
+    winrate: float = float(os.getenv("SCHED_W_WIN", "0.3"))
+    idle: float = float(os.getenv("SCHED_W_IDLE", "0.5"))
+    stale_cap_days: float = float(os.getenv("SCHED_STALE_CAP_DAYS", "14"))
+    idle_cap_days: float = float(os.getenv("SCHED_IDLE_CAP_DAYS", "60"))
+    pnl_ref: float = float(os.getenv("SCHED_PNL_REF", "100000"))
+    min_refresh_h: float = float(os.getenv("SCHED_MIN_REFRESH_H", "6"))
+
+
+def priority_query(weights: PriorityWeights, *, limit: Optional[int] = None,
+                   min_pnl: Optional[float] = None, as_of: Optional[datetime] = None,
+                   after: Optional[Tuple[float, int]] = None) -> Select:
+    """
+    SELECT address, score, id FROM wallets ⟕ последний снимок ORDER BY score DESC, id.
+    as_of — момент «сейчас» (по умолчанию now()); after — (score, id) последней
+    строки предыдущей страницы.
+    """
+    latest = WalletLatest.__table__
+    w = weights
+    now = func.now() if as_of is None else literal(as_of, DateTime(timezone=True))
+    checked = func.greatest(latest.c.ts_utc, Wallet.holdings_checked_at)   # GREATEST игнорирует NULL
+    stale_days = func.coalesce(
+        func.extract("epoch", now - checked) / 86400.0,
+        w.stale_cap_days,
+    )
+    pnl = func.greatest(func.coalesce(cast(Wallet.pnl, Float), 0.0), 0.0)
+    score = (
+        w.stale * func.least(stale_days, w.stale_cap_days) / w.stale_cap_days
+        + w.pnl * func.ln(1.0 + pnl) / math.log1p(w.pnl_ref)
+        + w.winrate * func.coalesce(cast(latest.c.winrate_pct, Float), 50.0) / 100.0
+        - w.idle * func.least(func.coalesce(cast(latest.c.days_idle, Float), 0.0), w.idle_cap_days)
+        / w.idle_cap_days
+    ).label("score")
+
+    stmt = (
+        select(Wallet.address, score, Wallet.id)
+        .select_from(Wallet)
+        .outerjoin(latest, latest.c.address == Wallet.address)
+    )
+    if w.min_refresh_h > 0 or as_of is not None:
+        # с as_of — всегда: проверенные по ходу прогона уже не в очереди
+        stmt = stmt.where(or_(
+            checked.is_(None),
+            checked < now - func.make_interval(0, 0, 0, 0, 0, 0, max(w.min_refresh_h, 0.0) * 3600),
+        ))
+    if min_pnl is not None:
+        stmt = stmt.where(Wallet.pnl >= min_pnl)
+    if after is not None:
+        last_score, last_id = after
+        stmt = stmt.where(or_(score < last_score, and_(score == last_score, Wallet.id > last_id)))
+    stmt = stmt.order_by(score.desc(), Wallet.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+async def iter_prioritized_addresses(limit: Optional[int] = None, *, min_pnl: Optional[float] = None,
+                                     weights: Optional[PriorityWeights] = None,
+                                     page_size: int = 5000) -> AsyncIterator[str]:
+    """
+    Адреса по убыванию приоритета страницами по page_size (keyset по (score, id));
+    соединение занято только на время страницы, как в iter_wallet_addresses.
+    """
+    weights = weights or PriorityWeights()
+    async with AsyncSessionLocal() as session:
+        as_of = (await session.execute(select(func.now()))).scalar_one()
+    after: Optional[Tuple[float, int]] = None
+    left = limit
+    while left is None or left > 0:
+        n = page_size if left is None else min(page_size, left)
+        stmt = priority_query(weights, limit=n, min_pnl=min_pnl, as_of=as_of, after=after)
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(stmt)).all()
+        for address, _score, _id in rows:
+            yield address
+        if len(rows) < n:
+            return
+        after = (rows[-1][1], rows[-1][2])
+        if left is not None:
+            left -= len(rows)
+
+
+__all__: list[str] = [
+    "PriorityWeights",
+    "priority_query",
+    "iter_prioritized_addresses",
+]
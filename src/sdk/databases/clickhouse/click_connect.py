@@ -1,16 +1,61 @@
+from __future__ import annotations
+
+import math
 import os
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
 from functools import lru_cache
-from typing import Any, Iterable, List
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 from clickhouse_connect import get_client
 from dotenv import load_dotenv
 
+from src.sdk.databases.clickhouse.profiling import Profiled, tag_settings
+
+try:
+    import numpy as np
+except Exception:  # numpy не установлен → только fetchall / iterate
+    np = None
+
+try:
+    import pyarrow as pa
+except Exception:  # pyarrow не установлен → колоночный путь через fetch_np
+    pa = None
+
 load_dotenv()  # загружаем переменные из .env
 
+# lz4 / zstd / gzip / true / false; пусто — compress=None, без сжатия (как раньше)
+CLICKHOUSE_COMPRESS = os.getenv("CLICKHOUSE_COMPRESS", "")
+CLICKHOUSE_POOL_SIZE = int(os.getenv("CLICKHOUSE_POOL_SIZE", "8"))
+# через сколько секунд после timeout запроса слать KILL QUERY (сервер мог не заметить max_execution_time)
+CLICKHOUSE_KILL_GRACE_S = float(os.getenv("CLICKHOUSE_KILL_GRACE_S", "5"))
+
+
+def _compress_opt(raw: str) -> bool | str | None:
+    raw = raw.strip().lower()
+    if not raw:
+        return None
+    if raw in ("1", "true", "yes"):
+        return True
+    if raw in ("0", "false", "no"):
+        return False
+    return raw
+
+
 class ClickHouseDB:
     """
-    Обёртка над clickhouse-connect с примитивным пулом (lru_cache)
-    и удобными методами command / fetchall / iterate.
+    Обёртка над clickhouse-connect с удобными методами
+    command / fetchall / iterate / fetch_np / fetch_arrow.
+
+    Один объект — одна HTTP-сессия: запросы через него идут строго по одному.
+    Для параллельной работы — ClickHousePool. Во все методы можно передать
+    settings (max_threads, use_query_cache, …) и timeout в секундах: он
+    становится max_execution_time на сервере, а если ответа нет и через
+    CLICKHOUSE_KILL_GRACE_S — запрос снимается KILL QUERY по query_id.
+    tags (source, token, …) → query_id + log_comment и QueryProfile для
+    хуков из profiling (slow-log, агрегаты, экспорт).
     """
     def __init__(
         self,
@@ -21,7 +66,12 @@ class ClickHouseDB:
         database: str,
         secure: bool = False,
         compress: bool | str | None = None,
+        settings: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        **client_kwargs: Any,
     ):
+        self.default_settings: Dict[str, Any] = dict(settings or {})
+        self.default_timeout = timeout
         self._client = get_client(
             host=host,
             port=port,
@@ -29,22 +79,116 @@ class ClickHouseDB:
             password=password,
             database=database,
             secure=secure,      # True → https (порт обычно 8443)
-            compress=compress,  # 'gzip', 'lz4' … (опционально)
+            compress=compress,  # 'gzip', 'lz4' … (None — без сжатия; не путать с дефолтом get_client=True)
+            **client_kwargs,
         )
 
+    # ---------- settings / timeout ----------
+    def _settings(self, settings: Optional[dict], timeout: Optional[float]) -> Dict[str, Any]:
+        out = {**self.default_settings, **(settings or {})}
+        if timeout:
+            out.setdefault("max_execution_time", max(1, math.ceil(timeout)))
+        return out
+
+    @contextmanager
+    def _deadline(self, settings: Optional[dict], timeout: Optional[float],
+                  tags: Optional[dict] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Итоговые settings запроса; при timeout — query_id и таймер, который
+        снимет запрос с сервера, если он не завершился за timeout + grace.
+        """
+        timeout = timeout if timeout is not None else self.default_timeout
+        merged = self._settings(settings, timeout)
+        tag_settings(merged, tags)
+        if not timeout:
+            yield merged
+            return
+        query_id = merged.setdefault("query_id", uuid.uuid4().hex)
+        timer = threading.Timer(timeout + CLICKHOUSE_KILL_GRACE_S, kill_query, (query_id,))
+        timer.daemon = True
+        timer.start()
+        try:
+            yield merged
+        finally:
+            timer.cancel()
+
     # ---------- базовые методы ----------
-    def command(self, query: str, params: dict | None = None) -> Any:
+    def command(self, query: str, params: dict | None = None,
+                settings: dict | None = None, timeout: float | None = None,
+                tags: dict | None = None) -> Any:
         """
         Выполняет DDL или INSERT/DELETE и возвращает int | None
         (кол-во затронутых строк, если известно).
         """
-        return self._client.command(query, parameters=params or {})
+        with self._deadline(settings, timeout, tags) as st, \
+                Profiled("command", st.get("query_id"), tags):
+            return self._client.command(query, parameters=params or {}, settings=st)
 
-    def fetchall(self, query: str, params: dict | None = None) -> List[tuple]:
+    def fetchall(self, query: str, params: dict | None = None,
+                 settings: dict | None = None, timeout: float | None = None,
+                 tags: dict | None = None) -> List[tuple]:
         """
         SELECT-запрос: возвращает все строки как список кортежей.
         """
-        return self._client.query(query, parameters=params or {}).result_rows
+        with self._deadline(settings, timeout, tags) as st, \
+                Profiled("fetchall", st.get("query_id"), tags) as prof:
+            result = self._client.query(query, parameters=params or {}, settings=st)
+            rows = result.result_rows
+            prof.result_rows = len(rows)
+            prof.apply_summary(getattr(result, "summary", None))
+            return rows
+
+    # ---------- колоночные результаты ----------
+    def fetch_np(
+        self,
+        query: str,
+        params: dict | None = None,
+        settings: dict | None = None,
+        max_str_len: int | None = None,
+        timeout: float | None = None,
+        tags: dict | None = None,
+    ) -> List[np.ndarray]:
+        """
+        SELECT колонками: список np.ndarray в порядке SELECT (query_np).
+        max_str_len → строки фиксированной ширины (<U…) вместо object-массивов.
+        """
+        with self._deadline(settings, timeout, tags) as st, \
+                Profiled("fetch_np", st.get("query_id"), tags) as prof:
+            arr = self._client.query_np(
+                query,
+                parameters=params or {},
+                settings=st,
+                max_str_len=max_str_len,
+            )
+            prof.result_rows = len(arr)
+        # разнотипные колонки приходят structured-массивом, однотипные — 2D
+        if arr.dtype.names:
+            return [arr[name] for name in arr.dtype.names]
+        if arr.ndim == 1:
+            return [arr]
+        return [arr[:, i] for i in range(arr.shape[1])]
+
+    def fetch_arrow(
+        self,
+        query: str,
+        params: dict | None = None,
+        settings: dict | None = None,
+        timeout: float | None = None,
+        tags: dict | None = None,
+    ) -> pa.Table:
+        """SELECT в pyarrow.Table (формат Arrow на стороне сервера). Нужен pyarrow."""
+        if pa is None:
+            raise RuntimeError("pyarrow не установлен — используйте fetch_np")
+        with self._deadline(settings, timeout, tags) as st, \
+                Profiled("fetch_arrow", st.get("query_id"), tags) as prof:
+            table = self._client.query_arrow(
+                query,
+                parameters=params or {},
+                settings=st,
+                use_strings=True,
+            )
+            prof.result_rows = table.num_rows
+            return table
 
     def iterate(
         self,
@@ -52,20 +196,107 @@ class ClickHouseDB:
         params: dict | None = None,
         settings: dict | None = None,
         chunk_size: int | None = None,
-    ) -> Iterable[List[tuple]]:
+        timeout: float | None = None,
+        tags: dict | None = None,
+    ) -> Iterator[List[tuple]]:
         """
-        Ленивая итерация крупного SELECT-а блоками строк.
+        Ленивая итерация крупного SELECT-а блоками строк (query_row_block_stream).
+        chunk_size → max_block_size; HTTP-ответ закрывается, когда генератор
+        дочитан или брошен. timeout считается на всю итерацию.
         """
-        return self._client.query_iter(
-            query,
-            parameters=params or {},
-            settings=settings or {},
-            chunk_size=chunk_size,
-        )
+        settings = dict(settings or {})
+        if chunk_size:
+            settings.setdefault("max_block_size", chunk_size)
+        with self._deadline(settings, timeout, tags) as st, \
+                Profiled("iterate", st.get("query_id"), tags) as prof, \
+                self._client.query_row_block_stream(query, parameters=params or {}, settings=st) as stream:
+            prof.result_rows = 0
+            for block in stream:
+                prof.result_rows += len(block)
+                yield block
 
+    def close(self) -> None:
+        self._client.close()
 
-@lru_cache(maxsize=1)
-def get_db() -> ClickHouseDB:
+
+class ClickHousePool:
+    """
+    Пул клиентов ClickHouseDB с checkout / checkin: у каждого клиента своя
+    сессия, поэтому потоки не делят соединение. Клиенты создаются лениво,
+    не больше size; при исчерпании checkout ждёт свободный до timeout.
+
+        with pool.connection() as db:
+            db.fetchall(...)
+    """
+
+    def __init__(self, size: int = CLICKHOUSE_POOL_SIZE,
+                 factory: Optional[Callable[[], ClickHouseDB]] = None, **db_kwargs: Any):
+        self.size = max(1, size)
+        self._factory = factory or (lambda: new_db(**db_kwargs))
+        self._idle: "queue.LifoQueue[ClickHouseDB]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def checkout(self, timeout: Optional[float] = None) -> ClickHouseDB:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"ClickHousePool: нет свободного клиента за {timeout}s (size={self.size})")
+
+    def checkin(self, db: ClickHouseDB) -> None:
+        self._idle.put(db)
+
+    def discard(self, db: ClickHouseDB) -> None:
+        """Клиент в неизвестном состоянии (оборванный стрим и т.п.) — закрыть и освободить слот."""
+        try:
+            db.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[ClickHouseDB]:
+        db = self.checkout(timeout)
+        try:
+            yield db
+        except BaseException:
+            self.discard(db)
+            raise
+        else:
+            self.checkin(db)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def new_db(**kwargs: Any) -> ClickHouseDB:
+    """
+    Отдельный клиент (своя HTTP-сессия). clickhouse-connect не разрешает
+    параллельные запросы в одной сессии — каждому потоку нужен свой.
+    kwargs (settings, timeout, …) уходят в ClickHouseDB.
+    """
+    kwargs.setdefault("compress", _compress_opt(CLICKHOUSE_COMPRESS))
     return ClickHouseDB(
         host=os.getenv("CLICKHOUSE_HOST", "localhost"),
         port=int(os.getenv("CLICKHOUSE_PORT", 8123)),   # HTTP/HTTPS
@@ -73,4 +304,34 @@ def get_db() -> ClickHouseDB:
         password=os.getenv("CLICKHOUSE_PASSWORD", ""),
         database=os.getenv("CLICKHOUSE_DB", "default"),
         secure=os.getenv("CLICKHOUSE_SECURE", "false").lower() == "true",
+        **kwargs,
     )
+
+
+@lru_cache(maxsize=1)
+def get_db() -> ClickHouseDB:
+    return new_db()
+
+
+@lru_cache(maxsize=1)
+def get_pool() -> ClickHousePool:
+    return ClickHousePool(CLICKHOUSE_POOL_SIZE)
+
+
+@lru_cache(maxsize=1)
+def _control_db() -> ClickHouseDB:
+    # без сессии: KILL может прийти из любого потока одновременно с другими
+    return new_db(autogenerate_session_id=False)
+
+
+def kill_query(query_id: str) -> None:
+    """KILL QUERY по query_id (ASYNC — не ждём, пока сервер реально остановит запрос)."""
+    try:
+        _control_db().command(
+            "KILL QUERY WHERE query_id = {qid:String} ASYNC", params={"qid": query_id},
+        )
+    except Exception:
+        pass  # запрос уже завершился / нет прав — таймер лишь страховка
+
+
+ARROW_AVAILABLE = pa is not None
@@ -0,0 +1,192 @@
+# src/sdk/databases/clickhouse/profiling.py
+"""
+Профилирование запросов ClickHouseDB.
+
+Запрос, вызванный с tags={...}, получает query_id и log_comment (JSON тегов),
+поэтому его легко найти в system.query_log. После выполнения каждый запрос
+превращается в QueryProfile и уходит во все зарегистрированные хуки:
+
+ * slow_log_hook           — лог запросов дольше CLICKHOUSE_SLOW_QUERY_S (включён по умолчанию);
+ * ProfileAggregator       — суммы по источнику (tags["source"]) для итоговых логов;
+ * redis_stream_exporter() — XADD в Redis stream для внешних дашбордов.
+
+read_rows / read_bytes берутся из X-ClickHouse-Summary, который
+clickhouse-connect отдаёт только для обычного query (fetchall). Для
+np / arrow / stream там None — точные цифры есть в system.query_log по query_id.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+CLICKHOUSE_SLOW_QUERY_S = float(os.getenv("CLICKHOUSE_SLOW_QUERY_S", "5"))  # 0 — не логировать
+CLICKHOUSE_PROFILE_STREAM = os.getenv("CLICKHOUSE_PROFILE_STREAM", "clickhouse:query_profile")
+CLICKHOUSE_PROFILE_STREAM_MAXLEN = int(os.getenv("CLICKHOUSE_PROFILE_STREAM_MAXLEN", "100000"))
+
+
+@dataclass
+class QueryProfile:
+    kind: str                       # fetchall / fetch_np / fetch_arrow / iterate / command
+    query_id: Optional[str]
+    tags: Dict[str, Any] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+    result_rows: Optional[int] = None
+    read_rows: Optional[int] = None
+    read_bytes: Optional[int] = None
+    server_elapsed_s: Optional[float] = None
+    error: Optional[str] = None
+
+    def apply_summary(self, summary: Optional[Dict[str, Any]]) -> None:
+        """Поля из X-ClickHouse-Summary (значения приходят строками)."""
+        if not summary:
+            return
+        self.read_rows = _int(summary.get("read_rows"))
+        self.read_bytes = _int(summary.get("read_bytes"))
+        if self.result_rows is None:
+            self.result_rows = _int(summary.get("result_rows"))
+        elapsed_ns = _int(summary.get("elapsed_ns"))
+        if elapsed_ns is not None:
+            self.server_elapsed_s = elapsed_ns / 1e9
+
+
+def _int(v: Any) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+Hook = Callable[[QueryProfile], None]
+_hooks: List[Hook] = []
+
+
+def add_hook(hook: Hook) -> Hook:
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: Hook) -> None:
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def tag_settings(settings: Dict[str, Any], tags: Optional[Dict[str, Any]]) -> Optional[str]:
+    """query_id + log_comment для запроса с тегами. Возвращает query_id (или None без тегов)."""
+    if not tags:
+        return settings.get("query_id")
+    settings.setdefault("log_comment", json.dumps(tags, ensure_ascii=False, separators=(",", ":"), default=str))
+    return settings.setdefault("query_id", uuid.uuid4().hex)
+
+
+class Profiled:
+    """
+    Контекст вокруг одного запроса: меряет время, ловит ошибку, отдаёт
+    QueryProfile хукам. Внутри метод заполняет prof.result_rows / apply_summary.
+    """
+
+    def __init__(self, kind: str, query_id: Optional[str], tags: Optional[Dict[str, Any]]):
+        self.prof = QueryProfile(kind=kind, query_id=query_id, tags=dict(tags or {}))
+        self._t0 = 0.0
+
+    def __enter__(self) -> QueryProfile:
+        self._t0 = time.perf_counter()
+        return self.prof
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.prof.elapsed_s = time.perf_counter() - self._t0
+        if exc is not None:
+            self.prof.error = f"{exc_type.__name__}: {exc}"
+        for hook in list(_hooks):
+            try:
+                hook(self.prof)
+            except Exception as e:
+                logger.debug(f"clickhouse profile hook failed: {e!r}")
+        return False
+
+# ───────────────────────── hooks ────────────────────────────────────
+
+def slow_log_hook(prof: QueryProfile) -> None:
+    if CLICKHOUSE_SLOW_QUERY_S <= 0 or prof.elapsed_s < CLICKHOUSE_SLOW_QUERY_S:
+        return
+    logger.warning(
+        f"slow clickhouse {prof.kind} {prof.elapsed_s:.2f}s tags={prof.tags} "
+        f"rows={prof.result_rows} read_rows={prof.read_rows} read_bytes={prof.read_bytes} "
+        f"query_id={prof.query_id}" + (f" error={prof.error}" if prof.error else "")
+    )
+
+
+@dataclass
+class SourceTotals:
+    queries: int = 0
+    errors: int = 0
+    slow: int = 0
+    elapsed_s: float = 0.0
+    max_elapsed_s: float = 0.0
+    result_rows: int = 0
+    read_rows: int = 0
+    read_bytes: int = 0
+
+
+class ProfileAggregator:
+    """Хук-счётчик: totals по tags["source"] (потокобезопасно)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.totals: Dict[str, SourceTotals] = defaultdict(SourceTotals)
+
+    def __call__(self, prof: QueryProfile) -> None:
+        src = str(prof.tags.get("source", "-"))
+        with self._lock:
+            t = self.totals[src]
+            t.queries += 1
+            t.errors += prof.error is not None
+            t.slow += 0 < CLICKHOUSE_SLOW_QUERY_S <= prof.elapsed_s
+            t.elapsed_s += prof.elapsed_s
+            t.max_elapsed_s = max(t.max_elapsed_s, prof.elapsed_s)
+            t.result_rows += prof.result_rows or 0
+            t.read_rows += prof.read_rows or 0
+            t.read_bytes += prof.read_bytes or 0
+
+    def summary(self) -> str:
+        with self._lock:
+            return " | ".join(
+                f"{src}: q={t.queries} err={t.errors} slow={t.slow} "
+                f"t={t.elapsed_s:.1f}s max={t.max_elapsed_s:.2f}s rows={t.result_rows} "
+                f"read={t.read_rows}r/{t.read_bytes / 1e6:.1f}MB"
+                for src, t in sorted(self.totals.items())
+            )
+
+
+def redis_stream_exporter(rds, stream: str = CLICKHOUSE_PROFILE_STREAM,
+                          maxlen: int = CLICKHOUSE_PROFILE_STREAM_MAXLEN) -> Hook:
+    """Хук: каждый профиль с тегами → XADD stream (MAXLEN ~ maxlen). rds — sync redis-py."""
+
+    def hook(prof: QueryProfile) -> None:
+        if not prof.tags:
+            return
+        fields = {k: v for k, v in asdict(prof).items() if v is not None and k != "tags"}
+        fields.update({f"tag_{k}": v for k, v in prof.tags.items()})
+        rds.xadd(stream, {k: str(v) for k, v in fields.items()}, maxlen=maxlen, approximate=True)
+
+    return hook
+
+
+add_hook(slow_log_hook)
+
+
+__all__: list[str] = [
+    "QueryProfile",
+    "ProfileAggregator",
+    "add_hook",
+    "remove_hook",
+    "slow_log_hook",
+    "redis_stream_exporter",
+]
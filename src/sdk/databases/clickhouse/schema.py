@@ -0,0 +1,155 @@
+# src/sdk/databases/clickhouse/schema.py
+"""
+Схема ClickHouse для pnl-пайплайна + простой раннер миграций.
+
+Миграции — упорядоченный список MIGRATIONS; применённые версии пишутся в
+таблицу schema_migrations. DDL идемпотентны (IF NOT EXISTS); backfill-INSERT —
+нет: если миграция упала после него, перед повтором сделайте TRUNCATE
+агрегатной таблицы.
+
+Предагрегация (version 001/002): AggregatingMergeTree, ключ (token, wallet),
+заполняется materialized view на INSERT в сырые таблицы свопов. Типы
+агрегатных состояний берутся из исходных колонок (CREATE TABLE ... AS SELECT
+... WHERE 0), поэтому итоговые суммы совпадают с запросом по сырым данным
+бит в бит. Историю переносит backfill-INSERT сразу после создания MV —
+на это время запись в сырые таблицы лучше остановить, иначе строки,
+вставленные в окне между CREATE MV и backfill, учтутся дважды.
+
+    python -m src.sdk.databases.clickhouse.schema --status
+    python -m src.sdk.databases.clickhouse.schema            # применить
+    python -m src.sdk.databases.clickhouse.schema --dry-run  # показать SQL
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from src.sdk.databases.clickhouse.click_connect import ClickHouseDB, get_db
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+PUMPSWAP_AGG = "pumpswap_wallet_pnl_agg"
+PUMPSWAP_AGG_MV = "pumpswap_wallet_pnl_mv"
+RAYDIUM_AGG = "raydium_wallet_pnl_agg"
+RAYDIUM_AGG_MV = "raydium_wallet_pnl_mv"
+
+# SELECT, который превращает сырые свопы в агрегатные состояния (одинаков для DDL, MV и backfill)
+PUMPSWAP_STATES = """
+    SELECT
+        base_token,
+        signing_wallet,
+        sumIfState(quote_token_amount, direction = 'S')   AS sell_quote_state,
+        sumIfState(quote_token_amount, direction = 'B')   AS buy_quote_state,
+        sumState(lp_fee + protocol_fee + fee)             AS fees_state,
+        countIfState(direction = 'B')                     AS buys_state
+    FROM pumpswap_all_swaps
+"""
+
+RAYDIUM_STATES = """
+    SELECT
+        base_coin,
+        fee_payer,
+        sumState(
+            if(direction = 'S', toInt128(quote_coin_amount), -toInt128(quote_coin_amount))
+        )                                                 AS pnl_state,
+        countState()                                      AS trades_state
+    FROM raydium_cpmm_swaps
+"""
+
+
+@dataclass
+class Migration:
+    version: str
+    description: str
+    statements: List[str] = field(default_factory=list)
+
+
+def _agg_migration(version: str, description: str, table: str, mv: str,
+                   states: str, key: str) -> Migration:
+    return Migration(version, description, [
+        f"CREATE TABLE IF NOT EXISTS {table} ENGINE = AggregatingMergeTree ORDER BY ({key}) "
+        f"AS {states} WHERE 0 GROUP BY {key}",
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {mv} TO {table} AS {states} GROUP BY {key}",
+        f"INSERT INTO {table} {states} GROUP BY {key}",
+    ])
+
+
+MIGRATIONS: List[Migration] = [
+    _agg_migration("001", "pumpswap: (base_token, signing_wallet) → sell/buy quote, fees, buys",
+                   PUMPSWAP_AGG, PUMPSWAP_AGG_MV, PUMPSWAP_STATES, "base_token, signing_wallet"),
+    _agg_migration("002", "raydium cpmm: (base_coin, fee_payer) → signed quote delta, trades",
+                   RAYDIUM_AGG, RAYDIUM_AGG_MV, RAYDIUM_STATES, "base_coin, fee_payer"),
+]
+
+# ───────────────────────── runner ───────────────────────────────────
+
+def ensure_migrations_table(db: ClickHouseDB) -> None:
+    db.command(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        " version String, description String, applied_at DateTime DEFAULT now()"
+        ") ENGINE = ReplacingMergeTree ORDER BY version"
+    )
+
+
+def applied_versions(db: ClickHouseDB) -> Set[str]:
+    ensure_migrations_table(db)
+    return {r[0] for r in db.fetchall(f"SELECT version FROM {MIGRATIONS_TABLE} FINAL")}
+
+
+def migrate(db: Optional[ClickHouseDB] = None, *, dry_run: bool = False,
+            target: Optional[str] = None) -> List[str]:
+    """Применяет неприменённые миграции по порядку (до target включительно). Возвращает версии."""
+    db = db or get_db()
+    done = applied_versions(db)
+    applied = []
+    for m in MIGRATIONS:
+        if target is not None and m.version > target:
+            break
+        if m.version in done:
+            continue
+        print(f"-- {m.version}: {m.description}", file=sys.stderr)
+        for stmt in m.statements:
+            if dry_run:
+                print(stmt.strip() + ";\n")
+            else:
+                db.command(stmt)
+        if not dry_run:
+            db.command(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, description) VALUES ({{v:String}}, {{d:String}})",
+                params={"v": m.version, "d": m.description},
+            )
+        applied.append(m.version)
+    return applied
+
+
+def main() -> None:
+    prs = argparse.ArgumentParser("ClickHouse schema migrations")
+    prs.add_argument("--status", action="store_true", help="Показать применённые / ожидающие миграции")
+    prs.add_argument("--dry-run", action="store_true", help="Напечатать SQL, ничего не выполняя")
+    prs.add_argument("--target", help="Применить миграции до этой версии включительно")
+    args = prs.parse_args()
+
+    db = get_db()
+    if args.status:
+        done = applied_versions(db)
+        for m in MIGRATIONS:
+            print(f"{'applied' if m.version in done else 'pending':8} {m.version}  {m.description}")
+        return
+    applied = migrate(db, dry_run=args.dry_run, target=args.target)
+    print(f"{'would apply' if args.dry_run else 'applied'}: {applied or 'nothing'}", file=sys.stderr)
+
+
+__all__: list[str] = [
+    "MIGRATIONS",
+    "Migration",
+    "migrate",
+    "applied_versions",
+    "PUMPSWAP_AGG",
+    "RAYDIUM_AGG",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime
 from sqlalchemy import (
-    Column, DateTime, Integer, String, Numeric,
-    UniqueConstraint, create_engine, TIMESTAMP
+    Column, DateTime, Index, Integer, String, Numeric,
+    UniqueConstraint, create_engine, text, TIMESTAMP
 )
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import NUMERIC
@@ -12,22 +12,33 @@ from src.sdk.databases.postgres.base import Base
 class WalletSnapshot(Base):
     """
     Дневной снимок метрик Solana-кошелька.
-    PK: (address, ts_utc) — позволяет хранить историю.
+    Уникальность: (address, ts_utc) — позволяет хранить историю.
+    Таблица партиционирована по месяцам ts_utc (миграция 5d2c8e7f1a34,
+    обслуживание — src.sdk.databases.postgres.partitions).
     """
     __tablename__ = "wallet_snapshot"
     __table_args__ = (
         UniqueConstraint("address", "ts_utc", name="uix_address_day"),
+        # история кошелька по убыванию времени; индекс создан миграцией 3c9e5a1b7d42
+        Index(
+            "ix_wallet_snapshot_address_ts_desc",
+            "address", text("ts_utc DESC NULLS LAST"),
+            postgresql_include=["days_idle", "winrate_pct"],
+        ),
+        Index("ix_wallet_snapshot_ts_brin", "ts_utc", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (ts_utc)"},
     )
 
-    # surrogate id (удобно для FK на другие таблицы, если понадобятся)
+    # surrogate id; в PK входит ts_utc — ключ партиционирования
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     # ключи
-    address: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    address: Mapped[str] = mapped_column(String(64), nullable=False)
     ts_utc:  Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
+        primary_key=True,
         default=datetime.utcnow,
-        nullable=True
+        nullable=False
     )
 
     profit_factor:        Mapped[float] = mapped_column(NUMERIC(18, 8))
@@ -55,6 +66,50 @@ class WalletSnapshot(Base):
         )
 
 
+# метрики рейтингов wallet_latest (по каждой — покрывающий индекс)
+RANKING_COLUMNS = ("profit_factor", "winrate_pct", "pnl", "net_pnl_30d_usd")
+
+
+class WalletLatest(Base):
+    """
+    Последний снимок по каждому кошельку (копия строки wallet_snapshot с
+    максимальным ts_utc). Поддерживается SnapshotSink тем же upsert'ом, что
+    пишет историю; рейтинги читаются отсюда по покрывающим индексам.
+    """
+    __tablename__ = "wallet_latest"
+    __table_args__ = tuple(
+        # ORDER BY <метрика> DESC LIMIT n → index-only scan
+        Index(
+            f"ix_wallet_latest_{col}",
+            text(f"{col} DESC"),
+            postgresql_include=["address", "ts_utc"] + [c for c in RANKING_COLUMNS if c != col],
+        )
+        for col in RANKING_COLUMNS
+    )
+
+    address: Mapped[str] = mapped_column(String(64), primary_key=True)
+    ts_utc:  Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    profit_factor:        Mapped[float] = mapped_column(NUMERIC(18, 8))
+    expectancy:           Mapped[float] = mapped_column(NUMERIC(18, 8))
+    risk_reward:          Mapped[float] = mapped_column(NUMERIC(18, 8))
+    winrate_pct:          Mapped[float] = mapped_column(NUMERIC(6, 2))
+    net_pnl_30d_usd:      Mapped[float] = mapped_column(NUMERIC(18, 2))
+    median_liquidity_usd: Mapped[float] = mapped_column(NUMERIC(18, 2))
+    hhi:                  Mapped[float] = mapped_column(NUMERIC(10, 6))
+    honeypot_share_pct:   Mapped[float] = mapped_column(NUMERIC(6, 2))
+    days_idle:            Mapped[float] = mapped_column(NUMERIC(8, 2))
+    total_trades:         Mapped[int]   = mapped_column(Integer)
+    avg_hold_human:       Mapped[str]   = mapped_column(String(32))
+    avg_interval_human:   Mapped[str]   = mapped_column(String(32))
+    turnover_usd:         Mapped[float] = mapped_column(NUMERIC(18, 2))
+    pnl_per_turnover:     Mapped[float] = mapped_column(NUMERIC(12, 6))
+    pnl:                  Mapped[float] = mapped_column(NUMERIC(18, 2))
+
+    def __repr__(self) -> str:
+        return f"<Latest {self.address} {self.ts_utc:%Y-%m-%d} PF={self.profit_factor} PnL={self.pnl}>"
+
+
 class Wallet(Base):
     """
     Справочник Solana-кошельков.
@@ -69,7 +124,7 @@ class Wallet(Base):
     address: Mapped[str] = mapped_column(String(64), nullable=False, index=True, unique=True)
 
     # последняя зафиксированная метрика PnL (или NULL, если ещё не считали)
-    pnl: Mapped[float | None] = mapped_column(NUMERIC(18, 2))
+    pnl: Mapped[float | None] = mapped_column(NUMERIC(18, 2), index=True)
 
     # когда адрес проверяли в последний раз
     last_check: Mapped[datetime | None] = mapped_column(
@@ -78,5 +133,11 @@ class Wallet(Base):
         nullable=True,
     )
 
+    # holdings-метрики пересчитаны и не изменились с последнего снимка (SNAPSHOT_DEDUP=touch)
+    holdings_checked_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=True,
+    )
+
     def __repr__(self) -> str:
         return f"<Wallet {self.address} pnl={self.pnl} at {self.last_check}>"
\ No newline at end of file
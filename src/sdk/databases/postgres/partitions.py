@@ -0,0 +1,170 @@
+# src/sdk/databases/postgres/partitions.py
+"""
+Помесячные партиции wallet_snapshot (PARTITION BY RANGE (ts_utc)).
+
+ * partition_name(month)    → wallet_snapshot_pYYYYMM
+ * create_partition_sql()   → CREATE TABLE IF NOT EXISTS ... PARTITION OF ... FOR VALUES FROM .. TO ..
+ * ensure_partitions()      → партиции на текущий и `ahead` следующих месяцев
+ * detach_old()             → отцепляет (и по желанию удаляет) партиции старше `keep_months`
+
+SQL-билдеры синхронные (миграция 5d2c8e7f1a34 держит их замороженную копию);
+обслуживание запускается по cron:
+    python -m src.sdk.databases.postgres.partitions --ahead 3 --keep-months 12
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from loguru import logger
+from sqlalchemy import text
+
+TABLE = "wallet_snapshot"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITIONS_AHEAD = int(os.getenv("SNAPSHOT_PARTITIONS_AHEAD", "3"))
+PARTITIONS_KEEP_MONTHS = int(os.getenv("SNAPSHOT_PARTITIONS_KEEP_MONTHS", "0"))  # 0 — не трогать старые
+
+_PART_RE = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(d: date | datetime) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def create_partition_sql(month: date) -> str:
+    month = month_start(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def create_default_partition_sql() -> str:
+    return f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"
+
+
+def months_between(first: date, last: date) -> List[date]:
+    out, m = [], month_start(first)
+    while m <= month_start(last):
+        out.append(m)
+        m = add_months(m, 1)
+    return out
+
+# ───────────────────────── maintenance ──────────────────────────────
+
+async def list_partitions(conn) -> List[str]:
+    rows = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table ORDER BY c.relname"
+    ), {"table": TABLE})
+    return [r[0] for r in rows]
+
+
+async def ensure_partitions(conn, ahead: int = PARTITIONS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """Создаёт недостающие партиции [текущий месяц; +ahead]. Возвращает созданные."""
+    today = today or datetime.now(timezone.utc).date()
+    existing = set(await list_partitions(conn))
+    created = []
+    for month in months_between(today, add_months(month_start(today), ahead)):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        if DEFAULT_PARTITION in existing and await _default_has_rows(conn, month):
+            await _split_from_default(conn, month)
+        else:
+            await conn.execute(text(create_partition_sql(month)))
+        created.append(name)
+    return created
+
+
+def _range_sql(month: date) -> str:
+    return (f"ts_utc >= '{month.isoformat()} 00:00:00+00' "
+            f"AND ts_utc < '{add_months(month, 1).isoformat()} 00:00:00+00'")
+
+
+async def _default_has_rows(conn, month: date) -> bool:
+    row = await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {_range_sql(month)})"))
+    return bool(row.scalar())
+
+
+async def _split_from_default(conn, month: date) -> None:
+    """
+    Строки месяца уже попали в DEFAULT → CREATE PARTITION упадёт на проверке.
+    Отцепляем DEFAULT, создаём партицию, переносим строки, цепляем DEFAULT обратно.
+    """
+    cond = _range_sql(month)
+    await conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await conn.execute(text(create_partition_sql(month)))
+    await conn.execute(text(f"INSERT INTO {TABLE} SELECT * FROM {DEFAULT_PARTITION} WHERE {cond}"))
+    await conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {cond}"))
+    await conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+
+async def detach_old(conn, keep_months: int, *, drop: bool = False,
+                     today: Optional[date] = None) -> List[str]:
+    """Отцепляет партиции, целиком лежащие раньше (текущий месяц − keep_months)."""
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = add_months(month_start(today), -keep_months)
+    detached = []
+    for name in await list_partitions(conn):
+        m = _PART_RE.match(name)
+        if not m or date(int(m.group(1)), int(m.group(2)), 1) >= cutoff:
+            continue
+        await conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        if drop:
+            await conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
+
+
+async def maintain(ahead: int = PARTITIONS_AHEAD, keep_months: int = PARTITIONS_KEEP_MONTHS,
+                   drop: bool = False) -> None:
+    from src.sdk.databases.postgres.dependency import engine
+
+    try:
+        async with engine.begin() as conn:
+            created = await ensure_partitions(conn, ahead)
+            detached = await detach_old(conn, keep_months, drop=drop) if keep_months > 0 else []
+        logger.info(f"wallet_snapshot partitions: created={created} detached={detached} drop={drop}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    prs = argparse.ArgumentParser("wallet_snapshot partition maintenance")
+    prs.add_argument("--ahead", type=int, default=PARTITIONS_AHEAD, help="Сколько будущих месяцев держать готовыми")
+    prs.add_argument("--keep-months", type=int, default=PARTITIONS_KEEP_MONTHS,
+                     help="Отцепить партиции старше N месяцев (0 — не трогать)")
+    prs.add_argument("--drop", action="store_true", help="Удалять отцепленные партиции")
+    args = prs.parse_args()
+    asyncio.run(maintain(args.ahead, args.keep_months, args.drop))
+
+
+__all__: list[str] = [
+    "partition_name",
+    "create_partition_sql",
+    "create_default_partition_sql",
+    "months_between",
+    "ensure_partitions",
+    "detach_old",
+    "maintain",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# src/sdk/databases/postgres/snapshot_sink.py
+"""
+Пакетная запись WalletSnapshot.
+
+Строки копятся в памяти и сбрасываются одной транзакцией:
+    COPY (asyncpg copy_records_to_table) → TEMP-таблица (ON COMMIT DROP)
+    → INSERT ... SELECT ... ON CONFLICT (address, ts_utc) DO UPDATE
+
+    → INSERT INTO wallet_latest ... ON CONFLICT (address) DO UPDATE (если ts_utc новее)
+
+Так на пачку уходит 4 round trip'а вместо add + commit на каждый кошелёк.
+TEMP-таблица живёт только внутри транзакции, поэтому схема работает и
+через pgbouncer/Neon pooler в transaction-режиме.
+
+Если пачка не записалась из-за данных (переполнение NUMERIC(18,8) и т.п.),
+она делится пополам и пишется по частям — теряются только «битые» строки.
+
+Режим "executemany" — тот же upsert через SQLAlchemy Core без COPY
+(на случай, если COPY недоступен); нужен и для бенчмарка src.bench.snapshot_sink.
+
+Дедупликация (SNAPSHOT_DEDUP): по каждому адресу хранится отпечаток
+последних записанных метрик (память + Redis-хэш SNAPSHOT_FP_KEY). Если
+метрики не изменились, строка не пишется:
+    skip  — просто пропускается;
+    touch — вместо неё wallets.holdings_checked_at = ts_utc ("актуально на"),
+            а в wallet_latest сдвигаются ts_utc и days_idle;
+    off   — пишется всегда, как раньше.
+В отпечаток не входят ts_utc и days_idle — они меняются сами по себе.
+Рядом с отпечатком хранится день последней записи ("<fp>:<день>"): если он
+старше SNAPSHOT_FP_MAX_AGE_D, строка пишется, даже когда метрики те же —
+история не остаётся без точек неделями, а устаревшие отпечатки обновляются.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg.exceptions as asyncpg_exc
+from loguru import logger
+from sqlalchemy import Numeric, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, TEXT, TIMESTAMP
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.sdk.databases.postgres.dependency import engine as default_engine
+from src.sdk.databases.postgres.models import WalletLatest, WalletSnapshot
+
+SNAPSHOT_BATCH = max(1, int(os.getenv("SNAPSHOT_BATCH", "500")))
+SNAPSHOT_FLUSH_S = float(os.getenv("SNAPSHOT_FLUSH_S", "30"))
+SNAPSHOT_SINK_MODE = os.getenv("SNAPSHOT_SINK_MODE", "copy")   # copy | executemany
+SNAPSHOT_DEDUP = os.getenv("SNAPSHOT_DEDUP", "touch")           # skip | touch | off
+SNAPSHOT_FP_KEY = os.getenv("SNAPSHOT_FP_KEY", "snapshot_fp")    # Redis HASH address → отпечаток
+SNAPSHOT_FP_CACHE = int(os.getenv("SNAPSHOT_FP_CACHE", "500000")) # адресов в памяти (LRU)
+SNAPSHOT_FP_MAX_AGE_D = int(os.getenv("SNAPSHOT_FP_MAX_AGE_D", "7"))  # не реже раза в N дней строка пишется заново
+
+TABLE = WalletSnapshot.__tablename__
+CONFLICT_COLS: Tuple[str, ...] = ("address", "ts_utc")
+# все колонки, кроме суррогатного id (его выдаёт sequence)
+SNAPSHOT_COLUMNS: Tuple[str, ...] = tuple(
+    c.name for c in WalletSnapshot.__table__.columns if c.name != "id"
+)
+_NUMERIC_COLS = frozenset(c.name for c in WalletSnapshot.__table__.columns if isinstance(c.type, Numeric))
+FINGERPRINT_COLS: Tuple[str, ...] = tuple(
+    c for c in SNAPSHOT_COLUMNS if c not in ("address", "ts_utc", "days_idle")
+)
+
+
+def _to_db(col: str, v: Any) -> Any:
+    # asyncpg кодирует NUMERIC из Decimal; repr(float) — кратчайшее точное представление
+    if v is not None and col in _NUMERIC_COLS and not isinstance(v, Decimal):
+        return Decimal(repr(float(v)))
+    return v
+
+
+def _copy_sql() -> Tuple[str, str, str]:
+    cols = ", ".join(SNAPSHOT_COLUMNS)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in SNAPSHOT_COLUMNS if c not in CONFLICT_COLS)
+    latest_updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in SNAPSHOT_COLUMNS if c != "address")
+    stage = f"CREATE TEMP TABLE _snapshot_stage ON COMMIT DROP AS SELECT {cols} FROM {TABLE} WITH NO DATA"
+    merge = (
+        f"INSERT INTO {TABLE} ({cols}) SELECT {cols} FROM _snapshot_stage "
+        f"ON CONFLICT ({', '.join(CONFLICT_COLS)}) DO UPDATE SET {updates}"
+    )
+    # в пачке бывает несколько ts на адрес → берём самый новый; старые снимки latest не затирают
+    latest = (
+        f"INSERT INTO {LATEST_TABLE} ({cols}) "
+        f"SELECT DISTINCT ON (address) {cols} FROM _snapshot_stage ORDER BY address, ts_utc DESC "
+        f"ON CONFLICT (address) DO UPDATE SET {latest_updates} "
+        f"WHERE {LATEST_TABLE}.ts_utc <= EXCLUDED.ts_utc"
+    )
+    return stage, merge, latest
+
+
+LATEST_TABLE = WalletLatest.__tablename__
+STAGE_SQL, MERGE_SQL, LATEST_SQL = _copy_sql()
+
+
+def _latest_rows(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    best: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        cur = best.get(r["address"])
+        if cur is None or r["ts_utc"] >= cur["ts_utc"]:
+            best[r["address"]] = r
+    return list(best.values())
+
+
+async def write_copy(eng: AsyncEngine, rows: Sequence[Dict[str, Any]]) -> int:
+    """COPY в staging + merge. rows — словари по SNAPSHOT_COLUMNS."""
+    records = [tuple(_to_db(c, r.get(c)) for c in SNAPSHOT_COLUMNS) for r in rows]
+    async with eng.connect() as conn:
+        raw = await conn.get_raw_connection()
+        apg = raw.driver_connection          # asyncpg.Connection
+        async with apg.transaction():
+            await apg.execute(STAGE_SQL)
+            await apg.copy_records_to_table("_snapshot_stage", records=records, columns=SNAPSHOT_COLUMNS)
+            await apg.execute(MERGE_SQL)
+            await apg.execute(LATEST_SQL)
+    return len(records)
+
+
+async def write_executemany(eng: AsyncEngine, rows: Sequence[Dict[str, Any]]) -> int:
+    """Тот же upsert (история + wallet_latest) через Core executemany."""
+    stmt = pg_insert(WalletSnapshot.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(CONFLICT_COLS),
+        set_={c: stmt.excluded[c] for c in SNAPSHOT_COLUMNS if c not in CONFLICT_COLS},
+    )
+    params = [{c: r.get(c) for c in SNAPSHOT_COLUMNS} for r in rows]
+
+    latest_tbl = WalletLatest.__table__
+    latest = pg_insert(latest_tbl)
+    latest = latest.on_conflict_do_update(
+        index_elements=["address"],
+        set_={c: latest.excluded[c] for c in SNAPSHOT_COLUMNS if c != "address"},
+        where=latest_tbl.c.ts_utc <= latest.excluded.ts_utc,
+    )
+    latest_params = [{c: r.get(c) for c in SNAPSHOT_COLUMNS} for r in _latest_rows(rows)]
+    async with eng.begin() as conn:
+        await conn.execute(stmt, params)
+        await conn.execute(latest, latest_params)
+    return len(params)
+
+
+_WRITERS = {"copy": write_copy, "executemany": write_executemany}
+_ROW_ERRORS = (
+    asyncpg_exc.DataError,
+    asyncpg_exc.IntegrityConstraintViolationError,
+    ValueError,
+    TypeError,
+    ArithmeticError,
+)
+
+
+def _is_row_error(exc: Optional[BaseException]) -> bool:
+    """Сбой из-за содержимого строк (переполнение NUMERIC, NOT NULL, кодирование) — пачку есть смысл делить."""
+    while exc is not None:
+        if isinstance(exc, _ROW_ERRORS):
+            return True
+        exc = getattr(exc, "orig", None) or exc.__cause__   # sqlalchemy DBAPIError → asyncpg
+    return False
+
+TOUCH_SQL = text(
+    "UPDATE wallets AS w SET holdings_checked_at = u.ts "
+    "FROM unnest(:addresses, :ts) AS u(address, ts) "
+    "WHERE w.address = u.address"
+).bindparams(
+    bindparam("addresses", type_=ARRAY(TEXT)),
+    bindparam("ts", type_=ARRAY(TIMESTAMP(timezone=True))),
+)
+
+
+TOUCH_LATEST_SQL = text(
+    f"UPDATE {WalletLatest.__tablename__} AS l SET ts_utc = u.ts, days_idle = u.days_idle "
+    "FROM unnest(:addresses, :ts, :days_idle) AS u(address, ts, days_idle) "
+    "WHERE l.address = u.address AND l.ts_utc < u.ts"
+).bindparams(
+    bindparam("addresses", type_=ARRAY(TEXT)),
+    bindparam("ts", type_=ARRAY(TIMESTAMP(timezone=True))),
+    bindparam("days_idle", type_=ARRAY(Numeric(8, 2))),
+)
+
+
+async def touch_checked(eng: AsyncEngine, rows: Sequence[Dict[str, Any]]) -> int:
+    """
+    Кошельки с неизменившимися метриками: wallets.holdings_checked_at = ts_utc,
+    в wallet_latest — новые ts_utc и days_idle (если снимок новее).
+    """
+    latest = _latest_rows(rows)
+    async with eng.begin() as conn:
+        await conn.execute(TOUCH_SQL, {
+            "addresses": [r["address"] for r in rows],
+            "ts": [r["ts_utc"] for r in rows],
+        })
+        await conn.execute(TOUCH_LATEST_SQL, {
+            "addresses": [r["address"] for r in latest],
+            "ts": [r["ts_utc"] for r in latest],
+            "days_idle": [_to_db("days_idle", r.get("days_idle")) for r in latest],
+        })
+    return len(rows)
+
+# ───────────────────────── fingerprints ─────────────────────────────
+
+def fingerprint(values: Dict[str, Any]) -> str:
+    """64-битный отпечаток метрик (значения нормализуются так же, как при записи)."""
+    payload = json.dumps([str(_to_db(c, values.get(c))) for c in FINGERPRINT_COLS], separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def _day(ts: datetime) -> int:
+    return int(ts.timestamp() // 86400)
+
+
+def _stamped(fp: str, ts: datetime) -> str:
+    """Значение в хранилище: отпечаток + день записи."""
+    return f"{fp}:{_day(ts)}"
+
+
+def _unstamp(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """→ (отпечаток, день записи); старые значения без дня считаются давними."""
+    if not value:
+        return None, 0
+    fp, _, day = value.partition(":")
+    return fp, int(day) if day.isdigit() else 0
+
+
+class FingerprintStore:
+    """Последний записанный отпечаток по адресу: LRU в памяти, за ним — Redis HASH (если доступен)."""
+
+    def __init__(self, rds: Any = None, key: str = SNAPSHOT_FP_KEY, capacity: int = SNAPSHOT_FP_CACHE):
+        self.rds = rds
+        self.key = key
+        self.capacity = capacity
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+
+    def _remember(self, address: str, fp: str) -> None:
+        self._mem[address] = fp
+        self._mem.move_to_end(address)
+        while len(self._mem) > self.capacity:
+            self._mem.popitem(last=False)
+
+    async def get_many(self, addresses: Sequence[str]) -> Dict[str, Optional[str]]:
+        out: Dict[str, Optional[str]] = {a: self._mem.get(a) for a in addresses}
+        missing = [a for a, fp in out.items() if fp is None]
+        if missing and self.rds is not None:
+            try:
+                for a, fp in zip(missing, await self.rds.hmget(self.key, missing)):
+                    if fp:
+                        out[a] = fp
+                        self._remember(a, fp)
+            except Exception as exc:
+                logger.warning(f"fingerprints: Redis недоступен ({exc!r}) — только память")
+        return out
+
+    async def set_many(self, items: Dict[str, str]) -> None:
+        for a, fp in items.items():
+            self._remember(a, fp)
+        if items and self.rds is not None:
+            try:
+                await self.rds.hset(self.key, mapping=items)
+            except Exception as exc:
+                logger.warning(f"fingerprints: не удалось сохранить в Redis ({exc!r})")
+
+
+def _default_fp_store() -> FingerprintStore:
+    try:
+        from src.sdk.queues.redis_connect import get_redis
+        return FingerprintStore(get_redis())
+    except Exception:  # redis не установлен / не настроен → только память
+        return FingerprintStore(None)
+
+
+class SnapshotSink:
+    """
+    Буфер снимков, общий для воркеров одного процесса.
+    Сброс — по размеру (batch_size), по времени (flush_interval, проверяется
+    при add) и в close(). Повтор (address, ts_utc) внутри пачки — побеждает
+    последняя строка (ON CONFLICT не может обновить строку дважды за запрос).
+    """
+
+    def __init__(self, *, eng: Optional[AsyncEngine] = None, batch_size: int = SNAPSHOT_BATCH,
+                 flush_interval: float = SNAPSHOT_FLUSH_S, mode: str = SNAPSHOT_SINK_MODE,
+                 dedup: str = SNAPSHOT_DEDUP, fingerprints: Optional[FingerprintStore] = None):
+        if mode not in _WRITERS:
+            raise ValueError(f"unknown snapshot sink mode: {mode!r}")
+        if dedup not in ("skip", "touch", "off"):
+            raise ValueError(f"unknown snapshot dedup mode: {dedup!r}")
+        self.eng = eng or default_engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.mode = mode
+        self.dedup = dedup
+        self.fingerprints = None if dedup == "off" else (fingerprints or _default_fp_store())
+        self._buf: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._last_flush = time.monotonic()
+        self.written = 0
+        self.failed = 0
+        self.unchanged = 0
+
+    async def add(self, values: Dict[str, Any]) -> None:
+        self._buf[(values["address"], values["ts_utc"])] = values
+        if len(self._buf) >= self.batch_size or (
+            self.flush_interval and time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buf:
+                return 0
+            rows: List[Dict[str, Any]] = list(self._buf.values())
+            self._buf.clear()
+            t0 = time.perf_counter()
+            fresh: Dict[str, str] = {}
+            if self.fingerprints is not None:
+                rows, same, fresh = await self._split_unchanged(rows)
+                if same:
+                    self.unchanged += len(same)
+                    if self.dedup == "touch":
+                        try:
+                            await touch_checked(self.eng, same)
+                        except Exception as exc:
+                            logger.warning(f"snapshot sink: touch {len(same)} строк не удался: {exc!r}")
+            if not rows:
+                return 0
+            n, bad = await self._write(rows)
+            if bad:
+                self.failed += len(bad)
+                for a in bad:
+                    fresh.pop(a, None)
+            if fresh:
+                await self.fingerprints.set_many(fresh)   # только после успешной записи
+            self.written += n
+            logger.debug(f"snapshot sink: {n} строк за {(time.perf_counter() - t0) * 1000:.0f} ms ({self.mode})")
+            return n
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> Tuple[int, List[str]]:
+        """
+        Записать пачку; при ошибке — делим пополам и пишем половины отдельно,
+        пока не останется одна строка. Так теряются только «битые» строки
+        (переполнение NUMERIC и т.п.), а не весь буфер. → (записано, адреса потерянных).
+        """
+        try:
+            return await _WRITERS[self.mode](self.eng, rows), []
+        except Exception as exc:
+            if len(rows) == 1:
+                r = rows[0]
+                logger.opt(exception=exc).error(
+                    f"snapshot sink: строка {r['address']} @ {r['ts_utc']} не записана ({self.mode}): {exc!r}"
+                )
+                return 0, [r["address"]]
+            if not _is_row_error(exc):
+                # сбой не из-за данных (соединение, таймаут) — делить пачку бессмысленно
+                logger.opt(exception=exc).error(f"snapshot sink: потеряно {len(rows)} строк ({self.mode}): {exc!r}")
+                return 0, [r["address"] for r in rows]
+            logger.warning(f"snapshot sink: пачка из {len(rows)} строк не записалась ({exc!r}) — делим пополам")
+        mid = len(rows) // 2
+        n1, bad1 = await self._write(rows[:mid])
+        n2, bad2 = await self._write(rows[mid:])
+        return n1 + n2, bad1 + bad2
+
+    async def _split_unchanged(self, rows: List[Dict[str, Any]]):
+        """→ (к записи, неизменившиеся, новые отпечатки записываемых)."""
+        known = await self.fingerprints.get_many([r["address"] for r in rows])
+        write, same, fresh = [], [], {}
+        for r in rows:
+            fp = fingerprint(r)
+            old_fp, day = _unstamp(known.get(r["address"]))
+            if old_fp == fp and _day(r["ts_utc"]) - day < SNAPSHOT_FP_MAX_AGE_D:
+                same.append(r)
+            else:
+                write.append(r)
+                fresh[r["address"]] = _stamped(fp, r["ts_utc"])
+        return write, same, fresh
+
+    async def close(self) -> None:
+        await self.flush()
+
+    async def __aenter__(self) -> "SnapshotSink":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+
+__all__: list[str] = [
+    "SnapshotSink",
+    "FingerprintStore",
+    "fingerprint",
+    "SNAPSHOT_COLUMNS",
+    "write_copy",
+    "write_executemany",
+]
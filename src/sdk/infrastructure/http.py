@@ -0,0 +1,284 @@
+# src/sdk/infrastructure/http.py
+"""
+HTTP-слой скрейперов GMGN: фабрика сессий curl_cffi + запись/воспроизведение трафика.
+
+ * new_session()      → curl_cffi Session (или обёртка записи / воспроизведения)
+ * RecordingSession   → пишет пары запрос/ответ (статус, заголовки, тело, тайминг)
+                        в сжатый архив ``*.jsonl.gz``
+ * ReplaySession      → отдаёт ответы из архива с исходным или масштабированным таймингом
+
+Режим выбирается переменными окружения (replay — ещё и через set_replay()):
+    GMGN_HTTP_RECORD=captures/holdings.jsonl.gz   # запись поверх живой сессии
+    GMGN_HTTP_REPLAY=captures/holdings.jsonl.gz   # офлайн, без сети и прокси
+    GMGN_HTTP_REPLAY_SCALE=1.0                    # 1 — как было, 0.5 — вдвое быстрее, 0 — без пауз
+"""
+from __future__ import annotations
+
+import atexit
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_RECORD: Optional[str] = os.getenv("GMGN_HTTP_RECORD") or None
+HTTP_REPLAY: Optional[str] = os.getenv("GMGN_HTTP_REPLAY") or None
+HTTP_REPLAY_SCALE = float(os.getenv("GMGN_HTTP_REPLAY_SCALE", "1.0"))
+REPLAY_CHUNK = 16 * 1024   # размер кусков iter_content() при воспроизведении
+
+# параметры, которые уникальны на воркера и в архиве не нужны
+_VOLATILE_PARAMS = ("device_id", "client_id", "app_ver", "fp_did")
+
+
+def archive_key(url: str) -> str:
+    """Ключ сопоставления запроса в архиве — путь URL (адрес кошелька внутри)."""
+    return urlparse(url).path
+
+
+def _encode_body(content: bytes) -> Dict[str, str]:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(rec: Dict[str, Any]) -> bytes:
+    if "body_b64" in rec:
+        return base64.b64decode(rec["body_b64"])
+    return (rec.get("body") or "").encode("utf-8")
+
+# ─────────────────────────── recording ──────────────────────────
+
+class ArchiveWriter:
+    """Потокобезопасная дозапись в gzip-JSONL (одна строка — один обмен)."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._fh = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._fh is not None:
+                self._fh.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+@lru_cache(maxsize=None)
+def get_archive_writer(path: str) -> ArchiveWriter:
+    return ArchiveWriter(path)
+
+
+class RecordingSession:
+    """Прозрачная обёртка над curl_cffi Session: всё, кроме get(), делегируется."""
+
+    def __init__(self, sess: Any, writer: ArchiveWriter):
+        self._sess = sess
+        self._writer = writer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._sess, name)
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs: Any) -> Any:
+        ts = time.time()
+        t0 = time.perf_counter()
+        resp = self._sess.get(url, params=params, **kwargs)
+        rec = {
+            "ts": round(ts, 3),
+            "method": "GET",
+            "url": url,
+            "key": archive_key(url),
+            "params": {k: v for k, v in (params or {}).items() if k not in _VOLATILE_PARAMS},
+            "status": resp.status_code,
+            "headers": {k: v for k, v in resp.headers.items()},
+        }
+        if kwargs.get("stream"):
+            if 200 <= resp.status_code < 300:
+                # тело ещё не прочитано — запишем, когда вызывающий дочитает поток
+                return _TeeResponse(resp, rec, t0, self._writer)
+            # тело ошибки вызывающий не читает (сразу close) — дочитываем здесь, чтобы
+            # 403/429/5xx тоже попали в архив и воспроизводились при replay
+            body = b"".join(resp.iter_content())
+            rec["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+            self._writer.write({**rec, **_encode_body(body)})
+            return resp
+        rec["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+        self._writer.write({**rec, **_encode_body(resp.content)})
+        return resp
+
+
+class _TeeResponse:
+    """Потоковый ответ под записью: копит куски iter_content и пишет обмен в архив в конце."""
+
+    def __init__(self, resp: Any, rec: Dict[str, Any], t0: float, writer: ArchiveWriter):
+        self._resp = resp
+        self._rec = rec
+        self._t0 = t0
+        self._writer = writer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resp, name)
+
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        parts: List[bytes] = []
+        for chunk in self._resp.iter_content(chunk_size=chunk_size):
+            parts.append(chunk)
+            yield chunk
+        self._rec["elapsed_ms"] = round((time.perf_counter() - self._t0) * 1000.0, 3)
+        self._writer.write({**self._rec, **_encode_body(b"".join(parts))})
+
+# ─────────────────────────── replay ─────────────────────────────
+
+@dataclass
+class ReplayResponse:
+    status_code: int
+    content: bytes
+    headers: Dict[str, str]
+    url: str = ""
+    elapsed_ms: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        step = chunk_size or REPLAY_CHUNK
+        for i in range(0, len(self.content), step):
+            yield self.content[i:i + step]
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class ReplayStats:
+    served: int = 0
+    missing: int = 0
+    latencies_ms: List[float] = field(default_factory=list)
+
+
+class ReplayArchive:
+    """
+    Архив, загруженный в память: ключ → очередь записанных ответов.
+    Повторные запросы по одному ключу получают ответы по порядку записи,
+    после исчерпания — по кругу.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    rec = json.loads(line)
+                    self._records.setdefault(rec.get("key") or archive_key(rec["url"]), []).append(rec)
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = {k: deque(v) for k, v in self._records.items()}
+        self._lock = threading.Lock()
+        self.stats = ReplayStats()
+
+    def keys(self) -> List[str]:
+        return list(self._records)
+
+    def next_record(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                self.stats.missing += 1
+                return None
+            if not q:
+                q.extend(self._records[key])
+            self.stats.served += 1
+            return q.popleft()
+
+
+@lru_cache(maxsize=None)
+def get_replay_archive(path: str) -> ReplayArchive:
+    return ReplayArchive(path)
+
+
+class ReplaySession:
+    """Заменяет curl_cffi Session без сети; интерфейс — тот, что используют скрейперы."""
+
+    def __init__(self, archive: ReplayArchive, scale: float = 1.0):
+        self.archive = archive
+        self.scale = scale
+        self.headers: Dict[str, str] = {}
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs: Any) -> ReplayResponse:
+        rec = self.archive.next_record(archive_key(url))
+        if rec is None:
+            return ReplayResponse(404, b'{"code":404,"msg":"not in archive"}', {}, url=url)
+        elapsed_ms = float(rec.get("elapsed_ms") or 0.0)
+        if self.scale > 0 and elapsed_ms > 0:
+            time.sleep(elapsed_ms * self.scale / 1000.0)
+        self.archive.stats.latencies_ms.append(elapsed_ms * self.scale)
+        return ReplayResponse(
+            status_code=int(rec["status"]),
+            content=_decode_body(rec),
+            headers=dict(rec.get("headers") or {}),
+            url=url,
+            elapsed_ms=elapsed_ms,
+        )
+
+    def close(self) -> None:
+        pass
+
+# ─────────────────────────── factory ────────────────────────────
+
+def set_replay(path: Optional[str], scale: float = 1.0) -> None:
+    """
+    Включает (или, при path=None, выключает) воспроизведение для последующих new_session()
+    независимо от GMGN_HTTP_REPLAY — для бенчмарков и тестов, где модуль уже импортирован.
+    """
+    global HTTP_REPLAY, HTTP_REPLAY_SCALE
+    HTTP_REPLAY = path or None
+    HTTP_REPLAY_SCALE = scale
+
+
+def new_session(*, proxies: Optional[dict] = None, timeout: float = 30, impersonate: str = "chrome") -> Any:
+    """
+    Сессия для запросов к GMGN с учётом GMGN_HTTP_REPLAY / GMGN_HTTP_RECORD.
+    Replay важнее записи: в офлайн-режиме сеть не трогаем вовсе.
+    """
+    if HTTP_REPLAY:
+        return ReplaySession(get_replay_archive(HTTP_REPLAY), scale=HTTP_REPLAY_SCALE)
+
+    from curl_cffi import requests as curl
+
+    sess = curl.Session(impersonate=impersonate, proxies=proxies, timeout=timeout)
+    if HTTP_RECORD:
+        return RecordingSession(sess, get_archive_writer(HTTP_RECORD))
+    return sess
+
+
+__all__: list[str] = [
+    "new_session",
+    "RecordingSession",
+    "ReplaySession",
+    "ReplayArchive",
+    "ReplayResponse",
+    "get_replay_archive",
+    "set_replay",
+    "get_archive_writer",
+]
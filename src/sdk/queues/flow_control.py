@@ -0,0 +1,170 @@
+# src/sdk/queues/flow_control.py
+"""
+Backpressure между pnl_producer и консюмерами очереди кошельков.
+
+Консюмер (pnl_scraper, async) после каждого батча вызывает record_drain —
+INCRBY в счётчик текущего FLOW_BUCKET_S-секундного окна:
+
+ * flow:<queue>:drain:<bucket>  → сколько кошельков консюмеры обработали (EX 2×окно)
+ * flow:<queue>:pending         → кошельков в LIST-очереди: продюсер +n на RPUSH,
+                                  консюмер −n на BLPOP (для ZSET — просто ZCARD)
+
+Продюсер (sync) держит FlowController:
+
+ * drain_rate()  — кошельков/с за последние FLOW_WINDOW_S;
+ * batch_size()  — чанк ≈ FLOW_BATCH_S секунд работы консюмеров, в [FLOW_MIN_BATCH, WALLET_BATCH];
+ * limit()       — сколько держать в очереди: FLOW_TARGET_S секунд работы, но не выше FLOW_HIGH_WATER;
+ * wait_for_room() — пауза, пока backlog ≥ limit();
+ * starving()    — очередь пуста: неполный буфер лучше отдать сразу.
+
+Пока скорость неизвестна (консюмеры ещё ничего не сообщили) — поведение как
+без контроля: чанк WALLET_BATCH, предел FLOW_HIGH_WATER.
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Optional
+
+FLOW_CONTROL = os.getenv("FLOW_CONTROL", "0").lower() in ("1", "true", "yes")
+FLOW_PREFIX = os.getenv("FLOW_PREFIX", "flow")
+FLOW_BUCKET_S = int(os.getenv("FLOW_BUCKET_S", "10"))
+FLOW_WINDOW_S = int(os.getenv("FLOW_WINDOW_S", "600"))
+FLOW_TARGET_S = float(os.getenv("FLOW_TARGET_S", "900"))        # сколько секунд работы держать в очереди
+FLOW_BATCH_S = float(os.getenv("FLOW_BATCH_S", "120"))          # сколько секунд работы в одном чанке
+FLOW_HIGH_WATER = int(os.getenv("FLOW_HIGH_WATER", "200000"))   # кошельков, жёсткий потолок очереди
+FLOW_MIN_BATCH = int(os.getenv("FLOW_MIN_BATCH", "500"))
+FLOW_REFRESH_S = float(os.getenv("FLOW_REFRESH_S", "5"))        # как часто перечитывать скорость
+FLOW_PAUSE_POLL_S = float(os.getenv("FLOW_PAUSE_POLL_S", "5"))
+
+
+def drain_key(queue: str, bucket: int) -> str:
+    return f"{FLOW_PREFIX}:{queue}:drain:{bucket}"
+
+
+def pending_key(queue: str) -> str:
+    return f"{FLOW_PREFIX}:{queue}:pending"
+
+
+def _bucket(ts: Optional[float] = None) -> int:
+    return int((time.time() if ts is None else ts) // FLOW_BUCKET_S)
+
+# ──────────────────────── consumer side (async) ──────────────────────
+
+async def record_drain(rds, queue: str, n: int) -> None:
+    """Консюмер обработал n кошельков из queue."""
+    if n <= 0:
+        return
+    key = drain_key(queue, _bucket())
+    pipe = rds.pipeline(transaction=False)
+    pipe.incrby(key, n)
+    pipe.expire(key, 2 * FLOW_WINDOW_S)
+    await pipe.execute()
+
+
+async def note_popped(rds, queue: str, n: int) -> None:
+    """Консюмер снял из LIST-очереди батч на n кошельков."""
+    if n > 0:
+        await rds.decrby(pending_key(queue), n)
+
+# ──────────────────────── producer side (sync) ───────────────────────
+
+class FlowController:
+    """
+    Регулятор продюсера для одной очереди кошельков.
+
+        flow = FlowController(rds, "wallet_queue", max_batch=15000)
+        flow.wait_for_room()
+        chunk = buffer[:flow.batch_size()]
+        ...RPUSH...; flow.note_pushed(len(chunk))
+
+    zset=True — backlog считается ZCARD(queue), счётчик pending не нужен.
+    """
+
+    def __init__(self, rds, queue: str, *, max_batch: int, zset: bool = False):
+        self.rds = rds
+        self.queue = queue
+        self.zset = zset
+        self.max_batch = max(1, max_batch)
+        self.min_batch = max(1, min(FLOW_MIN_BATCH, self.max_batch))
+        self.paused_s = 0.0
+        self._rate = 0.0
+        self._rate_ts = float("-inf")
+
+    def drain_rate(self) -> float:
+        """Кошельков/с за последние FLOW_WINDOW_S (текущий неполный bucket не учитывается)."""
+        now = time.time()
+        if now - self._rate_ts < FLOW_REFRESH_S:
+            return self._rate
+        cur = _bucket(now)
+        n = max(1, FLOW_WINDOW_S // FLOW_BUCKET_S)
+        vals = self.rds.mget([drain_key(self.queue, b) for b in range(cur - n, cur)])
+        self._rate = sum(int(v) for v in vals if v) / (n * FLOW_BUCKET_S)
+        self._rate_ts = now
+        return self._rate
+
+    def backlog(self) -> int:
+        """Кошельков в очереди прямо сейчас."""
+        if self.zset:
+            return int(self.rds.zcard(self.queue))
+        pipe = self.rds.pipeline(transaction=False)
+        pipe.get(pending_key(self.queue))
+        pipe.llen(self.queue)
+        pending, llen = pipe.execute()
+        if not int(llen):
+            # очередь пуста — счётчик мог уплыть (чистка, сторонний консюмер): сбрасываем
+            if pending and int(pending):
+                self.rds.set(pending_key(self.queue), 0)
+            return 0
+        return max(0, int(pending or 0))
+
+    def note_pushed(self, n: int) -> None:
+        if not self.zset and n > 0:
+            self.rds.incrby(pending_key(self.queue), n)
+
+    def batch_size(self) -> int:
+        rate = self.drain_rate()
+        if rate <= 0:
+            return self.max_batch
+        return int(min(self.max_batch, max(self.min_batch, rate * FLOW_BATCH_S)))
+
+    def limit(self) -> int:
+        rate = self.drain_rate()
+        if rate <= 0:
+            return FLOW_HIGH_WATER
+        return int(min(FLOW_HIGH_WATER, max(self.batch_size(), rate * FLOW_TARGET_S)))
+
+    def starving(self) -> bool:
+        return self.backlog() == 0
+
+    def wait_for_room(self) -> float:
+        """Блокирует, пока backlog ≥ limit(). Возвращает время паузы (с)."""
+        t0 = time.perf_counter()
+        logged = False
+        while True:
+            backlog, limit = self.backlog(), self.limit()
+            if backlog < limit:
+                break
+            if not logged:
+                print(f"⏸️  {self.queue}: backlog={backlog} ≥ {limit} "
+                      f"(drain {self.drain_rate():.1f}/с) — пауза продюсера")
+                logged = True
+            time.sleep(FLOW_PAUSE_POLL_S)
+        waited = time.perf_counter() - t0
+        if logged:
+            print(f"▶️  {self.queue}: продолжаем после паузы {waited:.0f}с")
+        self.paused_s += waited
+        return waited
+
+    def summary(self) -> str:
+        return (f"drain={self.drain_rate():.1f}/с, чанк={self.batch_size()}, "
+                f"предел={self.limit()}, пауз={self.paused_s:.0f}с")
+
+
+__all__: list[str] = [
+    "FLOW_CONTROL",
+    "FlowController",
+    "record_drain",
+    "note_popped",
+    "pending_key",
+]
@@ -0,0 +1,81 @@
+# src/sdk/queues/holdings_queue.py
+"""
+Очередь передачи кошельков из pnl_scraper в holdings_scraper (--daemon).
+
+ * HOLDINGS_QUEUE             → Redis LIST, элемент — JSON {"address", "pnl", "token", "ts"}
+ * HOLDINGS_QUEUE + ":queued" → ZSET адрес → время постановки: адрес, уже стоящий
+                                в очереди, повторно не ставится, пока не взят
+
+pnl_scraper публикует только впервые вставленные в wallets кошельки, так что
+сам он повторов почти не даёт; ZSET страхует от повторной постановки другими
+публикаторами (ручная постановка, несколько источников, повторная вставка
+после удаления из wallets). Срок у каждого адреса свой: при публикации записи
+старше HOLDINGS_QUEUED_TTL_S удаляются — адрес, «застрявший» после падения
+консюмера между BLPOP и ZREM, отпускается независимо от остального трафика.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+HOLDINGS_QUEUE = os.getenv("HOLDINGS_QUEUE", "holdings_queue")
+HOLDINGS_QUEUED = f"{HOLDINGS_QUEUE}:queued"
+HOLDINGS_QUEUED_TTL_S = int(os.getenv("HOLDINGS_QUEUED_TTL_S", str(24 * 3600)))   # 0 — без срока
+
+# KEYS: queued, queue; ARGV: now, ttl_s, затем пары address, payload
+_PUBLISH_LUA = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+if ttl > 0 then redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl) end
+local n = 0
+for i = 3, #ARGV, 2 do
+  if redis.call('ZADD', KEYS[1], 'NX', now, ARGV[i]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[i + 1])
+    n = n + 1
+  end
+end
+return n
+"""
+
+
+async def publish_wallets(rds, items: Iterable[Tuple[str, Optional[float]]], *, token: str = "") -> int:
+    """
+    Ставит (address, pnl) в очередь; возвращает число реально добавленных.
+    Чистка просроченных, ZADD NX и RPUSH — один Lua-скрипт: адрес не может
+    попасть в :queued без элемента в LIST.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    now = round(time.time(), 3)
+    args: list = [now, HOLDINGS_QUEUED_TTL_S]
+    for address, pnl in items:
+        args += [address, json.dumps({"address": address, "pnl": pnl, "token": token, "ts": now})]
+    script = rds.register_script(_PUBLISH_LUA)
+    return int(await script(keys=[HOLDINGS_QUEUED, HOLDINGS_QUEUE], args=args))
+
+
+async def pop_wallet(rds, timeout: int) -> Optional[Dict[str, Any]]:
+    """BLPOP одного кошелька; None — таймаут."""
+    popped = await rds.blpop(HOLDINGS_QUEUE, timeout=timeout)
+    if popped is None:
+        return None
+    _key, payload = popped
+    try:
+        item = json.loads(payload)
+    except ValueError:
+        item = {"address": payload}          # голый адрес (ручная постановка)
+    if not isinstance(item, dict):
+        item = {"address": str(item)}
+    await rds.zrem(HOLDINGS_QUEUED, item.get("address", ""))
+    return item
+
+
+__all__: list[str] = [
+    "HOLDINGS_QUEUE",
+    "HOLDINGS_QUEUED",
+    "publish_wallets",
+    "pop_wallet",
+]
@@ -0,0 +1,242 @@
+# src/sdk/queues/token_lease.py
+"""
+Аренда токенов между репликами pnl_producer.
+
+Токен снимается с token-очереди деструктивно (LPOP/BLPOP), поэтому без учёта
+упавшая реплика его теряет, а две реплики, получившие один токен из разных
+прогонов dexscreener, считают одно и то же. Здесь:
+
+ * <prefix>:<src>:<token>    → STRING owner, SET NX PX LEASE_TTL_S — кто сейчас считает токен
+ * <prefix>:claimed          → ZSET "src|queue|token|owner" → срок аренды (unix, с)
+ * <prefix>:done:<src>       → ZSET token → время обработки; токен, обработанный
+                               меньше LEASE_REPROCESS_S назад, не берётся повторно
+
+Heartbeat-поток продлевает аренды владельца каждые LEASE_TTL_S / 3.
+recover() находит в :claimed просроченные записи, чья аренда истекла (владелец
+не продлил — упал / завис), и возвращает токен в голову его очереди (LPUSH).
+Пока ключ аренды жив — токен не трогается, кто бы им ни владел.
+Все проверки «моя ли аренда» — Lua, атомарно. Синхронный redis-py.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LEASE_PREFIX = os.getenv("LEASE_PREFIX", "token_lease")
+LEASE_TTL_S = float(os.getenv("LEASE_TTL_S", "120"))
+LEASE_REPROCESS_S = float(os.getenv("LEASE_REPROCESS_S", "600"))      # 0 — не пропускать обработанные
+LEASE_DONE_KEEP_S = float(os.getenv("LEASE_DONE_KEEP_S", str(7 * 24 * 3600)))
+LEASE_RECOVER_EVERY_S = float(os.getenv("LEASE_RECOVER_EVERY_S", "30"))
+
+# KEYS: lease, done, claimed; ARGV: owner, ttl_ms, now, reprocess_s, member, token
+_CLAIM_LUA = """
+local ts = redis.call('ZSCORE', KEYS[2], ARGV[6])
+if ts and tonumber(ARGV[3]) - tonumber(ts) < tonumber(ARGV[4]) then return 0 end
+if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then return 0 end
+redis.call('ZADD', KEYS[3], tonumber(ARGV[3]) + tonumber(ARGV[2]) / 1000, ARGV[5])
+return 1
+"""
+
+# KEYS: lease, done, claimed; ARGV: owner, now, member, done_flag, token, keep_s
+_RELEASE_LUA = """
+local mine = 0
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('DEL', KEYS[1])
+  mine = 1
+end
+redis.call('ZREM', KEYS[3], ARGV[3])
+if ARGV[4] == '1' then
+  redis.call('ZADD', KEYS[2], ARGV[2], ARGV[5])
+  redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[6]))
+end
+return mine
+"""
+
+# KEYS: lease, claimed; ARGV: owner, ttl_ms, member, expires_at
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+redis.call('ZADD', KEYS[2], 'XX', ARGV[4], ARGV[3])
+return 1
+"""
+
+# KEYS: lease, claimed, queue; ARGV: member, token, owner
+# аренда ещё есть → токен в работе, в очередь не кладём; если она уже у другой
+# реплики — старая запись в :claimed просто мусор, убираем
+_RECOVER_LUA = """
+local cur = redis.call('GET', KEYS[1])
+if cur then
+  if cur ~= ARGV[3] then redis.call('ZREM', KEYS[2], ARGV[1]) end
+  return 0
+end
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then return 0 end
+redis.call('LPUSH', KEYS[3], ARGV[2])
+return 1
+"""
+
+
+def lease_key(src: str, token: str) -> str:
+    return f"{LEASE_PREFIX}:{src}:{token}"
+
+
+def done_key(src: str) -> str:
+    return f"{LEASE_PREFIX}:done:{src}"
+
+
+def claimed_key() -> str:
+    return f"{LEASE_PREFIX}:claimed"
+
+
+def _decode(v) -> str:
+    return v.decode() if isinstance(v, (bytes, bytearray)) else str(v)
+
+
+class TokenLeases:
+    """
+    Аренды одной реплики продюсера.
+
+        leases = TokenLeases(rds).start()
+        mine = leases.claim("PumpSwap", "pump_queue", tokens)   # только свои, без недавно обработанных
+        ...fetch + push...
+        leases.release("PumpSwap", "pump_queue", mine)          # done=True → запись в :done
+    """
+
+    def __init__(self, rds, owner: Optional[str] = None, ttl_s: float = LEASE_TTL_S,
+                 reprocess_s: float = LEASE_REPROCESS_S):
+        self.rds = rds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.ttl_ms = int(ttl_s * 1000)
+        self.reprocess_s = reprocess_s
+        self.held: Dict[Tuple[str, str], str] = {}       # (src, token) → member в :claimed
+        self.skipped = 0
+        self.recovered = 0
+        self.lost = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_recover = 0.0
+        self._claim = rds.register_script(_CLAIM_LUA)
+        self._release = rds.register_script(_RELEASE_LUA)
+        self._renew = rds.register_script(_RENEW_LUA)
+        self._recover = rds.register_script(_RECOVER_LUA)
+
+    def _member(self, src: str, queue: str, token: str) -> str:
+        return f"{src}|{queue}|{token}|{self.owner}"
+
+    def claim(self, src: str, queue: str, tokens: Sequence[str]) -> List[str]:
+        """Токены, на которые взята аренда (порядок сохраняется); остальные чужие или свежие."""
+        tokens = list(dict.fromkeys(tokens))
+        if not tokens:
+            return []
+        now = time.time()
+        pipe = self.rds.pipeline(transaction=False)
+        for t in tokens:
+            self._claim(keys=[lease_key(src, t), done_key(src), claimed_key()],
+                        args=[self.owner, self.ttl_ms, now, self.reprocess_s,
+                              self._member(src, queue, t), t],
+                        client=pipe)
+        mine = [t for t, ok in zip(tokens, pipe.execute()) if int(ok)]
+        with self._lock:
+            for t in mine:
+                self.held[(src, t)] = self._member(src, queue, t)
+        self.skipped += len(tokens) - len(mine)
+        return mine
+
+    def release(self, src: str, queue: str, tokens: Sequence[str], *, done: bool = True) -> int:
+        """
+        Снять аренду; done=False (ошибка) — без записи в :done, токен можно взять снова.
+        Возвращает, сколько аренд ещё были нашими (не истекли и не перехвачены).
+        """
+        if not tokens:
+            return 0
+        now = time.time()
+        pipe = self.rds.pipeline(transaction=False)
+        for t in tokens:
+            with self._lock:
+                member = self.held.pop((src, t), None) or self._member(src, queue, t)
+            self._release(keys=[lease_key(src, t), done_key(src), claimed_key()],
+                          args=[self.owner, now, member, int(done), t, LEASE_DONE_KEEP_S],
+                          client=pipe)
+        return sum(int(x) for x in pipe.execute())
+
+    def renew(self) -> int:
+        """Продлить все свои аренды; потерянные (истекли, перехвачены) забываем. Возвращает число продлённых."""
+        with self._lock:
+            held = list(self.held.items())
+        if not held:
+            return 0
+        expires_at = time.time() + self.ttl_ms / 1000
+        pipe = self.rds.pipeline(transaction=False)
+        for (src, t), member in held:
+            self._renew(keys=[lease_key(src, t), claimed_key()],
+                        args=[self.owner, self.ttl_ms, member, expires_at], client=pipe)
+        ok = pipe.execute()
+        with self._lock:
+            for ((src, t), _member), renewed in zip(held, ok):
+                if not int(renewed) and self.held.pop((src, t), None) is not None:
+                    self.lost += 1
+        return sum(int(x) for x in ok)
+
+    def recover(self, force: bool = False) -> int:
+        """Вернуть в очереди токены с истёкшими арендами (раз в LEASE_RECOVER_EVERY_S)."""
+        now = time.time()
+        if not force and now - self._last_recover < LEASE_RECOVER_EVERY_S:
+            return 0
+        self._last_recover = now
+        expired = [_decode(m) for m in self.rds.zrangebyscore(claimed_key(), "-inf", now)]
+        if not expired:
+            return 0
+        pipe = self.rds.pipeline(transaction=False)
+        for member in expired:
+            src, queue, token, owner = member.split("|", 3)
+            self._recover(keys=[lease_key(src, token), claimed_key(), queue],
+                          args=[member, token, owner], client=pipe)
+        n = sum(int(x) for x in pipe.execute())
+        if n:
+            print(f"♻️  Вернули в очереди {n} токенов с просроченной арендой")
+        self.recovered += n
+        return n
+
+    def _heartbeat(self) -> None:
+        interval = max(1.0, self.ttl_ms / 3000)
+        while not self._stop.wait(interval):
+            try:
+                self.renew()
+            except Exception as e:
+                print(f"⚠️  heartbeat аренд не удался: {e!r}")
+
+    def start(self) -> "TokenLeases":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._heartbeat, name="token-lease-heartbeat", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Остановить heartbeat; недообработанные токены отпускаются и возвращаются в очереди."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            held = list(self.held.items())
+        for (src, t), member in held:
+            queue = member.split("|", 3)[1]
+            # истёкшую аренду уже вернул recover() другой реплики — второй раз не кладём
+            if self.release(src, queue, [t], done=False):
+                self.rds.lpush(queue, t)
+
+    def summary(self) -> str:
+        return (f"owner={self.owner} пропущено={self.skipped} "
+                f"возвращено={self.recovered} потеряно={self.lost}")
+
+
+__all__: list[str] = [
+    "TokenLeases",
+    "lease_key",
+    "done_key",
+    "claimed_key",
+]
@@ -0,0 +1,168 @@
+# src/sdk/queues/token_queue.py
+"""
+Token-очереди dexscreener → pnl_producer (pump_queue / raydium_queue / meteora_queue).
+
+ * <queue>          → Redis LIST адресов токенов (RPUSH, как раньше)
+ * <queue>:prio     → ZSET token → score; при TOKEN_PRIORITY=1 публикатор пишет сюда,
+                      score = время прогона + доля позиции в трендах (выше — раньше)
+
+DRRScheduler снимает токены со всех очередей по весам (deficit round-robin):
+за раунд очередь q получает до weight[q] * quantum токенов, так что очередь с
+хвостом не голодит остальные. Раунд — один pipeline: Lua-pop по каждой очереди
+(сначала ZPOPMAX из :prio, затем LPOP из списка) + LLEN/ZCARD всех очередей
+для логов. pop_tokens / wait_token — то же без DRR, для fifo-режима продюсера:
+при TOKEN_PRIORITY=1 он тоже читает :prio. Синхронный redis-py.
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOKEN_PRIORITY = os.getenv("TOKEN_PRIORITY", "0").lower() in ("1", "true", "yes")
+
+# до n элементов: сначала лучшие из ZSET (если ARGV[2] == '1'), затем голова списка
+_POP_LUA = """
+local n = tonumber(ARGV[1])
+local out = {}
+if ARGV[2] == '1' then
+  local z = redis.call('ZPOPMAX', KEYS[2], n)
+  for i = 1, #z, 2 do out[#out + 1] = z[i] end
+end
+if #out < n then
+  local l = redis.call('LPOP', KEYS[1], n - #out)
+  if l then
+    for _, v in ipairs(l) do out[#out + 1] = v end
+  end
+end
+return out
+"""
+
+
+def prio_key(queue: str) -> str:
+    return f"{queue}:prio"
+
+
+def _decode(v) -> str:
+    return v.decode() if isinstance(v, (bytes, bytearray)) else str(v)
+
+
+def push_tokens(rds, queue: str, tokens: List[str], *, priority: bool = TOKEN_PRIORITY) -> None:
+    """
+    Публикация токенов одного источника. priority=True → ZADD в <queue>:prio:
+    свежий прогон выше старого, внутри прогона — по порядку трендов; повторный
+    токен просто получает новый score (дубликатов нет).
+    """
+    if not tokens:
+        return
+    if not priority:
+        rds.rpush(queue, *tokens)
+        return
+    now = int(time.time())
+    n = len(tokens)
+    rds.zadd(prio_key(queue), {t: now + (n - i) / (n + 1) for i, t in enumerate(tokens)})
+
+
+def pop_tokens(rds, queues: List[str], k: int, *, priority: bool = TOKEN_PRIORITY) -> Dict[str, List[str]]:
+    """До k токенов с каждой очереди за один pipeline (без ожидания): :prio, затем список."""
+    pop = rds.register_script(_POP_LUA)
+    pipe = rds.pipeline(transaction=False)
+    for q in queues:
+        pop(keys=[q, prio_key(q)], args=[k, int(priority)], client=pipe)
+    return {q: [_decode(t) for t in items] for q, items in zip(queues, pipe.execute()) if items}
+
+
+def wait_token(rds, queues: List[str], timeout: int, *,
+               priority: bool = TOKEN_PRIORITY) -> Optional[Tuple[str, str]]:
+    """
+    Ждать первый токен: (queue, token) или None по таймауту. В priority-режиме
+    публикатор пишет только в :prio — ждём там (BZPOPMAX), иначе BLPOP по спискам.
+    """
+    if priority:
+        popped = rds.bzpopmax([prio_key(q) for q in queues], timeout=timeout)
+        if popped is None:
+            return None
+        return _decode(popped[0])[: -len(":prio")], _decode(popped[1])
+    popped = rds.blpop(queues, timeout=timeout)
+    if popped is None:
+        return None
+    return _decode(popped[0]), _decode(popped[1])
+
+
+class DRRScheduler:
+    """
+    Взвешенная справедливая выборка из token-очередей.
+
+        sched = DRRScheduler(rds, ["pump_queue", "raydium_queue"], {"pump_queue": 2})
+        batch = sched.next_round()      # {"pump_queue": [...], "raydium_queue": [...]} | None
+
+    Токен стоит 1; недобор (очередь опустела раньше квоты) обнуляет дефицит,
+    поэтому пустая очередь не копит кредит. lengths — остатки после раунда
+    (LLEN + ZCARD), без отдельных запросов.
+    """
+
+    def __init__(self, rds, queues: Iterable[str], weights: Optional[Dict[str, int]] = None,
+                 quantum: int = 1, priority: bool = TOKEN_PRIORITY, timeout: int = 300):
+        self.rds = rds
+        self.queues = list(queues)
+        self.weights = {q: max(1, int((weights or {}).get(q, 1))) for q in self.queues}
+        self.quantum = max(1, quantum)
+        self.priority = priority
+        self.timeout = timeout
+        self.deficit: Dict[str, int] = {q: 0 for q in self.queues}
+        self.lengths: Dict[str, int] = {q: -1 for q in self.queues}
+        self._pop = rds.register_script(_POP_LUA)
+
+    def next_round(self, queues: Optional[Iterable[str]] = None,
+                   block: bool = True) -> Optional[Dict[str, List[str]]]:
+        """
+        Один раунд DRR по queues (по умолчанию — все). Если всё пусто: block=False →
+        {}, иначе ждём первый токен (BZPOPMAX по :prio в priority-режиме, BLPOP — без);
+        None — за timeout ничего не пришло.
+        """
+        if queues is None:
+            active = self.queues
+        else:
+            wanted = set(queues)
+            active = [q for q in self.queues if q in wanted]
+        allowance = {q: self.deficit[q] + self.weights[q] * self.quantum for q in active}
+
+        pipe = self.rds.pipeline(transaction=False)
+        for q in active:
+            self._pop(keys=[q, prio_key(q)], args=[allowance[q], int(self.priority)], client=pipe)
+        for q in self.queues:
+            pipe.llen(q)
+            if self.priority:
+                pipe.zcard(prio_key(q))
+        res = pipe.execute()
+
+        sizes = iter(res[len(active):])
+        for q in self.queues:
+            self.lengths[q] = int(next(sizes)) + (int(next(sizes)) if self.priority else 0)
+
+        out: Dict[str, List[str]] = {}
+        for q, items in zip(active, res[:len(active)]):
+            items = [_decode(t) for t in items or []]
+            if items:
+                out[q] = items
+            self.deficit[q] = allowance[q] - len(items) if self.lengths[q] > 0 else 0
+        if out or not block:
+            return out
+        return self._wait(active)
+
+    def _wait(self, queues: List[str]) -> Optional[Dict[str, List[str]]]:
+        popped = wait_token(self.rds, queues, self.timeout, priority=self.priority)
+        if popped is None:
+            return None
+        queue, token = popped
+        return {queue: [token]}
+
+
+__all__: list[str] = [
+    "TOKEN_PRIORITY",
+    "prio_key",
+    "push_tokens",
+    "pop_tokens",
+    "wait_token",
+    "DRRScheduler",
+]
@@ -0,0 +1,93 @@
+"""Офлайн-прогон скрейперов по архиву tests/data/gmgn_replay.jsonl.gz (GMGN_HTTP_RECORD)."""
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("curl_cffi")
+pytest.importorskip("playwright")
+pytest.importorskip("redis")
+
+from src.bench.throughput import DirectProxy, wallets_from_archive
+from src.scraper.gmgn import holdings_scraper as hs
+from src.scraper.gmgn import pnl_scraper as ps
+from src.sdk.infrastructure import http
+
+ARCHIVE = str(Path(__file__).parent / "data" / "gmgn_replay.jsonl.gz")
+
+P_POSITIVE = "PnLWa11etPositive111111111111111111111111111"
+P_BELOW = "PnLWa11etBelowThreshold222222222222222222222"
+H_MIXED = "Ho1dingsWa11etMixed3333333333333333333333333"
+H_LOSER = "Ho1dingsWa11etLoser4444444444444444444444444"
+
+
+@pytest.fixture
+def replay():
+    http.get_replay_archive.cache_clear()
+    http.set_replay(ARCHIVE, 0)
+    yield http.get_replay_archive(ARCHIVE)
+    http.set_replay(None)
+    http.get_replay_archive.cache_clear()
+
+
+def test_new_session_uses_set_replay(replay):
+    sess = http.new_session()
+    assert isinstance(sess, http.ReplaySession)
+    assert sess.archive is replay
+    resp = sess.get(f"https://gmgn.ai/api/v1/wallet_stat/sol/{P_POSITIVE}/7d")
+    assert resp.status_code == 200
+    assert resp.json()["data"]["pnl"] == 1.5
+    assert sess.get("https://gmgn.ai/api/v1/wallet_stat/sol/unknown/7d").status_code == 404
+    assert (replay.stats.served, replay.stats.missing) == (1, 1)
+
+
+def test_wallets_from_archive():
+    assert wallets_from_archive(ARCHIVE, "pnl") == [P_POSITIVE, P_BELOW]
+    assert wallets_from_archive(ARCHIVE, "holdings") == [H_MIXED, H_LOSER]
+
+
+def test_pnl_worker_replay(replay, monkeypatch):
+    monkeypatch.setattr(ps, "SLEEP_BETWEEN_REQ", (0.0, 0.0))
+    monkeypatch.setattr(ps, "PNL_MIN_THRESHOLD", 0.6)
+    timings = []
+    monkeypatch.setattr(ps, "WALLET_TIMING_HOOK", lambda w, ms, ok: timings.append((w, ok)))
+
+    w = ps.Worker(name="T1", user_agent=ps.UA_LIST[0], proxy=DirectProxy())
+    w.params = dict(ps.PARAMS)
+    w.wallets = [P_POSITIVE, P_BELOW]
+    name, stats, positives = ps.run_worker_requests(w)
+
+    assert name == "T1"
+    assert positives == [(P_POSITIVE, 1.5)]
+    assert w.labels == [(P_POSITIVE, 1.5), (P_BELOW, 0.2)]
+    assert (stats.ok, stats.attempts, stats.exceptions) == (2, 2, 0)
+    assert timings == [(P_POSITIVE, True), (P_BELOW, True)]
+
+
+def test_holdings_client_replay(replay):
+    w = hs.build_workers(1)[0]
+    w.proxy = DirectProxy()
+
+    async def run():
+        client = hs.HoldingsClient(w)
+        try:
+            return [await hs.analyse_wallet(a, client) for a in (H_MIXED, H_LOSER)]
+        finally:
+            client.close()
+
+    mixed, loser = asyncio.run(run())
+    assert mixed["address"] == H_MIXED
+    assert {k: mixed[k] for k in ("total_trades", "wins", "losses", "winrate_pct")} == {
+        "total_trades": 3, "wins": 2, "losses": 1, "winrate_pct": 66.67,
+    }
+    assert mixed["pnl"] == 1.25
+    assert mixed["profit_factor"] == 6.0
+    assert mixed["median_liquidity_usd"] == 2000.0
+    assert mixed["hhi"] == 0.625
+    assert mixed["honeypot_share_pct"] == 33.33
+    assert mixed["net_pnl_30d_usd"] == 50.0
+    assert mixed["turnover_usd"] == 625.0
+    assert mixed["avg_hold_human"] == hs.humanize(3600)
+
+    assert (loser["total_trades"], loser["wins"], loser["losses"], loser["pnl"]) == (1, 0, 1, -1.0)
+    assert w.stats.ok == 2
@@ -0,0 +1,56 @@
+"""Пакетный движок metrics_np против эталона metrics (check_parity)."""
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.bench.fake_gmgn import FakeConfig, make_holdings
+from src.scraper.gmgn import metrics_np
+
+
+def _synthetic(n: int, seed: int = 7):
+    cfg = FakeConfig(seed=seed)
+    return [make_holdings(cfg, f"wallet{i}")["data"]["holdings"] for i in range(n)]
+
+
+def _item(**kw):
+    base = {
+        "token": {"is_honeypot": False}, "usd_value": "10", "liquidity": "1000",
+        "total_profit_pnl": "0.5", "realized_profit_30d": "1", "unrealized_profit": "0",
+        "history_bought_cost": "10", "history_sold_income": "15",
+        "start_holding_at": 1700000000, "end_holding_at": 1700003600, "last_active_timestamp": 1700003600,
+    }
+    base.update(kw)
+    return base
+
+
+def test_parity_on_synthetic_batch():
+    assert metrics_np.check_parity(_synthetic(200), now=1.8e9) == []
+
+
+@pytest.mark.parametrize("data", [
+    [],                                                             # пустой ответ
+    [_item(start_holding_at="1700000000")],                         # строковый таймстемп
+    [_item(token=None)],                                            # token: null → исключение у обоих
+    [{k: v for k, v in _item().items() if k != "usd_value"}],       # нет поля → KeyError у обоих
+    [_item(total_profit_pnl="nan"), _item()],
+    [_item(total_profit_pnl="0"), _item(total_profit_pnl="-0.5", liquidity=None)],
+])
+def test_parity_on_fallback_wallets(data):
+    batch = _synthetic(3) + [data]
+    assert metrics_np.check_parity(batch, now=1.8e9) == []
+
+
+def test_parity_reports_mismatch(monkeypatch):
+    real = metrics_np.calc_metrics_batch
+
+    def skewed(datas, now=None):
+        out = real(datas, now)
+        out[1] = {**out[1], "wins": out[1]["wins"] + 1}
+        out[2] = ValueError("boom")
+        return out
+
+    monkeypatch.setattr(metrics_np, "calc_metrics_batch", skewed)
+    datas = _synthetic(3)
+    diffs = metrics_np.check_parity(datas)
+    assert [(w, key) for w, key, _, _ in diffs] == [(1, "wins"), (2, "<exception>")]
+    assert diffs[0][3] == diffs[0][2] + 1
@@ -0,0 +1,129 @@
+"""pnl_producer: PendingTokens (аренды на fakeredis) и предфильтр _prescreen_by_token."""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+pytest.importorskip("clickhouse_connect")
+
+from src.pnl import pnl_producer as pp
+from src.sdk.queues.token_lease import TokenLeases, done_key
+
+
+@pytest.fixture
+def rds():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+# ───────────────────────── PendingTokens ────────────────────────────
+
+def test_pending_tokens_release_after_last_wallet(rds):
+    leases = TokenLeases(rds, owner="a")
+    leases.claim("Pump", "pump_queue", ["t1", "t2"])
+    leases.claim("Ray", "raydium_queue", ["t3"])
+    pending = pp.PendingTokens(leases)
+    buffer = []
+
+    buffer.extend(["w1", "w2", "w3"])
+    pending.add("Pump", "pump_queue", ["t1"], buffer)       # кошельки t1 кончаются на 3
+    buffer.extend(["w4", "w5"])
+    pending.add("Pump", "pump_queue", ["t2"], buffer)       # ... t2 — на 5
+    pending.add("Ray", "raydium_queue", ["t3"], buffer)     # токен без кошельков — тоже на 5
+
+    del buffer[:2]
+    pending.advance(2)
+    assert set(leases.held) == {("Pump", "t1"), ("Pump", "t2"), ("Ray", "t3")}
+
+    del buffer[:1]
+    pending.advance(1)
+    assert set(leases.held) == {("Pump", "t2"), ("Ray", "t3")}
+    assert rds.zscore(done_key("Pump"), "t1") is not None
+
+    del buffer[:2]
+    pending.advance(2)
+    assert leases.held == {}
+    assert rds.zscore(done_key("Ray"), "t3") is not None
+    assert pending.flushed == 5
+
+    # после сдвига позиций: новый токен считается от flushed
+    leases.claim("Pump", "pump_queue", ["t4"])
+    buffer.extend(["w6"])
+    pending.add("Pump", "pump_queue", ["t4"], buffer)
+    assert ("Pump", "t4") in leases.held
+    pending.advance(1)
+    assert leases.held == {}
+
+
+def test_pending_tokens_add_with_empty_buffer_releases_at_once(rds):
+    leases = TokenLeases(rds, owner="a")
+    leases.claim("Pump", "pump_queue", ["t1"])
+    pp.PendingTokens(leases).add("Pump", "pump_queue", ["t1"], [])
+    assert leases.held == {}
+
+
+def test_pending_tokens_survive_release_errors(rds, monkeypatch):
+    leases = TokenLeases(rds, owner="a")
+    leases.claim("Pump", "pump_queue", ["t1"])
+    leases.claim("Ray", "raydium_queue", ["t2"])
+    pending = pp.PendingTokens(leases)
+    pending.add("Pump", "pump_queue", ["t1"], ["w1"])
+    pending.add("Ray", "raydium_queue", ["t2"], ["w1", "w2"])
+
+    real = leases.release
+
+    def flaky(src, queue, tokens, *, done=True):
+        if src == "Pump":
+            raise ConnectionError("redis down")
+        return real(src, queue, tokens, done=done)
+
+    monkeypatch.setattr(leases, "release", flaky)
+    pending.advance(2)                                       # не падает, Ray отпущен
+    assert set(leases.held) == {("Pump", "t1")}
+    assert pending._marks == []
+
+
+def test_pending_tokens_without_leases_is_noop():
+    pending = pp.PendingTokens(None)
+    pending.add("Pump", "pump_queue", ["t1"], ["w1"])
+    pending.advance(1)
+    assert pending._marks == [] and pending.flushed == 1
+
+# ───────────────────────── prescreen ────────────────────────────────
+
+@pytest.fixture
+def prescreen_mod(monkeypatch):
+    from src.clickhouse_pnl import prescreen as mod
+
+    monkeypatch.setattr(mod, "STATS", mod.PrescreenStats())
+    monkeypatch.setattr(pp, "PRESCREEN_STATS", mod.STATS)
+    monkeypatch.setattr(mod, "_MODEL", mod.PrescreenModel(min_pnl_sol=1.0))
+    monkeypatch.setattr(mod, "PRESCREEN_KEEP_UNKNOWN", True)
+    return mod
+
+
+def test_prescreen_by_token_filters(prescreen_mod, monkeypatch):
+    feats = {"good": (5.0, 10, 3, 0.6), "bad": (0.1, 10, 3, 0.6)}     # "new" — без признаков
+    monkeypatch.setattr(prescreen_mod, "fetch_features", lambda wallets, db=None: feats)
+
+    by_token = {"t1": ["good", "bad"], "t2": [("new", 0.9), ("bad", 0.5)]}
+    assert pp._prescreen_by_token(by_token) == {"t1": ["good"], "t2": [("new", 0.9)]}
+    stats = prescreen_mod.STATS
+    assert (stats.seen, stats.passed, stats.unknown, stats.failed) == (3, 2, 1, 0)
+
+
+def test_prescreen_by_token_fails_open(prescreen_mod, monkeypatch):
+    def down(wallets, db=None):
+        raise ConnectionError("clickhouse down")
+
+    monkeypatch.setattr(prescreen_mod, "fetch_features", down)
+    by_token = {"t1": ["a", "b"], "t2": [("c", 1.0)]}
+    assert pp._prescreen_by_token(by_token) is by_token
+    assert prescreen_mod.STATS.failed == 3
+    assert prescreen_mod.STATS.seen == 0
+
+
+def test_prescreen_by_token_skips_empty(monkeypatch):
+    def boom(*a, **kw):
+        raise AssertionError("prescreen не должен вызываться")
+
+    monkeypatch.setattr(pp, "prescreen", boom)
+    by_token = {"t1": []}
+    assert pp._prescreen_by_token(by_token) is by_token
@@ -0,0 +1,74 @@
+"""Аренды токенов (Lua в token_lease) и PendingTokens продюсера поверх fakeredis."""
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from src.sdk.queues.token_lease import TokenLeases, claimed_key, done_key, lease_key
+
+
+@pytest.fixture
+def rds():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_claim_skips_foreign_and_recent(rds):
+    a = TokenLeases(rds, owner="a")
+    b = TokenLeases(rds, owner="b")
+    assert a.claim("Pump", "pump_queue", ["t1", "t2", "t1"]) == ["t1", "t2"]
+    assert b.claim("Pump", "pump_queue", ["t1", "t3"]) == ["t3"]
+    assert b.skipped == 1
+    assert rds.zcard(claimed_key()) == 3
+
+    assert a.release("Pump", "pump_queue", ["t1"]) == 1
+    assert b.claim("Pump", "pump_queue", ["t1"]) == []       # обработан меньше LEASE_REPROCESS_S назад
+
+
+def test_release_lua_owner_and_done(rds):
+    a = TokenLeases(rds, owner="a")
+    a.claim("Pump", "pump_queue", ["t1", "t2"])
+
+    assert a.release("Pump", "pump_queue", ["t1"], done=True) == 1
+    assert rds.get(lease_key("Pump", "t1")) is None
+    assert rds.zscore(done_key("Pump"), "t1") is not None
+
+    assert a.release("Pump", "pump_queue", ["t2"], done=False) == 1
+    assert rds.zscore(done_key("Pump"), "t2") is None
+    assert rds.zcard(claimed_key()) == 0
+    assert a.held == {}
+
+
+def test_release_lua_keeps_foreign_lease(rds):
+    a = TokenLeases(rds, owner="a")
+    a.claim("Pump", "pump_queue", ["t1"])
+    rds.set(lease_key("Pump", "t1"), "b")                    # аренда истекла и перехвачена
+
+    assert a.release("Pump", "pump_queue", ["t1"], done=False) == 0
+    assert rds.get(lease_key("Pump", "t1")) == "b"
+    assert rds.zcard(claimed_key()) == 0
+
+
+def test_release_trims_old_done_entries(rds, monkeypatch):
+    from src.sdk.queues import token_lease
+
+    monkeypatch.setattr(token_lease, "LEASE_DONE_KEEP_S", 60)
+    rds.zadd(done_key("Pump"), {"ancient": time.time() - 3600})
+    a = TokenLeases(rds, owner="a")
+    a.claim("Pump", "pump_queue", ["t1"])
+    a.release("Pump", "pump_queue", ["t1"])
+    assert rds.zrange(done_key("Pump"), 0, -1) == ["t1"]
+
+
+def test_recover_requeues_only_expired(rds):
+    a = TokenLeases(rds, owner="a", ttl_s=0.001)
+    a.claim("Pump", "pump_queue", ["dead", "stolen", "alive"])
+    time.sleep(0.01)
+    rds.set(lease_key("Pump", "stolen"), "b")
+    rds.set(lease_key("Pump", "alive"), "a")
+
+    assert TokenLeases(rds, owner="c").recover(force=True) == 1
+    assert rds.lrange("pump_queue", 0, -1) == ["dead"]
+    # запись чужой живой аренды убрана, своя живая остаётся до продления
+    assert [m.split("|")[2] for m in rds.zrange(claimed_key(), 0, -1)] == ["alive"]
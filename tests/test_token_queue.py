@@ -0,0 +1,85 @@
+"""DRRScheduler и pop_tokens поверх fakeredis (Lua-скрипты выполняются через lupa)."""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from src.sdk.queues.token_queue import DRRScheduler, pop_tokens, prio_key, push_tokens
+
+
+@pytest.fixture
+def rds():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _fill(rds, queue, n):
+    rds.rpush(queue, *[f"{queue}-{i}" for i in range(n)])
+
+
+def test_round_respects_weights(rds):
+    _fill(rds, "a", 10)
+    _fill(rds, "b", 10)
+    sched = DRRScheduler(rds, ["a", "b"], {"a": 2}, quantum=3, priority=False)
+
+    out = sched.next_round()
+    assert out == {"a": [f"a-{i}" for i in range(6)], "b": ["b-0", "b-1", "b-2"]}
+    assert sched.deficit == {"a": 0, "b": 0}
+    assert sched.lengths == {"a": 4, "b": 7}
+
+
+def test_carried_deficit_is_spent(rds):
+    _fill(rds, "a", 10)
+    _fill(rds, "b", 10)
+    sched = DRRScheduler(rds, ["a", "b"], quantum=1, priority=False)
+    sched.deficit["a"] = 3
+
+    out = sched.next_round()
+    assert len(out["a"]) == 4 and len(out["b"]) == 1
+    assert sched.deficit == {"a": 0, "b": 0}
+
+
+def test_drained_queue_does_not_bank_credit(rds):
+    _fill(rds, "a", 1)
+    _fill(rds, "b", 10)
+    sched = DRRScheduler(rds, ["a", "b"], {"a": 5, "b": 1}, quantum=2, priority=False)
+
+    out = sched.next_round()
+    assert out == {"a": ["a-0"], "b": ["b-0", "b-1"]}
+    assert sched.deficit["a"] == 0          # недобор 9, но очередь пуста — кредит не копится
+    assert sched.lengths == {"a": 0, "b": 8}
+
+    _fill(rds, "a", 20)
+    assert len(sched.next_round()["a"]) == 10
+
+
+def test_round_over_subset_keeps_other_deficits(rds):
+    _fill(rds, "a", 5)
+    _fill(rds, "b", 5)
+    sched = DRRScheduler(rds, ["a", "b"], quantum=1, priority=False)
+    sched.deficit["b"] = 2
+
+    assert sched.next_round(["a"]) == {"a": ["a-0"]}
+    assert sched.deficit == {"a": 0, "b": 2}
+    assert sched.lengths == {"a": 4, "b": 5}
+
+
+def test_empty_round_without_block(rds):
+    sched = DRRScheduler(rds, ["a", "b"], priority=False)
+    assert sched.next_round(block=False) == {}
+    assert sched.lengths == {"a": 0, "b": 0}
+
+
+def test_priority_mode_pops_zset_first(rds):
+    rds.rpush("a", "old-1", "old-2")
+    push_tokens(rds, "a", ["hot", "warm"], priority=True)
+    sched = DRRScheduler(rds, ["a"], quantum=3, priority=True)
+
+    assert sched.next_round() == {"a": ["hot", "warm", "old-1"]}
+    assert sched.lengths == {"a": 1}
+    assert rds.zcard(prio_key("a")) == 0
+
+
+def test_pop_tokens_per_queue(rds):
+    _fill(rds, "a", 3)
+    push_tokens(rds, "b", ["x", "y", "z"], priority=True)
+    assert pop_tokens(rds, ["a", "b", "c"], 2, priority=True) == {"a": ["a-0", "a-1"], "b": ["x", "y"]}